@@ -1,26 +1,43 @@
-from dash import Dash, html, dcc, Input, Output, State, ctx
-import plotly.express as px
+from dash import Dash, html, dcc, dash_table, Input, Output, State, ClientsideFunction, ctx, no_update, Patch
+from flask import Response, abort, has_request_context, request, session
+from plotly.utils import PlotlyJSONEncoder
+from urllib.parse import urlencode
+from werkzeug.utils import secure_filename
+import plotly
 import pandas as pd
-import base64
-import io
-
-
-def initial_dataset(contents):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), skiprows=4)
-
-    df = df.fillna('Not Applicable')
-
-    # Clean column names:
-    df.columns = (
-        df.columns
-        .str.replace('-', '', regex=False)
-        .str.replace(r'\s+', ' ', regex=True)
-        .str.strip()
-    )
-
-    return df
+import numpy as np
+import gc
+import hashlib
+import json
+import os
+import secrets
+import threading
+
+from enrollment.cache import ResultCache, filter_key, freeze
+from enrollment.data import (OPTION_CHAIN, Dataset, dataset_id, get_dataset, hold_dataset, load_from_disk,
+                             loaded_datasets, merge_datasets, read_upload, register_dataset, release_dataset,
+                             save_to_disk, school_year_label)
+from enrollment.disk_cache import DatasetDiskCache
+from enrollment.export import EXPORT_FORMATS, available_formats, export_stream, row_chunks
+from enrollment.geo import GEO_LEVELS, ZOOM_TIERS, BoundaryStore, area_key, zoom_tier
+from enrollment.jobs import JobQueue
+from enrollment.merge import merged_dataset_id
+from enrollment.metrics import CallbackMetrics
+from enrollment.plan import ELEMENTARY_GRADES, GENDERS, JUNIOR_GRADES, SENIOR_GRADES, SHS_TRACKS, STAGES
+from enrollment.schools import SCHOOL_COLUMNS, TOTAL_COLUMNS
+from enrollment.startup import StartupProfile
+from enrollment.worker import WorkerPool
+
+# STARTUP_PROFILE=1 prints the time from process start to each step of booting
+# (imports, layout, warm-up, first page, first chart) as it happens; the same
+# numbers are always on /metrics as enrollment_startup_seconds.
+startup = StartupProfile(os.environ.get('STARTUP_PROFILE') == '1')
+startup.mark('imports')
+
+
+def initial_dataset(contents, progress=None):
+    # Returns the typed frame and its cube cells, parsed chunk by chunk.
+    return read_upload(contents, progress)
 
 # Styling
 COLORS = {
@@ -269,10 +286,261 @@ level_chart_style = {
     'height': '275px'  
 }
 
+school_search_style = {
+    'marginLeft': 'auto',
+    'marginBottom': '10px',
+    'padding': '6px 10px',
+    'width': '240px',
+    'border': f"1px solid {COLORS['border']}",
+    'borderRadius': '8px',
+    'fontFamily': 'Helvetica Neue, Arial, sans-serif'
+}
+
+export_links_style = {
+    'display': 'flex',
+    'flexWrap': 'wrap',
+    'gap': '6px 12px',
+    'marginBottom': '10px',
+    'fontSize': '13px',
+    'color': COLORS['text']
+}
+
 app = Dash(__name__)
 
+# CLIENTSIDE_FILTERING=1 ships each uploaded year's cube to the browser once
+# and answers every filter change there (assets/crossfilter.js), with no
+# server round trips; meant for read-only viewers on slow connections. The
+# server-side filter callbacks are then not registered. What still goes to
+# the server: the cubes themselves when the uploaded years change, uploads
+# and their polling, and the panels built from data that stays there (the
+# school table, the map and the export links). Those take the filters when
+# "Apply" is pressed, and otherwise only react to their own controls
+# (paging, search, sorting, map level and zoom), so changing a filter makes
+# no request at all.
+CLIENTSIDE_FILTERING = os.environ.get('CLIENTSIDE_FILTERING') == '1'
+
+
+def server_side(*args, **kwargs):
+    # app.callback for the callbacks that client-side filtering replaces.
+    if CLIENTSIDE_FILTERING:
+        return lambda func: func
+    return app.callback(*args, **kwargs)
+
+
+def panel_filter(component_id):
+    # A filter of the server-built panels: an input, or with client-side
+    # filtering only read when Apply (apply_btn) is pressed.
+    return (State if CLIENTSIDE_FILTERING else Input)(component_id, 'value')
+
+
+# Finished card/figure outputs per (dataset id, filter state), so flipping back
+# to a recent view skips pandas and plotly entirely. Hit/miss counters are
+# served on /cache-stats for tuning the bounds.
+results_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('RESULT_CACHE_MB', 64)) * 1024 * 1024,
+)
+
+
+@app.server.route('/cache-stats')
+def cache_stats():
+    return results_cache.stats()
+
+
+# Per-callback wall time, payload sizes and a per-phase breakdown (store
+# decode, filter, aggregate, figure build, serialize), plus loaded dataset
+# sizes and result cache counters, in Prometheus text format on /metrics.
+metrics = CallbackMetrics()
+metrics.install(app.server)
+startup.install(app.server, ('update_metrics_and_chart', 'send_client_cube'))
+metrics.add_collector(startup.collect)
+
+
+def dataset_sizes():
+    # Labelled by school year only: dataset ids are what grants access to an
+    # upload, so they are never published.
+    sizes = {}
+    for dataset in loaded_datasets():
+        sizes[dataset.school_year or ''] = sizes.get(dataset.school_year or '', 0) + dataset.memory_bytes
+    return sizes
+
+
+@metrics.add_collector
+def dataset_and_cache_metrics():
+    stats = results_cache.stats()
+    return [
+        ('enrollment_dataset_bytes', 'gauge', 'Memory held by the loaded datasets (frames and cubes) per school year.',
+         [({'school_year': year}, size) for year, size in dataset_sizes().items()]),
+        ('enrollment_ingest_jobs_running', 'gauge', 'Uploads being parsed in the background.',
+         [({}, len(ingest_jobs.running()))]),
+        ('enrollment_result_cache_entries', 'gauge', 'Outputs held in the result cache.', [({}, stats['entries'])]),
+        ('enrollment_result_cache_bytes', 'gauge', 'Approximate size of the result cache.', [({}, stats['bytes'])]),
+        ('enrollment_result_cache_hits_total', 'counter', 'Result cache hits.', [({}, stats['hits'])]),
+        ('enrollment_result_cache_misses_total', 'counter', 'Result cache misses.', [({}, stats['misses'])]),
+        ('enrollment_result_cache_evictions_total', 'counter', 'Result cache evictions.', [({}, stats['evictions'])]),
+    ]
+
+
+@app.server.route('/metrics')
+def prometheus_metrics():
+    return metrics.response()
+
+
+# Cleaned datasets are also written to a local Arrow cache keyed by content
+# hash, so restarts and re-uploads of the same export skip the CSV parse.
+disk_cache = DatasetDiskCache(
+    os.environ.get('DATASET_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dataset_cache')),
+    int(os.environ.get('DATASET_CACHE_MB', 2048)) * 1024 * 1024,
+)
+
+
+def session_secret():
+    # SECRET_KEY, or a key generated once and kept in the dataset cache
+    # directory, so that every worker process and restart signs alike.
+    secret = os.environ.get('SECRET_KEY')
+    if secret:
+        return secret
+    secret = secrets.token_hex(32)
+    path = os.path.join(disk_cache.directory, 'secret.key')
+    try:
+        os.makedirs(disk_cache.directory, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            f.write(secret)
+        try:
+            # Whichever process links it first wins; the others read theirs.
+            os.link(temporary, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporary)
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return secret
+
+
+# Each browser gets a random session id in Flask's signed session cookie.
+# Datasets are held per session id (enrollment.data.hold_dataset), so one
+# session's Clear Data or another's uploads never unload a dataset a session
+# is still showing.
+app.server.secret_key = session_secret()
+
+
+def session_id():
+    # None outside a request (warm-up, background jobs).
+    if not has_request_context():
+        return None
+    if 'id' not in session:
+        session['id'] = secrets.token_hex(16)
+    return session['id']
+
+
+# A session may only read the datasets it uploaded (or merged), whose ids
+# its cookie lists, newest last, and the preloaded one. The ids in the
+# browser's stores can't widen that: a dataset the cookie doesn't list is
+# treated as not loaded, by callbacks, exports and the API alike.
+MAX_SESSION_DATASETS = 64
+
+
+def grant_dataset(data_id):
+    if has_request_context():
+        granted = [i for i in session.get('datasets', []) if i != data_id]
+        session['datasets'] = (granted + [data_id])[-MAX_SESSION_DATASETS:]
+
+
+def may_read(data_id):
+    # Everything is readable outside a request (warm-up, background jobs).
+    if not has_request_context() or data_id in (preloaded_partitions or {}).values():
+        return True
+    return data_id in session.get('datasets', ())
+
+
+# Boundaries for the map, one GeoJSON file per level (region.geojson,
+# province.geojson, division.geojson) under BOUNDARY_DIR, each feature
+# carrying the area's name in BOUNDARY_NAME_PROPERTY, either as in the LIS
+# export ("Region I", "NCR") or as the dashboard shows it after cleaning
+# ("ILOCOS REGION", "NATIONAL CAPITAL REGION"); case and spacing don't
+# matter. Their simplified copies are cached next to the datasets. None ship
+# with the dashboard: the PSA/NAMRIA administrative boundaries on the
+# Humanitarian Data Exchange (data.humdata.org, "Philippines - Subnational
+# Administrative Boundaries") have regions and provinces, whose names need
+# renaming to those labels. The map panel only offers the levels with a
+# file, and is hidden without any; the files are looked for at startup.
+boundaries = BoundaryStore(
+    os.environ.get('BOUNDARY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'boundaries')),
+    disk_cache.directory,
+    os.environ.get('BOUNDARY_NAME_PROPERTY', 'name'),
+)
+MAP_LEVELS = [level for level in GEO_LEVELS if boundaries.available(level)]
+
+
+# Held while a dataset is loaded from disk, so that a request arriving while
+# the warm-up (or another request) is loading it waits instead of loading it
+# a second time.
+_disk_load_lock = threading.Lock()
+
+
+def find_dataset(data_id):
+    # The dataset, if this session may read it (see may_read).
+    return load_dataset(data_id) if may_read(data_id) else None
+
+
+def load_dataset(data_id):
+    # Memory first, then the on-disk cache (e.g. after a restart).
+    dataset = get_dataset(data_id)
+    if dataset is None and data_id is not None:
+        with _disk_load_lock:
+            dataset = get_dataset(data_id)
+            if dataset is None:
+                dataset = load_from_disk(data_id, disk_cache)
+                if dataset is not None:
+                    register_dataset(dataset)
+    return dataset
+
+
+def active_partition(partitions, year):
+    # The dataset behind the selected school year, defaulting to the latest.
+    # The session showing them holds every uploaded year's dataset that it
+    # may read and that is loaded (the selected one is loaded here first).
+    if not partitions:
+        return None
+    if year not in partitions:
+        year = max(partitions)
+    dataset = find_dataset(partitions[year])
+    holder = session_id()
+    if holder is not None:
+        for data_id in partitions.values():
+            if may_read(data_id):
+                hold_dataset(data_id, holder)
+    return dataset
+
+
+# PRELOAD_LATEST_DATASET=1 opens every new session on the most recently used
+# cached dataset. Only its meta.json is read here; the dataset itself is
+# loaded by the warm-up below (or by the first request, if that comes first).
+preloaded_partitions = None
+if os.environ.get('PRELOAD_LATEST_DATASET') == '1':
+    preloaded_id = disk_cache.most_recent()
+    preloaded_meta = disk_cache.meta(preloaded_id)
+    if preloaded_meta is not None:
+        preloaded_partitions = {preloaded_meta.get('school_year') or 'Uploaded data': preloaded_id}
+
+# What the map can show: the overall total, each stage, grade level and SHS track.
+MAP_MEASURES = ([('All', 'Total enrollment')] + [(stage, stage) for stage in STAGES]
+                + [(grade, grade) for grade in ELEMENTARY_GRADES + JUNIOR_GRADES]
+                + [(track, f"SHS {track.replace('ACAD ', '')}") for track in SHS_TRACKS])
+
+# Rows per page of the school table; only one page is ever sent.
+SCHOOL_PAGE_SIZE = int(os.environ.get('SCHOOL_PAGE_SIZE', 25))
+
 app.layout = html.Div([
-    dcc.Store(id='stored-data'),
+    dcc.Store(id='stored-data', data=preloaded_partitions),
+    dcc.Store(id='view-key'),
+    dcc.Store(id='ingest-job'),
+    dcc.Store(id='client-cube'),
+    dcc.Store(id='map-view'),
+    dcc.Interval(id='ingest-poll', interval=500, disabled=True),
 
     # Header with Logo
     html.Div([
@@ -300,7 +568,7 @@ app.layout = html.Div([
             dcc.Upload(
                 id='upload-dataset',
                 children=html.Button('Upload Data', style=primary_button_style),
-                multiple=False
+                multiple=True
             ),
             html.Button('Clear Data', id='clear-btn', style=danger_button_style),
             
@@ -314,6 +582,15 @@ app.layout = html.Div([
         # Left: Filters
         html.Div([
             html.Button("Clear Filter", id="clear_btn", style=filter_button_style),
+            html.Button("Apply to Schools, Map and Exports", id="apply_btn", title=(
+                "The charts follow the filters as they change; the school table, map and export links "
+                "are built on the server and follow them when this is pressed."),
+                style={**filter_button_style, 'backgroundColor': COLORS['primary'],
+                       **({} if CLIENTSIDE_FILTERING else {'display': 'none'})}),
+
+            html.Label("School Year", style=filter_label_style),
+            dcc.Dropdown(id="year_dd", placeholder="Select School Year", clearable=False,
+                         style=dropdown_style),
 
             html.Label("Region", style=filter_label_style),
             dcc.Dropdown(id="region_dd", placeholder="Select Region(s)", multi=True,
@@ -452,7 +729,67 @@ app.layout = html.Div([
                         style={"height": "250px", "width": "100%"}
                     )
                 ], style={**level_chart_style, "flex": "1"}),
-            ], style={'display': 'flex', "gap": "15px"})
+            ], style={'display': 'flex', "gap": "15px"}),
+
+            # Enrollment across the uploaded school years
+            html.Div([
+                html.H3("Enrollment by School Year", style=chart_heading_style),
+                dcc.Graph(
+                    id="trend_chart",
+                    config={'displayModeBar': False},
+                    style={"height": "250px", "width": "100%"}
+                )
+            ], style={**level_chart_style, "marginTop": "15px"}),
+
+            # Enrollment per Region/Province/Division; clicking an area filters on it
+            html.Div([
+                html.Div([
+                    html.H3("Enrollment by Area", style=chart_heading_style),
+                    dcc.RadioItems(id='map-level', options=MAP_LEVELS, value=(MAP_LEVELS or [None])[0], inline=True,
+                                   inputStyle={'marginRight': '4px'}, labelStyle={'marginRight': '12px'},
+                                   style={'fontSize': '13px', 'marginLeft': 'auto'}),
+                    dcc.Dropdown(id='map-measure', options=[{'label': label, 'value': value} for value, label in MAP_MEASURES],
+                                 value=MAP_MEASURES[0][0], clearable=False, style={'width': '200px', 'fontSize': '13px'}),
+                    dcc.RadioItems(id='map-gender', options=['Both', *GENDERS], value='Both', inline=True,
+                                   inputStyle={'marginRight': '4px'}, labelStyle={'marginRight': '12px'},
+                                   style={'fontSize': '13px'}),
+                ], style={'display': 'flex', 'alignItems': 'center', 'gap': '15px', 'marginBottom': '10px'}),
+                dcc.Graph(
+                    id="map_chart",
+                    config={'displayModeBar': False, 'scrollZoom': True},
+                    style={"height": "450px", "width": "100%"}
+                )
+            ], style={**level_chart_style, "height": "auto", "marginTop": "15px",
+                      **({} if MAP_LEVELS else {"display": "none"})}),
+
+            # The schools behind the current filters, one page at a time
+            html.Div([
+                html.Div([
+                    html.H3("Schools", style=chart_heading_style),
+                    html.Div(id='school-count', style={'color': COLORS['accent'], 'fontSize': '13px'}),
+                    dcc.Input(id='school-search', type='search', debounce=True,
+                              placeholder='Search school name or ID', style=school_search_style),
+                ], style={'display': 'flex', 'alignItems': 'center', 'gap': '15px'}),
+                html.Div(id='export-links', style=export_links_style),
+                dash_table.DataTable(
+                    id='school-table',
+                    columns=[{'name': col, 'id': col, 'type': 'numeric' if col in TOTAL_COLUMNS else 'text'}
+                             for col in SCHOOL_COLUMNS + TOTAL_COLUMNS],
+                    data=[],
+                    page_action='custom',
+                    page_current=0,
+                    page_size=SCHOOL_PAGE_SIZE,
+                    page_count=0,
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[],
+                    style_as_list_view=True,
+                    style_header={'fontWeight': '600', 'backgroundColor': COLORS['light_gray']},
+                    style_cell={'fontFamily': 'inherit', 'fontSize': '13px', 'padding': '6px',
+                                'textAlign': 'left', 'color': COLORS['text']},
+                    style_cell_conditional=[{'if': {'column_id': col}, 'textAlign': 'right'} for col in TOTAL_COLUMNS],
+                )
+            ], style={**level_chart_style, "height": "auto", "marginTop": "15px"})
 
         ], style={'flex': '1', 'width': '75%'}),
 
@@ -470,32 +807,321 @@ app.layout = html.Div([
     'fontFamily': 'Helvetica Neue, Arial, sans-serif',
     'boxSizing': 'border-box'
 })
+startup.mark('layout')
+
+
+# Uploads are parsed, aggregated and saved by background jobs, so the
+# upload request returns at once. With the disk cache on, an upload's parse,
+# cleaning and aggregation run in an ingest worker process (enrollment.worker;
+# INGEST_PROCESSES=0 keeps them on the job's thread), outside this process's
+# GIL, and hand the dataset back through the cache; merges, which only index
+# and aggregate the appended rows, run on the job's thread. The browser keeps the pending jobs in the
+# ingest-job store and polls them with ingest-poll; the filters stay disabled
+# until they finish, and a new upload or Clear Data cancels them. A job is
+# keyed by the file's hash, so two sessions uploading the same file share it:
+# each pending upload holds the jobs it waits for under its own owner token,
+# and a job is only cancelled when no upload holds it any more. Running jobs
+# are marked in the dataset cache directory for the other worker processes.
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+ingest_jobs = JobQueue(INGEST_WORKERS,
+                       marker_directory=os.path.join(disk_cache.directory, 'jobs') if disk_cache.enabled else None)
+ingest_workers = None
+if disk_cache.enabled and os.environ.get('INGEST_PROCESSES', '1') == '1':
+    ingest_workers = WorkerPool(INGEST_WORKERS, disk_cache.directory, disk_cache.max_bytes)
+LOST_JOB = "the server stopped processing it. Please upload the file again."
+
+
+def ingest(job, contents, upload_id, year):
+    # Background task behind an upload: the on-disk cache if the file was seen
+    # before, else a streaming parse; then the indexes and cube.
+    with metrics.phase('load', callback='ingest'):
+        job.report(stage='Loading')
+        dataset = load_from_disk(upload_id, disk_cache)
+    if dataset is None and ingest_workers is not None:
+        for phase, seconds in ingest_workers.ingest(job, contents, upload_id, year).items():
+            metrics.phases.observe(seconds, 'ingest', phase)
+        # None only if the cache could not keep it (e.g. larger than the
+        # cache); it is then parsed here after all.
+        dataset = load_from_disk(upload_id, disk_cache)
+    if dataset is None:
+        with metrics.phase('parse', callback='ingest'):
+            job.report(0.0, 'Reading')
+            frame, cells = initial_dataset(contents, job.report)
+        with metrics.phase('aggregate', callback='ingest'):
+            job.report(stage='Aggregating')
+            dataset = Dataset(upload_id, frame, cells, school_year=year).build()
+        dataset = persist(job, dataset, 'ingest')
+    job.report()
+    return register_dataset(dataset)
+
+
+def merge(job, base_id, files, merge_id):
+    # Background task merging uploaded files, each already ingested on its
+    # own, into the dataset `base_id` (or into the first file when the year
+    # had none). Only the appended rows are indexed and aggregated.
+    with metrics.phase('load', callback='merge'):
+        job.report(stage='Loading')
+        dataset = load_from_disk(merge_id, disk_cache)
+    if dataset is None:
+        parts = [(file['label'], find_dataset(file['id'])) for file in files]
+        base_label, base = (None, find_dataset(base_id)) if base_id is not None else parts.pop(0)
+        with metrics.phase('merge', callback='merge'):
+            job.report(0.0, 'Merging')
+            dataset = merge_datasets(base, parts, merge_id, job.report, base_label)
+        dataset = persist(job, dataset, 'merge')
+    job.report()
+    return register_dataset(dataset)
+
+
+def persist(job, dataset, callback):
+    with metrics.phase('persist', callback=callback):
+        job.report(stage='Saving')
+        save_to_disk(dataset, disk_cache)
+        # Continue on the memory-mapped copy, which other worker processes
+        # share, and let the parsed one go.
+        return load_from_disk(dataset.id, disk_cache) or dataset
+
+
+def ingest_status(job, label):
+    if job.stage in ('Reading', 'Merging'):
+        return f"{job.stage} {label}: {job.progress:.0%}"
+    return f"{job.stage} {label}..."
+
+
+def add_partition(partitions, year, upload_id):
+    # Replaces that year's partition only.
+    partitions = dict(partitions or {})
+    replaced = partitions.get(year)
+    if replaced is not None and replaced != upload_id:
+        results_cache.invalidate(replaced)
+    partitions[year] = upload_id
+    return partitions
+
+
+def poll_jobs(jobs):
+    # ('running', status text), ('failed', error), ('cancelled', None) or
+    # ('done', None) for the pending jobs as a whole.
+    running = []
+    for pending in jobs:
+        job = ingest_jobs.get(pending['id'])
+        if job is None:
+            # Submitted on another worker process: finished once it is on
+            # disk, lost if that process no longer runs it (e.g. restarted).
+            if find_dataset(pending['id']) is not None:
+                continue
+            if not ingest_jobs.running_elsewhere(pending['id']):
+                return 'failed', LOST_JOB
+            running.append(f"Processing {pending['label']}...")
+        elif job.status == 'running':
+            running.append(ingest_status(job, pending['label']))
+        elif job.status in ('failed', 'cancelled'):
+            return job.status, job.error
+    if running:
+        return 'running', "; ".join(running)
+    return 'done', None
+
+
+def cancel_jobs(pending, keep=()):
+    # Releases the upload's hold on its jobs; a job nobody else holds stops.
+    for job in (pending or {}).get('jobs', []):
+        if job['id'] not in keep:
+            ingest_jobs.cancel(job['id'], pending.get('owner'))
+
+
+def merge_summary(datasets):
+    # What the merges left out, with the conflicting schools listed.
+    duplicates = sum(dataset.merge_report.duplicates for dataset in datasets)
+    conflicts = [c for dataset in datasets for c in dataset.merge_report.conflicts]
+    conflict_count = sum(dataset.merge_report.conflict_count for dataset in datasets)
+    if not duplicates and not conflict_count:
+        return []
+    summary = [html.Span(f" {duplicates:,} duplicate school rows skipped.")]
+    if conflict_count:
+        shown = f" (first {len(conflicts)})" if len(conflicts) < conflict_count else ""
+        summary.append(html.Details([
+            html.Summary(f"{conflict_count:,} conflicting rows: same BEIS School ID, different values; "
+                         f"the row loaded first was kept{shown}."),
+            html.Ul([html.Li(f"{c['school_id']} in {c['file']}: {', '.join(c['columns'])}") for c in conflicts]),
+        ], style={'color': COLORS['warning']}))
+    return summary
+
+
+def finish_upload(files, partitions, owner):
+    # Called once every uploaded file is ingested. A year's files are merged
+    # into the partition it already has, if any (files already part of it are
+    # skipped), and with each other; a lone file for a new year becomes its
+    # partition as is. Returns the callback outputs: done, or the merge jobs
+    # to poll next.
+    years = {}
+    for file in files:
+        years.setdefault(file['year'], []).append(file)
+    partitions, merges = dict(partitions or {}), []
+    for year, year_files in years.items():
+        base = find_dataset(partitions.get(year))
+        loaded = set(base.parts) if base is not None else set()
+        new_files = [file for file in year_files if file['id'] not in loaded]
+        if not new_files:
+            continue
+        if base is None and len(new_files) == 1:
+            partitions = add_partition(partitions, year, new_files[0]['id'])
+            continue
+        merge_id = merged_dataset_id((base.parts if base is not None else []) + [file['id'] for file in new_files])
+        label = ", ".join(file['label'] for file in year_files)
+        grant_dataset(merge_id)
+        if get_dataset(merge_id) is None:
+            ingest_jobs.submit(merge_id, merge, base.id if base is not None else None, new_files, merge_id,
+                               holder=owner)
+        merges.append({'id': merge_id, 'year': year, 'label': label})
+
+    label = ", ".join(file['label'] for file in files)
+    if merges:
+        return f"Merging: {label}", partitions, "", {'stage': 'merge', 'jobs': merges, 'owner': owner}, False
+    return f"Uploaded: {label}", partitions, "", None, True
 
 
 # Callback: Upload or Clear File
+# The cleaned frames stay on the server; the store maps each school year to
+# its dataset id, so every uploaded year is its own partition. Several files
+# can be uploaded at once (e.g. regional extracts): each is parsed as its own
+# ingest job, in parallel, and the files of a year are then merged into that
+# year's partition, deduplicated on BEIS School ID. Files already loaded skip
+# the ingest job.
 @app.callback(
     Output('output-upload', 'children'),
     Output('stored-data', 'data'),
+    Output('header-status', 'children'),
+    Output('ingest-job', 'data'),
+    Output('ingest-poll', 'disabled'),
     Input('upload-dataset', 'contents'),
     Input('clear-btn', 'n_clicks'),
-    State('upload-dataset', 'filename')
+    State('upload-dataset', 'filename'),
+    State('stored-data', 'data'),
+    State('ingest-job', 'data'),
 )
-def handle_upload_or_clear(contents, clear_clicks, filename):
+@metrics.callback
+def handle_upload_or_clear(contents, clear_clicks, filenames, partitions, pending):
     triggered_id = ctx.triggered_id
     if triggered_id == 'clear-btn':
-        return "Upload cleared. Please upload a new file.", None
+        cancel_jobs(pending)
+        for data_id in (partitions or {}).values():
+            # Unloaded only if no other session is showing it.
+            if release_dataset(data_id, session_id()):
+                results_cache.invalidate(data_id)
+        return "Upload cleared. Please upload a new file.", None, "", None, True
     if contents is None:
-        return "No file uploaded yet.", None
+        # Initial call: keep whatever the store opened with (e.g. a preload).
+        return ("No file uploaded yet." if not partitions else no_update), no_update, "", no_update, no_update
+    if isinstance(contents, str):
+        contents, filenames = [contents], [filenames]
+
+    files, uploads = [], {}
+    for file_contents, filename in zip(contents, filenames):
+        try:
+            upload_id = dataset_id(file_contents)
+            year = school_year_label(filename, file_contents)
+        except Exception as e:
+            return f"Error reading {filename}: {e}", no_update, "", no_update, no_update
+        if upload_id in uploads:
+            continue
+        grant_dataset(upload_id)
+        label = filename if year == filename else f"{filename} ({year})"
+        files.append({'id': upload_id, 'year': year, 'label': label})
+        uploads[upload_id] = file_contents
+    cancel_jobs(pending, keep=uploads)
+    # Kept jobs stay held by the same owner.
+    owner = (pending or {}).get('owner') or secrets.token_hex(8)
+
+    new_files = [file for file in files if get_dataset(file['id']) is None]
+    if not new_files:
+        return finish_upload(files, partitions, owner)
+    jobs = [ingest_jobs.submit(file['id'], ingest, uploads[file['id']], file['id'], file['year'], holder=owner)
+            for file in new_files]
+    status = "; ".join(ingest_status(job, file['label']) for job, file in zip(jobs, new_files))
+    pending = {'stage': 'ingest', 'jobs': new_files, 'files': files, 'owner': owner}
+    return f"Processing: {', '.join(file['label'] for file in files)}", no_update, status, pending, False
 
-    try:
-        df = initial_dataset(contents)
-        return f"Uploaded: {filename}", df.to_dict('records')
-    except Exception as e:
-        return f"Error reading file: {e}", None
 
+@app.callback(
+    Output('output-upload', 'children', allow_duplicate=True),
+    Output('stored-data', 'data', allow_duplicate=True),
+    Output('header-status', 'children', allow_duplicate=True),
+    Output('ingest-job', 'data', allow_duplicate=True),
+    Output('ingest-poll', 'disabled', allow_duplicate=True),
+    Input('ingest-poll', 'n_intervals'),
+    State('ingest-job', 'data'),
+    State('stored-data', 'data'),
+    prevent_initial_call=True
+)
+@metrics.callback
+def poll_ingest_job(n_intervals, pending, partitions):
+    if not pending:
+        return no_update, no_update, "", no_update, True
+    status, detail = poll_jobs(pending['jobs'])
+    if status == 'running':
+        return no_update, no_update, detail, no_update, no_update
+    if status == 'failed':
+        cancel_jobs(pending)
+        action = "reading file" if pending['stage'] == 'ingest' else "merging files"
+        return f"Error {action}: {detail}", no_update, "", None, True
+    if status == 'cancelled':
+        cancel_jobs(pending)
+        return no_update, no_update, "", None, True
+    for job in pending['jobs']:
+        ingest_jobs.forget(job['id'], pending.get('owner'))
+
+    if pending['stage'] == 'ingest':
+        return finish_upload(pending['files'], partitions, pending.get('owner'))
+    for job in pending['jobs']:
+        partitions = add_partition(partitions, job['year'], job['id'])
+    merged = [find_dataset(job['id']) for job in pending['jobs']]
+    label = ", ".join(job['label'] for job in pending['jobs'])
+    return [f"Uploaded: {label}.", *merge_summary(merged)], partitions, "", None, True
+
+
+# Filter dropdown -> column it filters.
+DROPDOWN_COLUMNS = {
+    'region_dd': 'Region',
+    'province_dd': 'Province',
+    'division_dd': 'Division',
+    'district_dd': 'District',
+    'municipality_dd': 'Municipality',
+    'legislative_district_dd': 'Legislative District',
+    'sector_dd': 'Sector',
+    'school_type_dd': 'School Type',
+    'modified_coc_dd': 'Modified COC',
+    'school_subclass_dd': 'School Subclassification',
+}
+FILTER_DROPDOWNS = ['year_dd', *DROPDOWN_COLUMNS]
+OPTION_DROPDOWNS = [next(d for d, col in DROPDOWN_COLUMNS.items() if col == column) for column in OPTION_CHAIN]
 
-# Callback: Populate Dropdown filters based on previous selections
+
+# Callback: Filters stay disabled while an upload is processed
 @app.callback(
+    [Output(dropdown, 'disabled') for dropdown in FILTER_DROPDOWNS],
+    Output('clear_btn', 'disabled'),
+    Input('ingest-job', 'data'),
+)
+@metrics.callback
+def lock_filters(pending):
+    return (pending is not None,) * (len(FILTER_DROPDOWNS) + 1)
+
+
+# Callback: School year options, opening on the latest uploaded year
+@app.callback(
+    Output('year_dd', 'options'),
+    Output('year_dd', 'value'),
+    Input('stored-data', 'data'),
+)
+@metrics.callback
+def update_year_options(partitions):
+    if not partitions:
+        return [], None
+    years = sorted(partitions)
+    return [{'label': year, 'value': year} for year in years], years[-1]
+
+
+# Callback: Populate Dropdown filters based on previous selections
+@server_side(
     Output('region_dd', 'options'),
     Output('province_dd', 'options'),
     Output('district_dd', 'options'),
@@ -508,6 +1134,7 @@ def handle_upload_or_clear(contents, clear_clicks, filename):
     Output('school_subclass_dd', 'options'),
 
     Input('stored-data', 'data'),
+    Input('year_dd', 'value'),
     Input('region_dd', 'value'),
     Input('province_dd', 'value'),
     Input('district_dd', 'value'),
@@ -518,56 +1145,26 @@ def handle_upload_or_clear(contents, clear_clicks, filename):
     Input('school_type_dd', 'value'),
     Input('modified_coc_dd', 'value'),
 )
-
-def update_dropdown_options(data, region, province, district, division, municipality,
+@metrics.callback
+def update_dropdown_options(data, year, region, province, district, division, municipality,
                             legislative_district, sector, school_type, modified_coc):
-    if data is None:
+    with metrics.phase('store decode'):
+        dataset = active_partition(data, year)
+    if dataset is None:
         return ([],) * 10
 
-    df = pd.DataFrame(data)
-
-    # Region Options (use full data)
-    region_options = [{'label': r, 'value': r} for r in sorted(df['Region'].dropna().unique())]
-
-    # Province Options (filter only by region)
-    province_df = df[df['Region'].isin(region)] if region else df
-    province_options = [{'label': p, 'value': p} for p in sorted(province_df['Province'].dropna().unique())]
-
-    # District Options (filter by region and province)
-    district_df = province_df[province_df['Province'].isin(province)] if province else province_df
-    district_options = [{'label': d, 'value': d} for d in sorted(district_df['District'].dropna().unique())]
-
-    # Division Options (filter by region, province, and district)
-    division_df = district_df[district_df['District'].isin(district)] if district else district_df
-    division_options = [{'label': d, 'value': d} for d in sorted(division_df['Division'].dropna().unique())]
-
-    # Municipality Options (filter by region, province, district, division)
-    municipality_df = division_df[division_df['Division'].isin(division)] if division else division_df
-    municipality_options = [{'label': m, 'value': m} for m in sorted(municipality_df['Municipality'].dropna().unique())]
-
-    # Legislative District Options
-    legislative_district_df = municipality_df[municipality_df['Municipality'].isin(municipality)] if municipality else municipality_df
-    legislative_district_options = [{'label': l, 'value': l} for l in sorted(legislative_district_df['Legislative District'].dropna().unique())]
-
-    # Sector Options
-    sector_df = legislative_district_df[legislative_district_df['Legislative District'].isin(legislative_district)] if legislative_district else legislative_district_df
-    sector_options = [{'label': s, 'value': s} for s in sorted(sector_df['Sector'].dropna().unique())]
+    # Only the dropdowns below the one that changed need new options.
+    dropdown_levels = ['region_dd', 'province_dd', 'district_dd', 'division_dd', 'municipality_dd',
+                       'legislative_district_dd', 'sector_dd', 'school_type_dd', 'modified_coc_dd']
+    triggered = [dropdown_levels.index(i) for i in ctx.triggered_prop_ids.values() if i in dropdown_levels]
+    reload = {'stored-data', 'year_dd'} & set(ctx.triggered_prop_ids.values())
+    start = min(triggered) + 1 if triggered and not reload else 0
 
-    # School Type Options
-    school_type_df = sector_df[sector_df['Sector'].isin(sector)] if sector else sector_df
-    school_type_options = [{'label': s, 'value': s} for s in sorted(school_type_df['School Type'].dropna().unique())]
-
-    # Modified COC Options
-    modified_coc_df = school_type_df[school_type_df['School Type'].isin(school_type)] if school_type else school_type_df
-    modified_coc_options = [{'label': m, 'value': m} for m in sorted(modified_coc_df['Modified COC'].dropna().unique())]
-
-    # Subclass Options
-    school_subclass_df = modified_coc_df[modified_coc_df['Modified COC'].isin(modified_coc)] if modified_coc else modified_coc_df
-    school_subclass_options = [{'label': s, 'value': s} for s in sorted(school_subclass_df['School Subclassification'].dropna().unique())]
-
-    return (region_options, province_options, district_options, division_options,
-            municipality_options, legislative_district_options, sector_options,
-            school_type_options, modified_coc_options, school_subclass_options)
+    selections = [region, province, district, division, municipality, legislative_district, sector,
+                  school_type, modified_coc]
+    with metrics.phase('filter'):
+        options = dataset.options.cascade(selections, start)
+    return tuple([no_update] * start + options)
 
 
 # clear filter
@@ -585,195 +1182,213 @@ def update_dropdown_options(data, region, province, district, division, municipa
     Input('clear_btn', 'n_clicks'),
     prevent_initial_call=True
 )
+@metrics.callback
 def clear_all_dropdowns(n_clicks):
     return ([],) * 10
 
 
-elementary_male = [
-    'K Male', 'G1 Male', 'G2 Male', 'G3 Male', 'G4 Male', 'G5 Male', 'G6 Male', 'Elem NG Male'
-]
-elementary_female = [
-    'K Female', 'G1 Female', 'G2 Female', 'G3 Female', 'G4 Female', 'G5 Female', 'G6 Female', 'Elem NG Female'
-]
+# Apple-style plot formatting
+apple_theme = {
+    'plot_bgcolor': 'white',
+    'paper_bgcolor': 'white',
+    'font': {'color': '#1d1d1f', 'family': 'SF Pro Display, Helvetica, Arial, sans-serif'},
+    'title_font_size': 16,
+    'xaxis': {'showgrid': False},
+    'yaxis': {'showgrid': True, 'gridcolor': '#f5f5f7','title': None},
+    'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1},
+    'margin': dict(l=10, r=10, t=40, b=10),
+}
 
-junior_male = [
-    'G7 Male', 'G8 Male', 'G9 Male', 'G10 Male', 'JHS NG Male'
-]
-junior_female = [
-    'G7 Female', 'G8 Female', 'G9 Female', 'G10 Female', 'JHS NG Female'
-]
+male_color = '#0038a8'
+female_color = '#c7a93f'
 
-senior_male = [
-    'G11 ACAD ABM Male', 'G11 ACAD HUMSS Male', 'G11 ACAD STEM Male', 'G11 ACAD GAS Male', 'G11 ACAD PBM Male',
-    'G11 TVL Male', 'G11 SPORTS Male', 'G11 ARTS Male', 'G12 ACAD ABM Male', 'G12 ACAD HUMSS Male',
-    'G12 ACAD STEM Male', 'G12 ACAD GAS Male', 'G12 ACAD PBM Male', 'G12 TVL Male', 'G12 SPORTS Male', 'G12 ARTS Male'
-]
-senior_female = [
-    'G11 ACAD ABM Female', 'G11 ACAD HUMSS Female', 'G11 ACAD STEM Female', 'G11 ACAD GAS Female',
-    'G11 ACAD PBM Female',
-    'G11 TVL Female', 'G11 SPORTS Female', 'G11 ARTS Female', 'G12 ACAD ABM Female', 'G12 ACAD HUMSS Female',
-    'G12 ACAD STEM Female', 'G12 ACAD GAS Female', 'G12 ACAD PBM Female', 'G12 TVL Female', 'G12 SPORTS Female',
-    'G12 ARTS Female'
-]
 
+# Each output below is built on its own from a shared Selection, so it can be
+# cached and re-sent independently of the others. All of them read the
+# selection's aggregates: every grade/track/stage x gender total from one
+# pass over the cube totals (see enrollment.plan).
+def summary_card(label, value, share, change=None):
+    children = [
+        html.H4(label, style={'fontSize': '15px', 'margin': '0px', 'marginTop':'5px'}),
+        html.Div(f"{int(value):,}", style={'fontSize': '30px', 'fontWeight': 'bold'}),
+        html.Div(share, style={'fontSize': '14px', 'color': '#888'}),]
+    if change is not None:
+        children.append(html.Div(change, style={'fontSize': '12px', 'color': '#888'}))
+    return html.Div(children)
 
 
-# Metrics and bar chart callback
-@app.callback(
-    Output('male_summary_card', 'children'),
-    Output('female_summary_card', 'children'),
-    Output('total_summary_card', 'children'),
-    Output('total_school_card', 'children'),
-    Output('education_bar_chart', 'figure'),
-    Output('elementary_bar_chart', 'figure'),
-    Output('jhs_bar_chart', 'figure'),
-    Output('shs_bar_chart', 'figure'),
-    Output('enrollment_rate_chart', 'figure'),
-    Output('tracks_rate_chart', 'figure'),
+def year_change(selection, measure):
+    # Change of one card's value against the previous uploaded school year.
+    previous = selection.previous
+    if previous is None:
+        return None
+    before = measure(previous)
+    if not before:
+        return None
+    change = (measure(selection) - before) / before * 100
+    return f"{'▲' if change >= 0 else '▼'} {abs(change):.1f}% vs {previous.year}"
 
-    Input('stored-data', 'data'),
-    Input('region_dd', 'value'),
-    Input('province_dd', 'value'),
-    Input('division_dd', 'value'),
-    Input('district_dd', 'value'),
-    Input('municipality_dd', 'value'),
-    Input('legislative_district_dd', 'value'),
-    Input('sector_dd', 'value'),
-    Input('school_type_dd', 'value'),
-    Input('modified_coc_dd', 'value'),
-    Input('school_subclass_dd', 'value')
-)
-def update_metrics_and_chart(data, region, province, division, district, municipality,
-                             legislative_district, sector, school_type, modified_coc, school_subclass):
-    if data is None:
-        empty_fig = px.bar(
-            x=["Elementary", "Junior High School", "Senior High School"],
-            y=[0, 0, 0],
-            title="No data available",
-            labels={"x": "Education Level", "y": "Enrollment"}
-        )
-        empty_fig.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font={'color': '#1d1d1f'},
-            margin=dict(l=10, r=10, t=40, b=10),
-            title_font_size=16,
-            showlegend=False
-        )
-        return (
-            html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
-                                html.Div("Males", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
-                                style={
-                                    "display": "flex","flexDirection": "column","alignItems": "center"}),
-            html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
-                                html.Div("Females", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
-                                style={
-                                    "display": "flex","flexDirection": "column","alignItems": "center"}),
-            html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
-                                html.Div("Enrollment", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
-                                style={
-                                    "display": "flex","flexDirection": "column","alignItems": "center"}),
-            html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
-                                html.Div("Schools", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
-                                style={
-                                    "display": "flex","flexDirection": "column","alignItems": "center"}), 
-            empty_fig, 
-            empty_fig, 
-            empty_fig, 
-            empty_fig, 
-            empty_fig, 
-            empty_fig)
-
-    df = pd.DataFrame(data)
 
-    # this is fixed enrollees sum (will  not be changed based on the filters)
-    enrollment_cols = [col for col in df.columns if 'Male' in col or 'Female' in col]
-    df[enrollment_cols] = df[enrollment_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
-    fixed_enrollee_sum = int(df[enrollment_cols].sum().sum())
+def male_total(selection):
+    return selection.aggregates.at['All', 'Male']
 
-    # fixed total schools
-    fixed_total_schools = df.drop_duplicates().shape[0]
-
-    # Define columns
-    elementary_male = ['K Male', 'G1 Male', 'G2 Male', 'G3 Male', 'G4 Male', 'G5 Male', 'G6 Male', 'Elem NG Male']
-    elementary_female = ['K Female', 'G1 Female', 'G2 Female', 'G3 Female', 'G4 Female', 'G5 Female', 'G6 Female',
-                         'Elem NG Female']
-    junior_male = ['G7 Male', 'G8 Male', 'G9 Male', 'G10 Male', 'JHS NG Male']
-    junior_female = ['G7 Female', 'G8 Female', 'G9 Female', 'G10 Female', 'JHS NG Female']
-    senior_male = [
-        'G11 ACAD ABM Male', 'G11 ACAD HUMSS Male', 'G11 ACAD STEM Male', 'G11 ACAD GAS Male', 'G11 ACAD PBM Male',
-        'G11 TVL Male', 'G11 SPORTS Male', 'G11 ARTS Male', 'G12 ACAD ABM Male', 'G12 ACAD HUMSS Male',
-        'G12 ACAD STEM Male', 'G12 ACAD GAS Male', 'G12 ACAD PBM Male', 'G12 TVL Male', 'G12 SPORTS Male',
-        'G12 ARTS Male'
-    ]
-    senior_female = [
-        'G11 ACAD ABM Female', 'G11 ACAD HUMSS Female', 'G11 ACAD STEM Female', 'G11 ACAD GAS Female',
-        'G11 ACAD PBM Female',
-        'G11 TVL Female', 'G11 SPORTS Female', 'G11 ARTS Female', 'G12 ACAD ABM Female', 'G12 ACAD HUMSS Female',
-        'G12 ACAD STEM Female', 'G12 ACAD GAS Female', 'G12 ACAD PBM Female', 'G12 TVL Female', 'G12 SPORTS Female',
-        'G12 ARTS Female'
-    ]
-    all_gender_cols = elementary_male + elementary_female + junior_male + junior_female + senior_male + senior_female
 
-    # Apply filters
-    filters = {
-        'Region': region,
-        'Province': province,
-        'Division': division,
-        'District': district,
-        'Municipality': municipality,
-        'Legislative District': legislative_district,
-        'Sector': sector,
-        'School Type': school_type,
-        'Modified COC': modified_coc,
-        'School Subclassification': school_subclass
-    }
+def female_total(selection):
+    return selection.aggregates.at['All', 'Female']
 
-    for col, selected_values in filters.items():
-        if selected_values:
-            df = df[df[col].isin(selected_values)]
-
-    df[all_gender_cols] = df[all_gender_cols].replace('Not Applicable', 0)
-    df[all_gender_cols] = df[all_gender_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
-
-    total_male = df[[col for col in all_gender_cols if 'Male' in col]].sum().sum()
-    total_female = df[[col for col in all_gender_cols if 'Female' in col]].sum().sum()
-    total_enrollees = total_male + total_female
-    total_schools = df['BEIS School ID'].nunique()
-
-    # Apple-style plot formatting
-    apple_theme = {
-        'plot_bgcolor': 'white',
-        'paper_bgcolor': 'white',
-        'font': {'color': '#1d1d1f', 'family': 'SF Pro Display, Helvetica, Arial, sans-serif'},
-        'title_font_size': 16,
-        'xaxis': {'showgrid': False},
-        'yaxis': {'showgrid': True, 'gridcolor': '#f5f5f7','title': None},
-        'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1},
-        'margin': dict(l=10, r=10, t=40, b=10),
-    }
 
-    male_color = '#0038a8'
-    female_color = '#c7a93f'
+def enrollee_total(selection):
+    return selection.aggregates.loc['All'].sum()
+
+
+def school_total(selection):
+    return selection.totals.schools
 
-    # Education Level Bar Chart
-    bar_data = pd.DataFrame({
-        'Education Level': ['Elementary', 'Elementary', 'Junior High School', 'Junior High School',
-                            'Senior High School', 'Senior High School'],
-        'Gender': ['Male', 'Female'] * 3,
-        'Enrollment': [
-            df[elementary_male].sum().sum(), df[elementary_female].sum().sum(),
-            df[junior_male].sum().sum(), df[junior_female].sum().sum(),
-            df[senior_male].sum().sum(), df[senior_female].sum().sum()
-        ]
-    })
 
-    # Calculate total enrollment per education level
-    bar_data["Total Enrollment"] = bar_data.groupby("Education Level")["Enrollment"].transform("sum")
+def build_male_card(selection):
+    total_male = male_total(selection)
+    total_enrollees = total_male + female_total(selection)
+    return summary_card("Male", total_male,
+                        f"{int(total_male)/total_enrollees*100:.1f}% of Total" if total_enrollees > 0 else "0%",
+                        year_change(selection, male_total))
 
-    bar_data["Education Level"] = bar_data["Education Level"].replace({
-        "Junior High School": "Junior HS",
-        "Senior High School": "Senior HS"
+
+def build_female_card(selection):
+    total_female = female_total(selection)
+    total_enrollees = total_female + male_total(selection)
+    return summary_card("Female", total_female,
+                        f"{int(total_female)/total_enrollees*100:.1f}% of Total" if total_enrollees > 0 else "0%",
+                        year_change(selection, female_total))
+
+
+def build_enrollees_card(selection):
+    # this is fixed enrollees sum (will  not be changed based on the filters)
+    fixed_enrollee_sum = int(selection.dataset.national.sums.sum())
+    total_enrollees = enrollee_total(selection)
+    return summary_card("Enrollees", total_enrollees,
+                        f"{int(total_enrollees)/fixed_enrollee_sum*100:.1f}% of Nationwide" if fixed_enrollee_sum > 0 else "0%",
+                        year_change(selection, enrollee_total))
+
+
+def build_schools_card(selection):
+    # fixed total schools
+    fixed_total_schools = selection.dataset.distinct_rows
+    total_schools = school_total(selection)
+    return summary_card("Schools", total_schools,
+                        f"{int(total_schools)/fixed_total_schools*100:.1f}% of Nationwide" if fixed_total_schools > 0 else "0%",
+                        year_change(selection, school_total))
+
+
+def plain(value):
+    # A component or figure as plain JSON, for a dcc.Store.
+    return json.loads(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+# Trace arrays that change with the filters; everything else in a figure is fixed.
+FIGURE_DATA_PROPS = ('x', 'y', 'text', 'customdata')
+
+
+# The charts are px figures built once over placeholder values (the *_template
+# functions below) and kept as plain figure dicts without their data arrays.
+# Per request only those arrays are computed and dropped into a copy of the
+# skeleton, so layout, colors and hovertemplates never go through px again.
+#
+# Prebuilt figures (the skeletons and the empty figure) are also saved next to
+# the dataset cache, keyed by the plotly version and this script's source, so
+# a restarted process reads them back instead of running px. Nothing else uses
+# plotly.express, so the templates import it themselves and a process with
+# saved figures never loads it.
+with open(__file__, 'rb') as f:
+    FIGURE_CACHE = os.path.join(disk_cache.directory, 'figures-{}.json'.format(
+        hashlib.sha256(plotly.__version__.encode() + f.read()).hexdigest()[:16]))
+
+_prebuilt = None
+_prebuilt_lock = threading.Lock()
+
+
+def prebuilt_figure(name, build):
+    # Locked so that a request arriving during warm-up waits for the figure
+    # instead of building it a second time.
+    global _prebuilt
+    with _prebuilt_lock:
+        if _prebuilt is None:
+            try:
+                with open(FIGURE_CACHE) as f:
+                    _prebuilt = json.load(f)
+            except (OSError, ValueError):
+                _prebuilt = {}
+        if name not in _prebuilt:
+            _prebuilt[name] = build()
+        return _prebuilt[name]
+
+
+def save_prebuilt_figures():
+    # Write the figures built so far for the next process (and drop files
+    # left by other versions).
+    if disk_cache.max_bytes <= 0 or os.path.exists(FIGURE_CACHE):
+        return
+    with _prebuilt_lock:
+        figures = dict(_prebuilt or {})
+    try:
+        os.makedirs(disk_cache.directory, exist_ok=True)
+        scratch = f'{FIGURE_CACHE}.{os.getpid()}'
+        with open(scratch, 'w') as f:
+            json.dump(figures, f)
+        os.replace(scratch, FIGURE_CACHE)
+        for name in os.listdir(disk_cache.directory):
+            if name.startswith('figures-') and name.endswith('.json') and name != os.path.basename(FIGURE_CACHE):
+                os.remove(os.path.join(disk_cache.directory, name))
+    except OSError:
+        pass
+
+
+def figure_skeleton(template):
+    def build():
+        figure = plain(template())
+        for trace in figure['data']:
+            for prop in FIGURE_DATA_PROPS:
+                trace.pop(prop, None)
+        return figure
+    return prebuilt_figure(template.__name__, build)
+
+
+def fill_figure(template, traces):
+    # `traces` holds the data arrays of each trace, in the skeleton's order.
+    skeleton = figure_skeleton(template)
+    return {'data': [dict(trace, **arrays) for trace, arrays in zip(skeleton['data'], traces)],
+            'layout': skeleton['layout']}
+
+
+def series_values(frame):
+    # A series x gender frame as nested dicts; the builders read a few dozen
+    # scalars each, and pandas indexing per scalar costs more than the fill.
+    return {name: dict(zip(frame.columns, row)) for name, row in zip(frame.index, frame.to_numpy().tolist())}
+
+
+def gender_traces(names, labels, value, horizontal=False, text=False):
+    # Arrays of the Male and Female traces of a stacked bar over `names`, with
+    # each bar's total in customdata.
+    traces = []
+    for gender in GENDERS:
+        values = [value(name, gender) for name in names]
+        trace = {'customdata': [[value(name, 'Male') + value(name, 'Female'), gender] for name in names]}
+        trace['x' if horizontal else 'y'] = values
+        trace['y' if horizontal else 'x'] = labels
+        if text:
+            trace['text'] = values
+        traces.append(trace)
+    return traces
+
+
+def education_template():
+    # Education Level Bar Chart
+    import plotly.express as px
+
+    bar_data = pd.DataFrame({
+        'Education Level': ['Elementary', 'Junior HS', 'Senior HS'] * 2,
+        'Gender': ['Male'] * 3 + ['Female'] * 3,
+        'Enrollment': 0,
+        'Total Enrollment': 0,
     })
 
     edu_order = ["Elementary", "Junior HS", "Senior HS"]
@@ -794,28 +1409,28 @@ def update_metrics_and_chart(data, region, province, division, district, municip
     )
 
     education_fig.update_layout(**apple_theme)
+    return education_fig
 
-    # Elementary
-    grade_levels = ['K', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6', 'Elem NG']
-    male_values = [df[f'{lvl} Male'].sum() for lvl in grade_levels]
-    female_values = [df[f'{lvl} Female'].sum() for lvl in grade_levels]
-    total_values = [m + f for m, f in zip(male_values, female_values)]
 
+def build_education_chart(selection):
+    totals = series_values(selection.aggregates)
+    return fill_figure(education_template, gender_traces(
+        STAGES, ['Elementary', 'Junior HS', 'Senior HS'], lambda stage, gender: int(totals[stage][gender])))
 
-    total_values_repeated = total_values * 2
-    genders = ['Male'] * len(grade_levels) + ['Female'] * len(grade_levels)
-    enrollments = male_values + female_values
 
-    elementary_df = pd.DataFrame({
+def grade_template(grade_levels, no_grade_label):
+    # Stacked bars per grade level; the non-graded class is shown as 'NG'.
+    import plotly.express as px
+
+    grade_df = pd.DataFrame({
         'Grade Level': grade_levels * 2,
-        'Gender': genders,
-        'Enrollment': enrollments,
-        'Total': total_values_repeated  
+        'Gender': ['Male'] * len(grade_levels) + ['Female'] * len(grade_levels),
+        'Enrollment': 0,
+        'Total': 0,
     })
 
-
-    elementary_fig = px.bar(
-        elementary_df,
+    grade_fig = px.bar(
+        grade_df,
         x='Grade Level',
         y='Enrollment',
         color='Gender',
@@ -823,107 +1438,61 @@ def update_metrics_and_chart(data, region, province, division, district, municip
         text='Enrollment',
         color_discrete_map={'Male': male_color, 'Female': female_color},
         custom_data=['Total', 'Gender'],
-        category_orders={
-            'Grade Level': ['K', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6', 'Elem NG']
-        },
+        category_orders={'Grade Level': grade_levels},
         labels={'Grade Level': 'Grade Level'}
     )
 
-    elementary_fig.update_layout(**apple_theme)
+    grade_fig.update_layout(**apple_theme)
 
-    elementary_fig.update_traces(
+    grade_fig.update_traces(
         texttemplate='%{text:,}',
         textposition='none',
         hovertemplate="<b>Grade Level: %{x}</b><br>Gender: %{customdata[1]}<br>Enrollment: %{y:,}<br>Total: %{customdata[0]:,}<extra></extra>"
     )
 
-
-    elementary_fig.update_xaxes(
+    grade_fig.update_xaxes(
         tickmode='array',
         tickvals=grade_levels,
-        ticktext=[lvl if lvl != 'Elem NG' else 'NG' for lvl in grade_levels]
+        ticktext=[lvl if lvl != no_grade_label else 'NG' for lvl in grade_levels]
     )
+    return grade_fig
 
-    # Junior HS
-    jhs_levels = ['G7', 'G8', 'G9', 'G10', 'JHS NG']
-    jhs_male_values = [df[f'{lvl} Male'].sum() for lvl in jhs_levels]
-    jhs_female_values = [df[f'{lvl} Female'].sum() for lvl in jhs_levels]
-    jhs_total_values = [m + f for m, f in zip(jhs_male_values, jhs_female_values)]
 
+def elementary_template():
+    return grade_template(ELEMENTARY_GRADES, 'Elem NG')
 
-    jhs_total_repeated = jhs_total_values * 2
-    jhs_genders = ['Male'] * len(jhs_levels) + ['Female'] * len(jhs_levels)
-    jhs_enrollments = jhs_male_values + jhs_female_values
 
-    jhs_df = pd.DataFrame({
-        'Grade Level': jhs_levels * 2,
-        'Gender': jhs_genders,
-        'Enrollment': jhs_enrollments,
-        'Total': jhs_total_repeated 
-    })
+def jhs_template():
+    return grade_template(JUNIOR_GRADES, 'JHS NG')
 
-    jhs_fig = px.bar(
-        jhs_df,
-        x='Grade Level',
-        y='Enrollment',
-        color='Gender',
-        barmode='stack',
-        text='Enrollment',
-        color_discrete_map={'Male': male_color, 'Female': female_color},
-        custom_data=['Total', 'Gender'],
-        category_orders={'Grade Level': ['G7', 'G8', 'G9', 'G10', 'JHS NG']}
-    )
 
-    jhs_fig.update_layout(**apple_theme)
+def build_elementary_chart(selection):
+    totals = series_values(selection.aggregates)
+    return fill_figure(elementary_template, gender_traces(
+        ELEMENTARY_GRADES, ELEMENTARY_GRADES, lambda grade, gender: int(totals[grade][gender]), text=True))
 
-    jhs_fig.update_traces(
-        texttemplate='%{text:,}',
-        textposition='none',
-        hovertemplate="<b>Grade Level: %{x}</b><br>Gender: %{customdata[1]}<br>Enrollment: %{y:,}<br>Total: %{customdata[0]:,}<extra></extra>"
-    )
 
+def build_jhs_chart(selection):
+    totals = series_values(selection.aggregates)
+    return fill_figure(jhs_template, gender_traces(
+        JUNIOR_GRADES, JUNIOR_GRADES, lambda grade, gender: int(totals[grade][gender]), text=True))
 
-    jhs_fig.update_xaxes(
-        tickmode='array',
-        tickvals=jhs_levels,
-        ticktext=[lvl if lvl != 'JHS NG' else 'NG' for lvl in jhs_levels]
-    )
 
+def track_label(track):
+    return track.replace('ACAD ', '')
 
-    # Senior HS
-    shs_tracks = [
-        'ACAD ABM', 'ACAD HUMSS', 'ACAD STEM', 'ACAD GAS', 'ACAD PBM', 'TVL', 'SPORTS', 'ARTS'
-    ]
-
-    male_shs_values = [
-        df[[f'G11 {track} Male' if 'G11' in f'G11 {track} Male' else f'G11 ACAD {track} Male',
-            f'G12 {track} Male' if 'G12' in f'G12 {track} Male' else f'G12 ACAD {track} Male']].sum().sum()
-        for track in shs_tracks
-    ]
-    female_shs_values = [
-        df[[f'G11 {track} Female' if 'G11' in f'G11 {track} Female' else f'G11 ACAD {track} Female',
-            f'G12 {track} Female' if 'G12' in f'G12 {track} Female' else f'G12 ACAD {track} Female']].sum().sum()
-        for track in shs_tracks
-    ]
 
-    total_shs_values = [m + f for m, f in zip(male_shs_values, female_shs_values)]
-    shs_total_repeated = total_shs_values * 2
-    shs_genders = ['Male'] * len(shs_tracks) + ['Female'] * len(shs_tracks)
-    shs_enrollments = male_shs_values + female_shs_values
+def shs_template():
+    # Senior HS (G11 + G12 per track)
+    import plotly.express as px
 
     shs_df = pd.DataFrame({
-        'Track': shs_tracks * 2,
-        'Gender': shs_genders,
-        'Enrollment': shs_enrollments,
-        'Total': shs_total_repeated
+        'Track Cleaned': [track_label(track) for track in SHS_TRACKS] * 2,
+        'Gender': ['Male'] * len(SHS_TRACKS) + ['Female'] * len(SHS_TRACKS),
+        'Enrollment': 0,
+        'Total': 0,
     })
 
-    shs_df['Track Cleaned'] = shs_df['Track'].str.replace('ACAD ', '', regex=False)
-
-
-    shs_df = shs_df.sort_values('Total', ascending=False)
-
-
     shs_fig = px.bar(
         shs_df,
         orientation='h',
@@ -936,12 +1505,11 @@ def update_metrics_and_chart(data, region, province, division, district, municip
         custom_data=['Total', 'Gender']
     )
 
-
     shs_fig.update_layout(**apple_theme)
 
     shs_fig.update_layout(
         yaxis=dict(
-            autorange='reversed' 
+            autorange='reversed'
         )
     )
 
@@ -950,66 +1518,37 @@ def update_metrics_and_chart(data, region, province, division, district, municip
         textposition='none',
         hovertemplate="<b>%{y}</b><br>Gender: %{customdata[1]}<br>Enrollment: %{x:,}<br>Total: %{customdata[0]:,}<extra></extra>"
     )
+    return shs_fig
 
-    # Student Count per Grade
-    grade_levels = {
-        'K': ['K Male', 'K Female'],
-        'G1': ['G1 Male', 'G1 Female'],
-        'G2': ['G2 Male', 'G2 Female'],
-        'G3': ['G3 Male', 'G3 Female'],
-        'G4': ['G4 Male', 'G4 Female'],
-        'G5': ['G5 Male', 'G5 Female'],
-        'G6': ['G6 Male', 'G6 Female'],
-        'G7': ['G7 Male', 'G7 Female'],
-        'G8': ['G8 Male', 'G8 Female'],
-        'G9': ['G9 Male', 'G9 Female'],
-        'G10': ['G10 Male', 'G10 Female'],
-        'E-NG': ['Elem NG Male', 'Elem NG Female'],  
-        'J-NG': ['JHS NG Male', 'JHS NG Female']     
-    }
 
-    data = []
-    for level, cols in grade_levels.items():
-        male_cols = [col for col in cols if 'Male' in col]
-        female_cols = [col for col in cols if 'Female' in col]
+def build_shs_chart(selection):
+    totals = series_values(selection.aggregates)
 
-        df[level + '_Male'] = df[male_cols].sum(axis=1)
-        df[level + '_Female'] = df[female_cols].sum(axis=1)
+    def value(track, gender):
+        return int(totals[track][gender])
 
-        male_avg = round(df[level + '_Male'].mean())
-        female_avg = round(df[level + '_Female'].mean())
-        total_avg = male_avg + female_avg
+    # Largest track first; sorted() is stable, so ties keep the track order
+    # (assets/crossfilter.js does the same).
+    tracks = sorted(SHS_TRACKS, key=lambda track: -(value(track, 'Male') + value(track, 'Female')))
+    return fill_figure(shs_template, gender_traces(
+        tracks, [track_label(track) for track in tracks], value, horizontal=True, text=True))
 
-        data.append({'Grade Level': level, 'Gender': 'Male', 'Average Enrollees': male_avg, 'Total Enrollees': total_avg})
-        data.append({'Grade Level': level, 'Gender': 'Female', 'Average Enrollees': female_avg, 'Total Enrollees': total_avg})
 
-    df_chart = pd.DataFrame(data)
-
-    
-    grade_order_map = {
-    'K': 0,
-    'G1': 1,
-    'G2': 2,
-    'G3': 3,
-    'G4': 4,
-    'G5': 5,
-    'G6': 6,
-    'G7': 7,
-    'G8': 8,
-    'G9': 9,
-    'G10': 10,
-    'E-NG': 11,  
-    'J-NG': 12   
-    }
-    df_chart['Grade Order'] = df_chart['Grade Level'].map(grade_order_map)
-    df_chart = df_chart.sort_values('Grade Order')
+def average_template(category, labels, orientation):
+    # Average enrollees per school, stacked by gender.
+    import plotly.express as px
 
-    df_chart = df_chart.sort_values('Grade Order')
+    df_chart = pd.DataFrame({
+        category: labels * 2,
+        'Gender': ['Male'] * len(labels) + ['Female'] * len(labels),
+        'Average Enrollees': 0,
+        'Total Enrollees': 0,
+    })
+    category_axis, value_axis = ('x', 'y') if orientation == 'v' else ('y', 'x')
 
     fig = px.bar(
         df_chart,
-        x='Grade Level',
-        y='Average Enrollees',
+        **{category_axis: category, value_axis: 'Average Enrollees'},
         color='Gender',
         barmode='stack',
         color_discrete_map={'Male': male_color, 'Female': female_color},
@@ -1018,127 +1557,742 @@ def update_metrics_and_chart(data, region, province, division, district, municip
 
     fig.update_traces(
         hovertemplate=
-        '<b>%{x}</b><br>' +
+        f'<b>%{{{category_axis}}}</b><br>' +
         'Gender: %{customdata[1]}<br>' +
-        'Average Enrollees: %{y}<br>' +
+        f'Average Enrollees: %{{{value_axis}}}<br>' +
         'Total Enrollees: %{customdata[0]}<br>' +
         '<extra></extra>'
     )
 
     fig.update_layout(**apple_theme)
+    return fig
 
-    # Define SHS tracks
-    shs_tracks = {
-        'ABM': ['G11 ACAD ABM Male', 'G12 ACAD ABM Male', 'G11 ACAD ABM Female', 'G12 ACAD ABM Female'],
-        'HUMSS': ['G11 ACAD HUMSS Male', 'G12 ACAD HUMSS Male', 'G11 ACAD HUMSS Female', 'G12 ACAD HUMSS Female'],
-        'STEM': ['G11 ACAD STEM Male', 'G12 ACAD STEM Male', 'G11 ACAD STEM Female', 'G12 ACAD STEM Female'],
-        'GAS': ['G11 ACAD GAS Male', 'G12 ACAD GAS Male', 'G11 ACAD GAS Female', 'G12 ACAD GAS Female'],
-        'PBM': ['G11 ACAD PBM Male', 'G12 ACAD PBM Male', 'G11 ACAD PBM Female', 'G12 ACAD PBM Female'],
-        'TVL': ['G11 TVL Male', 'G12 TVL Male', 'G11 TVL Female', 'G12 TVL Female'],
-        'SPORTS': ['G11 SPORTS Male', 'G12 SPORTS Male', 'G11 SPORTS Female', 'G12 SPORTS Female'],
-        'ARTS': ['G11 ARTS Male', 'G12 ARTS Male', 'G11 ARTS Female', 'G12 ARTS Female']
-    }
 
+# Average students per school for each grade, non-graded classes last
+AVERAGE_GRADES = ELEMENTARY_GRADES[:-1] + JUNIOR_GRADES[:-1] + ['Elem NG', 'JHS NG']
+AVERAGE_GRADE_LABELS = {'Elem NG': 'E-NG', 'JHS NG': 'J-NG'}
 
-    data = []
-    for track, cols in shs_tracks.items():
-        g11_male_col = [col for col in cols if 'G11' in col and 'Male' in col]
-        g12_male_col = [col for col in cols if 'G12' in col and 'Male' in col]
-        g11_female_col = [col for col in cols if 'G11' in col and 'Female' in col]
-        g12_female_col = [col for col in cols if 'G12' in col and 'Female' in col]
 
-        g11_male_avg = df[g11_male_col].mean(axis=1)
-        g12_male_avg = df[g12_male_col].mean(axis=1)
-        g11_female_avg = df[g11_female_col].mean(axis=1)
-        g12_female_avg = df[g12_female_col].mean(axis=1)
+def grade_average_template():
+    return average_template('Grade Level', [AVERAGE_GRADE_LABELS.get(g, g) for g in AVERAGE_GRADES], 'v')
 
-        male_avg = round(((g11_male_avg + g12_male_avg) / 2).mean())
-        female_avg = round(((g11_female_avg + g12_female_avg) / 2).mean())
-        total_avg = male_avg + female_avg
 
-        data.append({'Track': track, 'Gender': 'Male', 'Average Enrollees': male_avg, 'Total Enrollees': total_avg})
-        data.append({'Track': track, 'Gender': 'Female', 'Average Enrollees': female_avg, 'Total Enrollees': total_avg})
+def track_average_template():
+    return average_template('Track', [track_label(track) for track in SHS_TRACKS], 'h')
 
- 
-    df_chart = pd.DataFrame(data)
 
-    track_order = (
-        df_chart.groupby('Track')['Total Enrollees']
-        .sum()
-        .sort_values(ascending=False)
-        .index.tolist()
-    )
+def build_grade_average_chart(selection):
+    averages = series_values(selection.averages)
+    return fill_figure(grade_average_template, gender_traces(
+        AVERAGE_GRADES, [AVERAGE_GRADE_LABELS.get(g, g) for g in AVERAGE_GRADES],
+        lambda grade, gender: round(averages[grade][gender])))
 
 
-    track_order = track_order[::-1] 
+def build_track_average_chart(selection):
+    averages = series_values(selection.averages)
 
+    # Average students per school and SHS grade (G11/G12) for each track
+    def value(track, gender):
+        return round(averages[track][gender] / len(SENIOR_GRADES))
 
-    df_chart['Track'] = pd.Categorical(df_chart['Track'], categories=track_order, ordered=True)
+    # Smallest total first (the chart's bottom-up order); ties in reverse
+    # label order.
+    tracks = sorted(SHS_TRACKS, key=track_label)
+    tracks = sorted(tracks, key=lambda track: -(value(track, 'Male') + value(track, 'Female')))[::-1]
+    return fill_figure(track_average_template, gender_traces(
+        tracks, [track_label(track) for track in tracks], value, horizontal=True))
 
 
-    df_chart['Gender'] = pd.Categorical(df_chart['Gender'], categories=['Male', 'Female'], ordered=True)
+TREND_LEVELS = [('Elementary', 'Elementary'), ('Junior HS', 'Junior High School'), ('Senior HS', 'Senior High School')]
 
 
-    df_chart = df_chart.sort_values(by=['Track', 'Gender'], ascending=[True, True])
+def trend_template():
+    import plotly.express as px
 
-    # Plot
-    fig_tracks = px.bar(
-        df_chart,
-        x='Average Enrollees',
-        y='Track',
-        color='Gender',
-        barmode='stack',
-        color_discrete_map={'Female': female_color, 'Male': male_color},
-        custom_data=['Total Enrollees', 'Gender'],
+    trend_data = pd.DataFrame({
+        'School Year': '',
+        'Education Level': [level for level, _ in TREND_LEVELS],
+        'Enrollment': 0,
+        'Change': '-',
+    })
+
+    trend_fig = px.bar(
+        trend_data,
+        x='School Year',
+        y='Enrollment',
+        color='Education Level',
+        barmode='group',
+        custom_data=['Change'],
+        color_discrete_map={'Elementary': male_color, 'Junior HS': female_color, 'Senior HS': '#616867'},
     )
 
-    fig_tracks.update_traces(
-        hovertemplate=
-        '<b>%{y}</b><br>' +
-        'Gender: %{customdata[1]}<br>' +
-        'Average Enrollees: %{x}<br>' +
-        'Total Enrollees: %{customdata[0]}<br>' +
-        '<extra></extra>'
+    trend_fig.update_traces(
+        hovertemplate="<b>%{x}</b><br>Enrollment: %{y:,}<br>Change vs previous year: %{customdata[0]}<extra></extra>"
     )
 
-    fig_tracks.update_layout(**apple_theme)
+    trend_fig.update_layout(**apple_theme)
+    return trend_fig
+
+
+def percent_change(before, after):
+    # As pandas' pct_change formats it: '-' for no previous value or 0 -> 0.
+    if before is None or (before == 0 and after == 0):
+        return '-'
+    if before == 0:
+        return '+inf%'
+    return f"{(after / before - 1) * 100:+.1f}%"
+
+
+def build_trend_chart(selection):
+    # One point per uploaded school year, each from that year's cube.
+    traces = []
+    for _, stage in TREND_LEVELS:
+        years = [year for year, _ in selection.history]
+        values = [int(other.aggregates.loc[stage].sum()) for _, other in selection.history]
+        changes = [[percent_change(values[i - 1] if i else None, value)] for i, value in enumerate(values)]
+        traces.append({'x': years, 'y': values, 'customdata': changes})
+    return fill_figure(trend_template, traces)
+
+
+# Output id -> builder, in the callback's output order.
+OUTPUT_BUILDERS = {
+    'male_summary_card': build_male_card,
+    'female_summary_card': build_female_card,
+    'total_summary_card': build_enrollees_card,
+    'total_school_card': build_schools_card,
+    'education_bar_chart': build_education_chart,
+    'elementary_bar_chart': build_elementary_chart,
+    'jhs_bar_chart': build_jhs_chart,
+    'shs_bar_chart': build_shs_chart,
+    'enrollment_rate_chart': build_grade_average_chart,
+    'tracks_rate_chart': build_track_average_chart,
+    'trend_chart': build_trend_chart,
+}
 
+# Figure output id -> its template.
+FIGURE_TEMPLATES = {
+    'education_bar_chart': education_template,
+    'elementary_bar_chart': elementary_template,
+    'jhs_bar_chart': jhs_template,
+    'shs_bar_chart': shs_template,
+    'enrollment_rate_chart': grade_average_template,
+    'tracks_rate_chart': track_average_template,
+    'trend_chart': trend_template,
+}
+
+
+def map_template():
+    import plotly.express as px
+
+    map_fig = px.choropleth(
+        geojson={'type': 'FeatureCollection', 'features': []},
+        locations=['AREA'],
+        color=[0],
+        color_continuous_scale='Blues',
+    )
+    map_fig.update_traces(hovertemplate='%{customdata}<br>%{z:,}<extra></extra>',
+                          marker_line_color='white', marker_line_width=0.5)
+    map_fig.update_geos(fitbounds='locations', visible=False)
+    map_fig.update_layout(
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor='white',
+        coloraxis_colorbar=dict(title=None, thickness=10),
+    )
+    return map_fig
+
+
+def build_map(geojson, level, keys, labels, values):
+    # The areas' geometry goes with the figure; the skeleton keeps the rest.
+    figure = fill_figure(map_template, [{'geojson': geojson, 'locations': keys, 'z': values, 'customdata': labels}])
+    # Keeps the user's zoom across updates until the level changes.
+    figure['layout'] = dict(figure['layout'], uirevision=level)
+    return figure
+
+
+def map_message(text):
+    return {'data': [], 'layout': {
+        'annotations': [{'text': text, 'showarrow': False, 'xref': 'paper', 'yref': 'paper', 'x': 0.5, 'y': 0.5}],
+        'xaxis': {'visible': False}, 'yaxis': {'visible': False},
+        'plot_bgcolor': 'white', 'paper_bgcolor': 'white', 'margin': dict(l=0, r=0, t=0, b=0),
+    }}
+
+
+def arrays_equal(a, b):
+    if a is None or b is None:
+        return a is b
+    return np.array_equal(np.asarray(a), np.asarray(b))
+
+
+def changed_output(value, previous):
+    # What to send for one output, given the value the browser already shows.
+    # Figures with the same traces only get their changed data arrays as a
+    # Patch; anything unchanged is not re-sent at all.
+    if previous is None:
+        return value
+    if isinstance(value, dict) and 'data' in value:
+        if [t.get('name') for t in value['data']] != [t.get('name') for t in previous['data']]:
+            return value
+        patch = Patch()
+        changed = False
+        for i, (new, old) in enumerate(zip(value['data'], previous['data'])):
+            for prop in FIGURE_DATA_PROPS:
+                if not arrays_equal(new.get(prop), old.get(prop)):
+                    patch['data'][i][prop] = new[prop]
+                    changed = True
+        return patch if changed else no_update
+    same = json.dumps(value, cls=PlotlyJSONEncoder) == json.dumps(previous, cls=PlotlyJSONEncoder)
+    return no_update if same else value
+
+
+def empty_figure():
+    # Shown in every chart while no dataset is loaded; prebuilt like the
+    # skeletons, since each new session starts out empty.
+    return prebuilt_figure('empty_figure', empty_template)
+
+
+def empty_template():
+    import plotly.express as px
+
+    empty_fig = px.bar(
+        x=["Elementary", "Junior High School", "Senior High School"],
+        y=[0, 0, 0],
+        title="No data available",
+        labels={"x": "Education Level", "y": "Enrollment"}
+    )
+    empty_fig.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font={'color': '#1d1d1f'},
+        margin=dict(l=10, r=10, t=40, b=10),
+        title_font_size=16,
+        showlegend=False
+    )
+    return plain(empty_fig)
 
+
+# Shown when the store names a dataset this server no longer has (unloaded,
+# and not in the disk cache), instead of an empty dashboard.
+MISSING_DATA = "This upload is no longer loaded on the server. Please upload the file again."
+
+
+def empty_outputs(message=None):
+    # Cards and figures shown while no dataset is loaded.
+    empty_fig = empty_figure()
+    if message is not None:
+        empty_fig = {**empty_fig, 'layout': {**empty_fig['layout'], 'title': {'text': message, 'font': {'size': 13}}}}
     return (
-        html.Div([
-            html.H4("Male", style={'fontSize': '15px', 'margin': '0px', 'marginTop':'5px'}),
-            html.Div(f"{int(total_male):,}", style={'fontSize': '30px', 'fontWeight': 'bold'}),
-            html.Div(f"{int(total_male)/total_enrollees*100:.1f}% of Total" if total_enrollees > 0 else "0%", 
-            style={'fontSize': '14px', 'color': '#888'}),]),
+        html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
+                            html.Div("Males", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
+                            style={
+                                "display": "flex","flexDirection": "column","alignItems": "center"}),
+        html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
+                            html.Div("Females", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
+                            style={
+                                "display": "flex","flexDirection": "column","alignItems": "center"}),
+        html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
+                            html.Div("Enrollment", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
+                            style={
+                                "display": "flex","flexDirection": "column","alignItems": "center"}),
+        html.Div(children=[html.Div("0", style={"font-size": "24px", "text-align": "center"}),
+                            html.Div("Schools", style={"font-size": "16px", "text-align": "center", "font-weight": "normal"})],
+                            style={
+                                "display": "flex","flexDirection": "column","alignItems": "center"}), 
+        empty_fig, 
+        empty_fig, 
+        empty_fig, 
+        empty_fig, 
+        empty_fig, 
+        empty_fig,
+        empty_fig)
+
+
+def view_cache_key(dataset, filters, partitions):
+    # Result cache key of a view. The set of uploaded years is part of it
+    # since the trend chart and year-on-year changes depend on it.
+    return filter_key(dataset.id, filters) + (freeze(sorted(partitions.items())),)
+
+
+def cached_output(key, output_id, selection):
+    value = results_cache.get(key + (output_id,))
+    if value is None:
+        with metrics.phase('filter'):
+            selection.cells
+        with metrics.phase('aggregate'):
+            selection.aggregates
+        with metrics.phase('figure build'):
+            value = results_cache.put(key + (output_id,), OUTPUT_BUILDERS[output_id](selection))
+    return value
 
-        html.Div([
-            html.H4("Female", style={'fontSize': '15px', 'margin': '0px', 'marginTop':'5px'}),
-            html.Div(f"{int(total_female):,}", style={'fontSize': '30px', 'fontWeight': 'bold'}),
-            html.Div(f"{int(total_female)/total_enrollees*100:.1f}% of Total" if total_enrollees > 0 else "0%", 
-            style={'fontSize': '14px', 'color': '#888'}),]),
 
-        
-        html.Div([
-            html.H4("Enrollees", style={'fontSize': '15px', 'margin': '0px', 'marginTop':'5px'}),
-            html.Div(f"{int(total_enrollees):,}", style={'fontSize': '30px', 'fontWeight': 'bold'}),
-            html.Div(f"{int(total_enrollees)/fixed_enrollee_sum*100:.1f}% of Nationwide" if fixed_enrollee_sum > 0 else "0%", 
-            style={'fontSize': '14px', 'color': '#888'}),]),
-
-        
-         html.Div([
-            html.H4("Schools", style={'fontSize': '15px', 'margin': '0px', 'marginTop':'5px'}),
-            html.Div(f"{int(total_schools):,}", style={'fontSize': '30px', 'fontWeight': 'bold'}),
-            html.Div(f"{int(total_schools)/fixed_total_schools*100:.1f}% of Nationwide" if fixed_total_schools > 0 else "0%", 
-            style={'fontSize': '14px', 'color': '#888'}),]),
-
-        education_fig,
-        elementary_fig,
-        jhs_fig,
-        shs_fig,
-        fig,
-        fig_tracks
+# Metrics and bar chart callback
+@server_side(
+    Output('male_summary_card', 'children'),
+    Output('female_summary_card', 'children'),
+    Output('total_summary_card', 'children'),
+    Output('total_school_card', 'children'),
+    Output('education_bar_chart', 'figure'),
+    Output('elementary_bar_chart', 'figure'),
+    Output('jhs_bar_chart', 'figure'),
+    Output('shs_bar_chart', 'figure'),
+    Output('enrollment_rate_chart', 'figure'),
+    Output('tracks_rate_chart', 'figure'),
+    Output('trend_chart', 'figure'),
+    Output('view-key', 'data'),
+
+    Input('stored-data', 'data'),
+    Input('year_dd', 'value'),
+    Input('region_dd', 'value'),
+    Input('province_dd', 'value'),
+    Input('division_dd', 'value'),
+    Input('district_dd', 'value'),
+    Input('municipality_dd', 'value'),
+    Input('legislative_district_dd', 'value'),
+    Input('sector_dd', 'value'),
+    Input('school_type_dd', 'value'),
+    Input('modified_coc_dd', 'value'),
+    Input('school_subclass_dd', 'value'),
+    State('view-key', 'data')
+)
+@metrics.callback
+def update_metrics_and_chart(data, year, region, province, division, district, municipality,
+                             legislative_district, sector, school_type, modified_coc, school_subclass, view_key):
+    with metrics.phase('store decode'):
+        dataset = active_partition(data, year)
+    if dataset is None:
+        return (*empty_outputs(MISSING_DATA if data else None), None)
+
+    filters = {
+        'Region': region,
+        'Province': province,
+        'Division': division,
+        'District': district,
+        'Municipality': municipality,
+        'Legislative District': legislative_district,
+        'Sector': sector,
+        'School Type': school_type,
+        'Modified COC': modified_coc,
+        'School Subclassification': school_subclass
+    }
+
+    # view_key identifies what the browser currently shows. Unless the dataset
+    # itself changed, only outputs that differ from it are sent, figures as
+    # Patches of their data arrays.
+    key = view_cache_key(dataset, filters, data)
+    previous = freeze(view_key) if ctx.triggered_id not in ('stored-data', 'year_dd') else None
+    if previous is not None and previous[0] != dataset.id:
+        previous = None
+    if previous == key:
+        return (no_update,) * (len(OUTPUT_BUILDERS) + 1)
+
+    selection = dataset.select(filters, data.items(), find_dataset)
+    outputs = []
+    for output_id in OUTPUT_BUILDERS:
+        value = cached_output(key, output_id, selection)
+        if previous is not None:
+            with metrics.phase('serialize'):
+                value = changed_output(value, results_cache.peek(previous + (output_id,)))
+        outputs.append(value)
+
+    return (*outputs, key)
+
+
+# Callback: School table
+# Paging, sorting and search all happen here, over the rows the filter index
+# selects; the browser only ever receives the page it shows. Registered in
+# client-side filtering mode too, since the school rows stay on the server
+# (following the filters on Apply there).
+@app.callback(
+    Output('school-table', 'data'),
+    Output('school-table', 'page_count'),
+    Output('school-table', 'page_current'),
+    Output('school-count', 'children'),
+    Input('stored-data', 'data'),
+    Input('apply_btn', 'n_clicks'),
+    panel_filter('year_dd'),
+    Input('school-search', 'value'),
+    Input('school-table', 'page_current'),
+    Input('school-table', 'sort_by'),
+    *[panel_filter(dropdown) for dropdown in DROPDOWN_COLUMNS],
+)
+@metrics.callback
+def update_school_table(data, applied, year, search, page, sort_by, *selected):
+    dataset = active_partition(data, year)
+    if dataset is None:
+        return [], 0, 0, MISSING_DATA if data else ""
+    # Anything but paging starts again from the first page.
+    if 'school-table.page_current' not in ctx.triggered_prop_ids:
+        page = 0
+    sort = sort_by[0] if sort_by else None
+    with metrics.phase('filter'):
+        mask = dataset.index.mask(dict(zip(DROPDOWN_COLUMNS.values(), selected)))
+    with metrics.phase('serialize'):
+        count, records = dataset.schools.page(
+            mask, page, SCHOOL_PAGE_SIZE,
+            sort_by=sort['column_id'] if sort else None,
+            descending=bool(sort) and sort['direction'] == 'desc',
+            text=search)
+    pages = max(1, -(-count // SCHOOL_PAGE_SIZE))
+    return records, pages, page, f"{count:,} schools"
+
+
+# Exports of the current view, as CSV, Excel or Parquet: the filtered school
+# rows, or the numbers behind each card and chart. The view travels in the
+# link's query string: the selected year, every uploaded year's partition as
+# year:id, and one parameter per selected filter value, named after its
+# dropdown (region=...&region=...).
+FILTER_PARAMS = {dropdown[:-len('_dd')]: col for dropdown, col in DROPDOWN_COLUMNS.items()}
+EXPORT_KINDS = {'schools': 'Schools', 'charts': 'Chart data'}
+EXPORT_LABELS = {'csv': 'CSV', 'xlsx': 'Excel', 'parquet': 'Parquet'}
+
+# School rows per chunk of an export. Each chunk is formatted and sent before
+# the next one is read, so a national export starts at once and its memory
+# stays bounded by the chunk size.
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 10_000))
+
+# Chart output id -> its title in the chart data export.
+CHART_TITLES = {
+    'education_bar_chart': 'Educational Level Comparison',
+    'enrollment_rate_chart': 'Average Student Count per Grade Level',
+    'tracks_rate_chart': 'Average Student Count per Track',
+    'elementary_bar_chart': 'Elementary Level',
+    'jhs_bar_chart': 'Junior High School',
+    'shs_bar_chart': 'Senior High School',
+    'trend_chart': 'Enrollment by School Year',
+}
+
+# Summary card -> its measure.
+SUMMARY_MEASURES = {
+    'Male': male_total,
+    'Female': female_total,
+    'Enrollees': enrollee_total,
+    'Schools': school_total,
+}
+
+
+def view_query(partitions, year, selected):
+    params = [('year', year)] if year is not None else []
+    params += [('partition', f'{label}:{data_id}') for label, data_id in sorted(partitions.items())]
+    params += [(param, str(value)) for param, values in zip(FILTER_PARAMS, selected) for value in values or ()]
+    return urlencode(params)
+
+
+def request_view(args):
+    # (dataset, filters, partitions) of the view in a request's query string;
+    # the dataset is None if it is not known. Values are matched to the
+    # column's categories as text, as query parameters carry no types.
+    partitions = dict(value.rsplit(':', 1) for value in args.getlist('partition') if ':' in value)
+    dataset = active_partition(partitions, args.get('year'))
+    if dataset is None:
+        return None, None, partitions
+    return dataset, request_filters(dataset, args), partitions
+
+
+def request_filters(dataset, args):
+    filters = {}
+    for param, col in FILTER_PARAMS.items():
+        values = args.getlist(param)
+        if values:
+            categories = {str(value): value for value in dataset.index.categories(col)}
+            values = [categories.get(value, value) for value in values]
+        filters[col] = values
+    return filters
+
+
+def chart_series(key, output_id, selection):
+    # (series, category, value) of every bar of a chart, read from the same
+    # cached output the dashboard shows, so the numbers are exactly the chart's.
+    for trace in plain(cached_output(key, output_id, selection))['data']:
+        categories, values = trace.get('x') or [], trace.get('y') or []
+        if trace.get('orientation') == 'h':
+            categories, values = values, categories
+        for category, value in zip(categories, values):
+            yield trace.get('name', ''), category, value
+
+
+def chart_data(dataset, filters, partitions):
+    # One row per card and per bar of the view.
+    key = view_cache_key(dataset, filters, partitions)
+    selection = dataset.select(filters, partitions.items(), find_dataset)
+    rows = [('Summary', '', name, int(measure(selection))) for name, measure in SUMMARY_MEASURES.items()]
+    for output_id, title in CHART_TITLES.items():
+        rows += [(title, *bar) for bar in chart_series(key, output_id, selection)]
+    return pd.DataFrame(rows, columns=['Chart', 'Series', 'Category', 'Value'])
+
+
+@app.server.route('/export/<kind>.<fmt>')
+def export_view(kind, fmt):
+    if kind not in EXPORT_KINDS or fmt not in available_formats():
+        abort(404)
+    dataset, filters, partitions = request_view(request.args)
+    if dataset is None:
+        abort(404)
+    if kind == 'schools':
+        chunks = row_chunks(dataset.frame, dataset.index.rows(filters), EXPORT_CHUNK_ROWS)
+    else:
+        chunks = [chart_data(dataset, filters, partitions)]
+    extension, media_type = EXPORT_FORMATS[fmt]
+    year = request.args.get('year') or dataset.school_year or ''
+    filename = secure_filename(f"enrollment-{kind}-{year}.{extension}")
+    return Response(export_stream(fmt, chunks, EXPORT_KINDS[kind]), mimetype=media_type,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+# Read-only JSON API for scheduled jobs and spreadsheets, off unless
+# AGGREGATE_API=1. /api/aggregates?dataset=<id>&region=...&sector=...
+# returns one view's cards, level totals, grade and track breakdowns and
+# per-school averages, with the filters named as for the exports. A request
+# may read the datasets its session cookie grants (see may_read), or any
+# loaded dataset with "Authorization: Bearer <API_TOKEN>"; others get a 404,
+# as unknown ids do. Bodies are kept in the result cache next to the
+# dashboard's outputs, and built from them. A dataset id is the hash of its
+# contents, so the id and the canonical filters identify a response for
+# good: they make its strong ETag, and a request that sends it back in
+# If-None-Match gets a 304 without any aggregate being computed or read
+# from the cache.
+AGGREGATE_API = os.environ.get('AGGREGATE_API', '0') == '1'
+API_TOKEN = os.environ.get('API_TOKEN')
+API_VERSION = 1
+
+# Section of the aggregates response -> the charts it is read from.
+API_SECTIONS = {
+    'levels': ['education_bar_chart'],
+    'grades': ['elementary_bar_chart', 'jhs_bar_chart'],
+    'tracks': ['shs_bar_chart'],
+    'grade_averages': ['enrollment_rate_chart'],
+    'track_averages': ['tracks_rate_chart'],
+}
+
+
+def api_etag(key):
+    return hashlib.sha256(json.dumps([API_VERSION, key], cls=PlotlyJSONEncoder).encode()).hexdigest()[:32]
+
+
+def api_aggregates_body(dataset, filters):
+    key = filter_key(dataset.id, filters)
+    body = results_cache.get(key + ('api',))
+    if body is None:
+        # The dataset on its own, as the dashboard shows it when only its
+        # year is uploaded, so the two share their cached outputs.
+        partitions = {dataset.school_year or dataset.id: dataset.id}
+        view_key = view_cache_key(dataset, filters, partitions)
+        selection = dataset.select(filters, partitions.items(), find_dataset)
+        aggregates = {
+            'dataset': dataset.id,
+            'school_year': dataset.school_year,
+            'filters': dict(key[1]),
+            'cards': {name: int(measure(selection)) for name, measure in SUMMARY_MEASURES.items()},
+        }
+        for section, output_ids in API_SECTIONS.items():
+            values = aggregates[section] = {}
+            for output_id in output_ids:
+                for series, category, value in chart_series(view_key, output_id, selection):
+                    values.setdefault(series, {})[category] = value
+        body = json.dumps(aggregates, cls=PlotlyJSONEncoder)
+        results_cache.put(key + ('api',), body, size=len(body))
+    return body
+
+
+def api_dataset(data_id):
+    authorization = request.headers.get('Authorization', '')
+    if API_TOKEN and secrets.compare_digest(authorization.encode(), f'Bearer {API_TOKEN}'.encode()):
+        return load_dataset(data_id)
+    return find_dataset(data_id)
+
+
+def api_aggregates():
+    dataset = api_dataset(request.args.get('dataset'))
+    if dataset is None:
+        abort(404)
+    filters = request_filters(dataset, request.args)
+    etag = api_etag(filter_key(dataset.id, filters))
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(api_aggregates_body(dataset, filters), mimetype='application/json')
+    response.set_etag(etag)
+    # Stored by the client only, and checked with the server before every use.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+if AGGREGATE_API:
+    app.server.add_url_rule('/api/aggregates', view_func=api_aggregates)
+
+
+# Callback: Export links follow the current view. Registered in client-side
+# filtering mode too, since the exports are made on the server (following
+# the filters on Apply there).
+@app.callback(
+    Output('export-links', 'children'),
+    Input('stored-data', 'data'),
+    Input('apply_btn', 'n_clicks'),
+    panel_filter('year_dd'),
+    *[panel_filter(dropdown) for dropdown in DROPDOWN_COLUMNS],
+)
+@metrics.callback
+def update_export_links(data, applied, year, *selected):
+    if not data:
+        return []
+    query = view_query(data, year, selected)
+    links = []
+    for kind, label in EXPORT_KINDS.items():
+        links.append(html.Span(f"{label}:", style={'fontWeight': '600'}))
+        links += [html.A(EXPORT_LABELS[fmt], href=f"/export/{kind}.{fmt}?{query}", download='',
+                         style={'color': COLORS['accent']})
+                  for fmt in available_formats()]
+    return links
+
+
+MAP_DROPDOWNS = [next(d for d, col in DROPDOWN_COLUMNS.items() if col == level) for level in GEO_LEVELS]
+
+
+def measure_weights(plan, measure, gender):
+    # Enrollment column weights adding up to `measure` for one or both genders.
+    weights = plan.weights[plan.series.index(measure)]
+    return weights[[GENDERS.index(g) for g in (GENDERS if gender == 'Both' else [gender])]].sum(axis=0)
+
+
+# Callback: Map
+# Per-area values come from the dataset's precomputed area sums (filtered
+# views add up the matching cube cells), never from the school rows. The
+# boundaries are only sent when the dataset, level or zoom tier changes;
+# other updates patch the values. Registered in client-side filtering mode
+# too, since the boundaries and area sums stay on the server (following the
+# filters on Apply there).
+@app.callback(
+    Output('map_chart', 'figure'),
+    Output('map-view', 'data'),
+    Input('stored-data', 'data'),
+    Input('apply_btn', 'n_clicks'),
+    panel_filter('year_dd'),
+    Input('map-level', 'value'),
+    Input('map-measure', 'value'),
+    Input('map-gender', 'value'),
+    Input('map_chart', 'relayoutData'),
+    State('map-view', 'data'),
+    *[panel_filter(dropdown) for dropdown in DROPDOWN_COLUMNS],
+)
+@metrics.callback
+def update_map(data, applied, year, level, measure, gender, relayout, view, *selected):
+    if not MAP_LEVELS:
+        return no_update, no_update
+    dataset = active_partition(data, year)
+    if dataset is None:
+        return map_message(MISSING_DATA if data else "No data available"), None
+    scale = (relayout or {}).get('geo.projection.scale', (view or {}).get('scale'))
+    tier = zoom_tier(scale)
+    same_geometry = view is not None and (view['dataset'], view['level'], view['tier']) == (dataset.id, level, tier)
+    if ctx.triggered_id == 'map_chart' and same_geometry:
+        return no_update, no_update
+    geojson = boundaries.geojson(level, tier)
+    if geojson is None:
+        return map_message(f"No {level} boundaries ({os.path.basename(boundaries.path(level))})"), None
+
+    with metrics.phase('filter'):
+        mask = dataset.cube.index.mask(dict(zip(DROPDOWN_COLUMNS.values(), selected)))
+    with metrics.phase('aggregate'):
+        labels, values = dataset.areas.values(level, measure_weights(dataset.plan, measure, gender), mask)
+    shown = {'dataset': dataset.id, 'level': level, 'tier': tier, 'scale': scale}
+    if same_geometry:
+        patch = Patch()
+        patch['data'][0]['z'] = values.tolist()
+        return patch, shown
+    with metrics.phase('figure build'):
+        figure = build_map(geojson, level, [area_key(label, level) for label in labels],
+                           [str(label) for label in labels], values.tolist())
+    return figure, shown
+
+
+@app.callback(
+    [Output(dropdown, 'value', allow_duplicate=True) for dropdown in MAP_DROPDOWNS],
+    Input('map_chart', 'clickData'),
+    State('map-level', 'value'),
+    prevent_initial_call=True
+)
+@metrics.callback
+def filter_from_map(click, level):
+    # Clicking an area selects it in the matching filter.
+    if not click or not click.get('points'):
+        return (no_update,) * len(MAP_DROPDOWNS)
+    label = click['points'][0].get('customdata')
+    return tuple([label] if column == level else no_update for column in GEO_LEVELS)
+
+
+if CLIENTSIDE_FILTERING:
+    # Every uploaded year's cube, plus the figure skeletons and a card, whose
+    # data the browser fills in.
+    @app.callback(
+        Output('client-cube', 'data'),
+        Input('stored-data', 'data'),
+    )
+    @metrics.callback
+    def send_client_cube(data):
+        store = {'chain': OPTION_CHAIN, 'columns': list(DROPDOWN_COLUMNS.values()), 'figures': list(FIGURE_TEMPLATES),
+                 'years': sorted(data or {}), 'partitions': {}, 'empty': plain(empty_outputs())}
+        for year, data_id in (data or {}).items():
+            dataset = find_dataset(data_id)
+            if dataset is not None:
+                with metrics.phase('aggregate'):
+                    store['partitions'][year] = dataset.client_cube
+        store['templates'] = {output_id: figure_skeleton(template) for output_id, template in FIGURE_TEMPLATES.items()}
+        store['templates']['card'] = plain(summary_card('', 0, '', ''))
+        return store
+
+    app.clientside_callback(
+        ClientsideFunction('crossfilter', 'options'),
+        *[Output(dropdown, 'options') for dropdown in OPTION_DROPDOWNS],
+        Input('client-cube', 'data'),
+        Input('year_dd', 'value'),
+        *[Input(dropdown, 'value') for dropdown in OPTION_DROPDOWNS[:-1]],
     )
 
+    app.clientside_callback(
+        ClientsideFunction('crossfilter', 'outputs'),
+        *[Output(output_id, 'figure' if output_id in FIGURE_TEMPLATES else 'children') for output_id in OUTPUT_BUILDERS],
+        Input('client-cube', 'data'),
+        Input('year_dd', 'value'),
+        *[Input(dropdown, 'value') for dropdown in DROPDOWN_COLUMNS],
+    )
+
+startup.mark('callbacks')
+
+
+def warm_up():
+    # What the first chart would otherwise pay for: reading (or building and
+    # saving) the figure skeletons, the empty figure and the simplified map
+    # boundaries, loading the preloaded dataset and rendering its unfiltered
+    # view into the result cache (or building its client-side cube).
+    for template in FIGURE_TEMPLATES.values():
+        figure_skeleton(template)
+    figure_skeleton(map_template)
+    empty_figure()
+    save_prebuilt_figures()
+    for level in MAP_LEVELS:
+        for tier in range(len(ZOOM_TIERS)):
+            boundaries.geojson(level, tier)
+    dataset = active_partition(preloaded_partitions, None)
+    if dataset is not None and CLIENTSIDE_FILTERING:
+        dataset.client_cube
+    elif dataset is not None:
+        selection = dataset.select({}, preloaded_partitions.items(), find_dataset)
+        for output_id in OUTPUT_BUILDERS:
+            cached_output(view_cache_key(dataset, {}, preloaded_partitions), output_id, selection)
+    # Objects allocated by now live as long as the process; keep the garbage
+    # collector from walking it on every full collection (the first of which
+    # would otherwise land on an early request, and in forked workers would
+    # touch every shared page).
+    gc.freeze()
+    startup.mark('warm-up')
+
+
+# Warm-up runs on a background thread, so the layout is served while it is
+# still going. WARM_UP=0 turns it off; serve.py waits for it before gunicorn
+# forks the workers.
+warm_up_thread = None
+if os.environ.get('WARM_UP', '1') == '1':
+    warm_up_thread = threading.Thread(target=warm_up, name='enrollment-warm-up', daemon=True)
+    warm_up_thread.start()
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,405 @@
+// Client-side filtering mode (CLIENTSIDE_FILTERING=1). The server sends each
+// uploaded year's cube once (see enrollment/crossfilter.py) together with the
+// figure skeletons and a card to use as templates; every filter change is then
+// answered here, mirroring the build_* functions in Enrollment_Plotly-Dash_Script.py.
+(function () {
+    var ELEMENTARY = ['K', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6', 'Elem NG'];
+    var JUNIOR = ['G7', 'G8', 'G9', 'G10', 'JHS NG'];
+    var TRACKS = ['ACAD ABM', 'ACAD HUMSS', 'ACAD STEM', 'ACAD GAS', 'ACAD PBM', 'TVL', 'SPORTS', 'ARTS'];
+    var SENIOR_GRADES = 2;
+    var GENDERS = ['Male', 'Female'];
+
+    function noUpdate(n) {
+        var result = [];
+        for (var i = 0; i < n; i++) {
+            result.push(window.dash_clientside.no_update);
+        }
+        return result;
+    }
+
+    function copy(value) {
+        return JSON.parse(JSON.stringify(value));
+    }
+
+    // Python's round(): halves go to the even neighbour.
+    function pyRound(x) {
+        var r = Math.round(x);
+        return (Math.abs(x % 1) === 0.5 && r % 2 !== 0) ? r - 1 : r;
+    }
+
+    function thousands(n) {
+        return String(n).replace(/\B(?=(\d{3})+(?!\d))/g, ',');
+    }
+
+    var TYPED_ARRAYS = {
+        '|u1': Uint8Array, '|i1': Int8Array, '<u2': Uint16Array, '<i2': Int16Array,
+        '<u4': Uint32Array, '<i4': Int32Array, '<f4': Float32Array, '<f8': Float64Array
+    };
+
+    // A packed array from enrollment/wire.py (little-endian, uncompressed),
+    // as a typed array; an N-d one as a list of its rows.
+    function unpack(packed) {
+        var bytes = Uint8Array.from(atob(packed.data), function (c) { return c.charCodeAt(0); });
+        var values;
+        if (packed.dtype === '<i8') {
+            values = Float64Array.from(new BigInt64Array(bytes.buffer), Number);
+        } else {
+            values = new TYPED_ARRAYS[packed.dtype](bytes.buffer);
+        }
+        if (packed.shape.length < 2) {
+            return values;
+        }
+        var width = values.length / packed.shape[0], rows = [];
+        for (var i = 0; i < packed.shape[0]; i++) {
+            rows.push(values.subarray(i * width, (i + 1) * width));
+        }
+        return rows;
+    }
+
+    // Decoded cubes, kept for as long as the store holds them.
+    var decoded = new WeakMap();
+
+    function decode(cube) {
+        var result = decoded.get(cube);
+        if (result === undefined) {
+            result = {
+                dimensions: cube.dimensions,
+                series: cube.series,
+                codes: {},
+                sums: {},
+                rows: unpack(cube.rows),
+                schools: unpack(cube.schools),
+                spanning: cube.spanning ? {cells: unpack(cube.spanning.cells),
+                                           offsets: unpack(cube.spanning.offsets)} : null,
+                national_total: cube.national_total,
+                distinct_rows: cube.distinct_rows
+            };
+            Object.keys(cube.codes).forEach(function (col) { result.codes[col] = unpack(cube.codes[col]); });
+            GENDERS.forEach(function (gender) { result.sums[gender] = cube.sums[gender].map(unpack); });
+            decoded.set(cube, result);
+        }
+        return result;
+    }
+
+    // The cube of the selected year, as the server's active_partition() picks it.
+    function activeYear(store, year) {
+        if (!store || !store.years || !store.years.length) {
+            return null;
+        }
+        return store.years.indexOf(year) >= 0 ? year : store.years[store.years.length - 1];
+    }
+
+    // Cell mask for `filters` (column -> selected labels); null means all cells.
+    function cellMask(cube, filters, columns) {
+        var mask = null;
+        columns.forEach(function (col) {
+            var selected = filters[col];
+            if (!selected || !selected.length) {
+                return;
+            }
+            var labels = cube.dimensions[col];
+            var wanted = new Uint8Array(labels.length);
+            selected.forEach(function (value) {
+                var code = labels.indexOf(value);
+                if (code >= 0) {
+                    wanted[code] = 1;
+                }
+            });
+            var codes = cube.codes[col];
+            if (mask === null) {
+                mask = new Uint8Array(codes.length).fill(1);
+            }
+            for (var i = 0; i < codes.length; i++) {
+                if (mask[i] && !(codes[i] >= 0 && wanted[codes[i]])) {
+                    mask[i] = 0;
+                }
+            }
+        });
+        return mask;
+    }
+
+    function sumMasked(values, mask) {
+        var total = 0;
+        for (var i = 0; i < values.length; i++) {
+            if (mask === null || mask[i]) {
+                total += values[i];
+            }
+        }
+        return total;
+    }
+
+    // Schools counted more than once by summing the per-cell school counts
+    // over `mask`: those with rows in several of the selected cells.
+    function repeatedSchools(spanning, mask) {
+        if (spanning === null) {
+            return 0;
+        }
+        var cells = spanning.cells, offsets = spanning.offsets, repeats = 0;
+        for (var s = 0; s + 1 < offsets.length; s++) {
+            var matched = 0;
+            for (var i = offsets[s]; i < offsets[s + 1]; i++) {
+                if (mask === null || mask[cells[i]]) {
+                    matched++;
+                }
+            }
+            repeats += Math.max(matched - 1, 0);
+        }
+        return repeats;
+    }
+
+    // Series x gender totals over the selected cells, with the stage and
+    // overall totals the server's AggregationPlan adds.
+    function Totals(cube, filters) {
+        var mask = cellMask(cube, filters, Object.keys(cube.codes));
+        var self = this;
+        this.sums = {};
+        GENDERS.forEach(function (gender) {
+            var sums = {};
+            cube.series.forEach(function (name, s) {
+                sums[name] = sumMasked(cube.sums[gender][s], mask);
+            });
+            function add(names) {
+                return names.reduce(function (total, name) { return total + sums[name]; }, 0);
+            }
+            sums['Elementary'] = add(ELEMENTARY);
+            sums['Junior High School'] = add(JUNIOR);
+            sums['Senior High School'] = add(TRACKS);
+            sums['All'] = sums['Elementary'] + sums['Junior High School'] + sums['Senior High School'];
+            self.sums[gender] = sums;
+        });
+        this.rows = sumMasked(cube.rows, mask);
+        this.schools = sumMasked(cube.schools, mask) - repeatedSchools(cube.spanning, mask);
+    }
+
+    Totals.prototype.at = function (name, gender) {
+        return this.sums[gender][name];
+    };
+
+    Totals.prototype.both = function (name) {
+        return this.sums.Male[name] + this.sums.Female[name];
+    };
+
+    Totals.prototype.average = function (name, gender) {
+        return this.rows === 0 ? 0 : this.sums[gender][name] / this.rows;
+    };
+
+    function card(template, label, value, share, change) {
+        var result = copy(template);
+        var children = result.props.children;
+        children[0].props.children = label;
+        children[1].props.children = thousands(value);
+        children[2].props.children = share;
+        if (change === null) {
+            children.pop();
+        } else {
+            children[3].props.children = change;
+        }
+        return result;
+    }
+
+    function share(part, whole, suffix) {
+        return whole > 0 ? (part / whole * 100).toFixed(1) + '% of ' + suffix : '0%';
+    }
+
+    function yearChange(view, measure) {
+        if (view.previous === null) {
+            return null;
+        }
+        var before = measure(view.previous);
+        if (!before) {
+            return null;
+        }
+        var change = (measure(view.current) - before) / before * 100;
+        return (change >= 0 ? '▲' : '▼') + ' ' + Math.abs(change).toFixed(1) + '% vs ' + view.previousYear;
+    }
+
+    function fill(template, traces) {
+        var figure = copy(template);
+        traces.forEach(function (arrays, i) {
+            Object.keys(arrays).forEach(function (prop) {
+                figure.data[i][prop] = arrays[prop];
+            });
+        });
+        return figure;
+    }
+
+    // Male and Female traces over `names`, as the stacked px.bar builders make them.
+    function genderTraces(totals, names, labels, value, horizontal, withText) {
+        return GENDERS.map(function (gender) {
+            var values = names.map(function (name) { return value(name, gender); });
+            var customdata = names.map(function (name) {
+                return [value(name, 'Male') + value(name, 'Female'), gender];
+            });
+            var trace = {customdata: customdata};
+            trace[horizontal ? 'x' : 'y'] = values;
+            trace[horizontal ? 'y' : 'x'] = labels;
+            if (withText) {
+                trace.text = values;
+            }
+            return trace;
+        });
+    }
+
+    function byTotalDescending(names, total) {
+        // Array.prototype.sort is stable, as pandas' sort is for these few rows.
+        return names.slice().sort(function (a, b) { return total(b) - total(a); });
+    }
+
+    var FIGURES = {
+        education_bar_chart: function (view) {
+            var totals = view.current;
+            var stages = ['Elementary', 'Junior High School', 'Senior High School'];
+            return genderTraces(totals, stages, ['Elementary', 'Junior HS', 'Senior HS'],
+                                function (name, gender) { return totals.at(name, gender); }, false, false);
+        },
+        elementary_bar_chart: function (view) {
+            var totals = view.current;
+            return genderTraces(totals, ELEMENTARY, ELEMENTARY,
+                                function (name, gender) { return totals.at(name, gender); }, false, true);
+        },
+        jhs_bar_chart: function (view) {
+            var totals = view.current;
+            return genderTraces(totals, JUNIOR, JUNIOR,
+                                function (name, gender) { return totals.at(name, gender); }, false, true);
+        },
+        shs_bar_chart: function (view) {
+            var totals = view.current;
+            var tracks = byTotalDescending(TRACKS, function (name) { return totals.both(name); });
+            var labels = tracks.map(function (name) { return name.replace('ACAD ', ''); });
+            return genderTraces(totals, tracks, labels,
+                                function (name, gender) { return totals.at(name, gender); }, true, true);
+        },
+        enrollment_rate_chart: function (view) {
+            var totals = view.current;
+            var grades = ELEMENTARY.slice(0, -1).concat(JUNIOR.slice(0, -1), ['Elem NG', 'JHS NG']);
+            var labels = grades.map(function (name) {
+                return {'Elem NG': 'E-NG', 'JHS NG': 'J-NG'}[name] || name;
+            });
+            return genderTraces(totals, grades, labels,
+                                function (name, gender) { return pyRound(totals.average(name, gender)); }, false, false);
+        },
+        tracks_rate_chart: function (view) {
+            var totals = view.current;
+            function value(name, gender) {
+                return pyRound(totals.average(name, gender) / SENIOR_GRADES);
+            }
+            // Ordered like the server's groupby (by label) and descending sort, reversed.
+            var tracks = TRACKS.slice().sort(function (a, b) {
+                var x = a.replace('ACAD ', ''), y = b.replace('ACAD ', '');
+                return x < y ? -1 : x > y ? 1 : 0;
+            });
+            tracks = byTotalDescending(tracks, function (name) { return value(name, 'Male') + value(name, 'Female'); });
+            tracks.reverse();
+            var labels = tracks.map(function (name) { return name.replace('ACAD ', ''); });
+            return genderTraces(totals, tracks, labels, value, true, false);
+        },
+        trend_chart: function (view) {
+            var stages = ['Elementary', 'Junior High School', 'Senior High School'];
+            return stages.map(function (stage) {
+                var years = [], values = [], changes = [];
+                view.history.forEach(function (entry, i) {
+                    var value = entry.totals.both(stage);
+                    var change = '-';
+                    if (i > 0) {
+                        var before = values[i - 1];
+                        if (before !== 0) {
+                            var pct = (value / before - 1) * 100;
+                            change = (pct >= 0 ? '+' : '') + pct.toFixed(1) + '%';
+                        } else if (value !== 0) {
+                            change = '+inf%';
+                        }
+                    }
+                    years.push(entry.year);
+                    values.push(value);
+                    changes.push([change]);
+                });
+                return {x: years, y: values, customdata: changes};
+            });
+        }
+    };
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        crossfilter: {
+            // Cascading dropdown options; `values` are the selections in
+            // OPTION_CHAIN order, one fewer than the dropdowns.
+            options: function (store, year) {
+                var values = Array.prototype.slice.call(arguments, 2);
+                var chain = store && store.chain;
+                year = activeYear(store, year);
+                if (year === null || !store.partitions[year]) {
+                    return chain ? chain.map(function () { return []; }) : noUpdate(values.length + 1);
+                }
+                var cube = decode(store.partitions[year]);
+                var filters = {};
+                return chain.map(function (col, level) {
+                    var mask = cellMask(cube, filters, chain.slice(0, level));
+                    var labels = cube.dimensions[col], codes = cube.codes[col];
+                    var present = new Uint8Array(labels.length);
+                    for (var i = 0; i < codes.length; i++) {
+                        if (codes[i] >= 0 && (mask === null || mask[i])) {
+                            present[codes[i]] = 1;
+                        }
+                    }
+                    if (level < values.length) {
+                        filters[col] = values[level];
+                    }
+                    return labels.filter(function (label, code) { return present[code]; })
+                        .sort()
+                        .map(function (label) { return {label: label, value: label}; });
+                });
+            },
+
+            // Cards and figures; `values` are the dropdown selections in the
+            // order of store.columns.
+            outputs: function (store, year) {
+                var values = Array.prototype.slice.call(arguments, 2);
+                if (!store) {
+                    return noUpdate(11);
+                }
+                year = activeYear(store, year);
+                if (year === null || !store.partitions[year]) {
+                    return store.empty;
+                }
+                var filters = {};
+                store.columns.forEach(function (col, i) { filters[col] = values[i]; });
+
+                var cube = decode(store.partitions[year]);
+                var position = store.years.indexOf(year);
+                var previousYear = position > 0 ? store.years[position - 1] : null;
+                var previous = previousYear !== null && store.partitions[previousYear] && decode(store.partitions[previousYear]);
+                var view = {
+                    current: new Totals(cube, filters),
+                    previous: previous ? new Totals(previous, filters) : null,
+                    previousYear: previousYear,
+                    history: []
+                };
+                store.years.forEach(function (other) {
+                    if (store.partitions[other]) {
+                        view.history.push({
+                            year: other,
+                            totals: other === year ? view.current : new Totals(decode(store.partitions[other]), filters)
+                        });
+                    }
+                });
+
+                var t = view.current, template = store.templates.card;
+                function male(totals) { return totals.at('All', 'Male'); }
+                function female(totals) { return totals.at('All', 'Female'); }
+                function enrollees(totals) { return totals.both('All'); }
+                function schools(totals) { return totals.schools; }
+                var outputs = [
+                    card(template, 'Male', male(t), share(male(t), enrollees(t), 'Total'), yearChange(view, male)),
+                    card(template, 'Female', female(t), share(female(t), enrollees(t), 'Total'), yearChange(view, female)),
+                    card(template, 'Enrollees', enrollees(t), share(enrollees(t), cube.national_total, 'Nationwide'),
+                         yearChange(view, enrollees)),
+                    card(template, 'Schools', schools(t), share(schools(t), cube.distinct_rows, 'Nationwide'),
+                         yearChange(view, schools))
+                ];
+                store.figures.forEach(function (output) {
+                    outputs.push(fill(store.templates[output], FIGURES[output](view)));
+                });
+                return outputs;
+            }
+        }
+    });
+})();
@@ -0,0 +1 @@
+# Run the benchmarks from the repository root, e.g. `python -m benchmarks.bench_filter_index`
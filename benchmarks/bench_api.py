@@ -0,0 +1,62 @@
+import base64
+import os
+import statistics
+import time
+
+from benchmarks.dash_client import DashClient, finish_upload, load_dashboard
+from benchmarks.synthetic import generate_lis_csv, synthetic_frame
+
+
+# A scheduled job polling /api/aggregates for a few views: the first request
+# (aggregates computed), a repeat without validators (body from the result
+# cache) and a conditional GET with the ETag it got back (304). The job
+# reads with the session cookie of the upload.
+#
+#   python -m benchmarks.bench_api
+
+
+def views(frame):
+    region = frame['Region'].cat.categories[0]
+    province = sorted(frame.loc[frame['Region'] == region, 'Province'].unique())[0]
+    return {
+        'national': [],
+        'region': [('region', region)],
+        'province, public': [('region', region), ('province', province), ('sector', 'PUBLIC')],
+    }
+
+
+def timed_get(client, query, headers=None):
+    start = time.perf_counter()
+    response = client.get('/api/aggregates', query_string=query, headers=headers or {})
+    body = response.get_data()
+    return time.perf_counter() - start, response, len(body)
+
+
+def main(n_rows=60_000, repeat=20):
+    os.environ['AGGREGATE_API'] = '1'
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    dashboard = load_dashboard()
+    client = DashClient(dashboard.app)
+    client.set('upload-dataset.contents', contents)
+    client.call('output-upload', ['upload-dataset.contents'])
+    finish_upload(client, dashboard)
+    dataset_id = next(iter(client.props['stored-data.data'].values()))
+    # The uploading session's cookie grants it the dataset.
+    http = client.client
+
+    print(f'{n_rows:,} rows, /api/aggregates')
+    print(f'{"view":<18}{"first (ms)":>12}{"cached (ms)":>13}{"304 (ms)":>10}{"body bytes":>12}')
+    for name, filters in views(synthetic_frame(n_rows)).items():
+        query = [('dataset', dataset_id), *filters]
+        dashboard.results_cache.clear()
+        first, response, size = timed_get(http, query)
+        etag = response.headers['ETag']
+        cached = statistics.median(timed_get(http, query)[0] for _ in range(repeat))
+        revalidations = [timed_get(http, query, {'If-None-Match': etag}) for _ in range(repeat)]
+        assert all(r.status_code == 304 for _, r, _ in revalidations)
+        revalidated = statistics.median(t for t, _, _ in revalidations)
+        print(f'{name:<18}{first * 1000:>12.1f}{cached * 1000:>13.2f}{revalidated * 1000:>10.2f}{size:>12,}')
+
+
+if __name__ == '__main__':
+    main()
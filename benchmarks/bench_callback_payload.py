@@ -0,0 +1,58 @@
+import base64
+import statistics
+import time
+
+from benchmarks.dash_client import DashClient, finish_upload, load_dashboard
+from benchmarks.synthetic import generate_lis_csv, synthetic_frame
+
+
+def interactions(frame):
+    # A typical session: drill down into one region, then flip sector/COC.
+    region = frame['Region'].cat.categories[0]
+    provinces = sorted(frame.loc[frame['Region'] == region, 'Province'].unique())
+    return [
+        ('region_dd.value', [region]),
+        ('province_dd.value', provinces[:1]),
+        ('sector_dd.value', ['PUBLIC']),
+        ('sector_dd.value', ['PRIVATE']),
+        ('modified_coc_dd.value', ['PURELY ELEMENTARY SCHOOL']),
+        ('modified_coc_dd.value', []),
+        ('province_dd.value', provinces[:2]),
+    ]
+
+
+def run(dashboard, contents, steps, full_figures):
+    dashboard.results_cache.clear()
+    client = DashClient(dashboard.app)
+    client.set('upload-dataset.contents', contents)
+    client.call('output-upload', ['upload-dataset.contents'])
+    finish_upload(client, dashboard)
+    client.call('male_summary_card', ['stored-data.data'])
+
+    sizes, latencies = [], []
+    for prop_id, value in steps:
+        client.set(prop_id, value)
+        if full_figures:
+            # What the single 10-output callback used to do: resend everything.
+            client.set('view-key.data', None)
+        start = time.perf_counter()
+        _, _, response_bytes = client.call('male_summary_card', [prop_id])
+        latencies.append(time.perf_counter() - start)
+        sizes.append(response_bytes)
+    return sizes, latencies
+
+
+def main(n_rows=60_000):
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    dashboard = load_dashboard()
+    steps = interactions(synthetic_frame(n_rows))
+
+    print(f'{n_rows:,} rows, {len(steps)} filter changes')
+    print(f'{"mode":<22}{"mean bytes":>12}{"median ms":>12}')
+    for name, full in (('full figures', True), ('changed outputs only', False)):
+        sizes, latencies = run(dashboard, contents, steps, full)
+        print(f'{name:<22}{statistics.mean(sizes):>12,.0f}{statistics.median(latencies) * 1000:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import time
+import tracemalloc
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import Dataset
+from enrollment.export import available_formats, export_stream, row_chunks
+
+
+# Exporting the national selection: streamed in chunks from the filter index
+# against the whole selection turned into one file before anything is sent.
+# Time to first byte is what the browser waits before the download starts;
+# peak memory is what the worker holds while producing it.
+#
+#   python -m benchmarks.bench_export
+
+
+def first_byte_and_total(stream):
+    start = time.perf_counter()
+    first = None
+    for part in stream:
+        if first is None and part:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def peak_memory(stream):
+    tracemalloc.start()
+    for _ in stream:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(n_rows=60_000, chunk_rows=10_000):
+    dataset = Dataset('bench', synthetic_frame(n_rows)).build()
+    rows = dataset.index.rows({})
+
+    def streamed(fmt):
+        return export_stream(fmt, row_chunks(dataset.frame, rows, chunk_rows))
+
+    def whole(fmt):
+        selection = dataset.frame if rows is None else dataset.frame.iloc[rows]
+        yield b''.join(export_stream(fmt, [selection]))
+
+    print(f'{n_rows:,} rows, national export, {chunk_rows:,} rows per chunk')
+    print(f'{"format":<9}{"whole: first byte (ms)":>24}{"peak (MB)":>11}'
+          f'{"streamed: first byte (ms)":>27}{"total (ms)":>12}{"peak (MB)":>11}')
+    for fmt in available_formats():
+        old_first, _ = first_byte_and_total(whole(fmt))
+        new_first, new_total = first_byte_and_total(streamed(fmt))
+        old_peak, new_peak = peak_memory(whole(fmt)), peak_memory(streamed(fmt))
+        print(f'{fmt:<9}{old_first * 1000:>24.0f}{old_peak / 2**20:>11.1f}'
+              f'{new_first * 1000:>27.1f}{new_total * 1000:>12.0f}{new_peak / 2**20:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import base64
+import time
+
+from plotly.io.json import to_json_plotly
+
+from benchmarks.bench_callback_payload import interactions
+from benchmarks.dash_client import load_dashboard
+from benchmarks.synthetic import generate_lis_csv, synthetic_frame
+from enrollment.data import Dataset, read_upload
+
+
+# Per-view cost of the six px charts against the aggregation behind them:
+# building each figure with px.bar (what every view used to cost; the
+# *_template functions are the same px calls) versus filling the prebuilt
+# skeletons, both including JSON serialization (the encoder Dash uses).
+
+CHARTS = ['education_bar_chart', 'elementary_bar_chart', 'jhs_bar_chart', 'shs_bar_chart',
+          'enrollment_rate_chart', 'tracks_rate_chart']
+
+
+def per_view(fn, views, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for view in views:
+            fn(view)
+        best = min(best, time.perf_counter() - start)
+    return best / len(views)
+
+
+def main(n_rows=60_000):
+    dashboard = load_dashboard()
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    dataset = Dataset('bench', *read_upload(contents)).build()
+    filters = [{}]
+    for prop_id, value in interactions(synthetic_frame(n_rows)):
+        column = {'region_dd.value': 'Region', 'province_dd.value': 'Province', 'sector_dd.value': 'Sector',
+                  'modified_coc_dd.value': 'Modified COC'}[prop_id]
+        filters.append(dict(filters[-1], **{column: value}))
+
+    def aggregate(f):
+        selection = dataset.select(f)
+        selection.aggregates, selection.averages
+
+    def px_build(f):
+        for output_id in CHARTS:
+            to_json_plotly(dashboard.FIGURE_TEMPLATES[output_id]())
+
+    def skeleton_fill(f):
+        selection = dataset.select(f)
+        selection.aggregates, selection.averages
+        for output_id in CHARTS:
+            to_json_plotly(dashboard.OUTPUT_BUILDERS[output_id](selection))
+
+    def fill_only(f):
+        selection = dataset.select(f)
+        selection.aggregates, selection.averages
+        for output_id in CHARTS:
+            dashboard.OUTPUT_BUILDERS[output_id](selection)
+
+    skeleton_fill(filters[0])  # build the skeletons once
+    aggregation = per_view(aggregate, filters)
+    rebuilt = per_view(px_build, filters, repeat=2)
+    filled = per_view(skeleton_fill, filters) - aggregation
+    fill = per_view(fill_only, filters) - aggregation
+
+    print(f'{n_rows:,} rows, {len(filters)} views, six charts per view')
+    print(f'{"aggregation":<28}{aggregation * 1000:>10.2f} ms')
+    print(f'{"px.bar + serialize":<28}{rebuilt * 1000:>10.2f} ms')
+    print(f'{"skeleton fill + serialize":<28}{filled * 1000:>10.2f} ms  ({rebuilt / filled:.0f}x faster)')
+    print(f'{"  of which skeleton fill":<28}{fill * 1000:>10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import time
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import FILTER_COLUMNS
+from enrollment.index import FilterIndex
+
+
+def isin_chain(df, selections):
+    # The old callback path: one filtered copy per active filter.
+    for col, selected_values in selections.items():
+        if selected_values:
+            df = df[df[col].isin(selected_values)]
+    return df
+
+
+def best_of(fn, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scenarios(df):
+    region = df['Region'].cat.categories[0]
+    in_region = df[df['Region'] == region]
+    provinces = sorted(in_region['Province'].unique())[:2]
+    in_provinces = in_region[in_region['Province'].isin(provinces)]
+    divisions = sorted(in_provinces['Division'].unique())[:2]
+    return {
+        '3 filters': {'Region': [region], 'Sector': ['PUBLIC'],
+                      'Modified COC': ['PURELY ELEMENTARY SCHOOL', 'COMPLETE BASIC EDUCATION SCHOOL']},
+        '4 filters': {'Region': [region], 'Province': provinces, 'Sector': ['PUBLIC'], 'School Type': ['MOTHER SCHOOL']},
+        '5 filters': {'Region': [region], 'Province': provinces, 'Division': divisions, 'Sector': ['PUBLIC', 'PRIVATE'],
+                      'Modified COC': ['PURELY ELEMENTARY SCHOOL', 'ELEMENTARY & JUNIOR HIGH SCHOOL',
+                                       'COMPLETE BASIC EDUCATION SCHOOL']},
+    }
+
+
+def main(n_rows=60_000):
+    df = synthetic_frame(n_rows)
+    start = time.perf_counter()
+    index = FilterIndex(df, FILTER_COLUMNS)
+    print(f'{n_rows:,} rows, index built in {(time.perf_counter() - start) * 1000:.1f} ms')
+    print(f'{"scenario":<12}{"rows":>8}{"isin (ms)":>12}{"index (ms)":>12}{"speedup":>10}')
+    for name, selections in scenarios(df).items():
+        assert len(isin_chain(df, selections)) == len(index.select(df, selections))
+        old = best_of(lambda: isin_chain(df, selections))
+        new = best_of(lambda: index.select(df, selections))
+        print(f'{name:<12}{len(index.select(df, selections)):>8}{old * 1000:>12.2f}{new * 1000:>12.2f}{old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import time
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import Dataset
+from enrollment.geo import GEO_LEVELS
+
+
+# Map values per area: a groupby over the filtered school rows against the
+# dataset's precomputed area sums (unfiltered) or a bincount over the matching
+# cube cells (filtered).
+#
+#   python -m benchmarks.bench_map
+
+
+def best_of(fn, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def groupby_values(dataset, level, selections):
+    rows = dataset.frame
+    for col, values in selections.items():
+        rows = rows[rows[col].isin(values)]
+    return rows.groupby(level, observed=False)[dataset.enrollment_columns].sum().sum(axis=1)
+
+
+def main(n_rows=60_000):
+    dataset = Dataset('bench', synthetic_frame(n_rows)).build()
+    weights = dataset.plan.weights[dataset.plan.series.index('All')].sum(axis=0)
+    region = dataset.frame['Region'].cat.categories[0]
+    scenarios = {'national': {}, 'public': {'Sector': ['PUBLIC']},
+                 'region, public': {'Region': [region], 'Sector': ['PUBLIC']}}
+    print(f'{n_rows:,} rows, total enrollment per area')
+    print(f'{"level":<10}{"scenario":<16}{"groupby (ms)":>14}{"area sums (ms)":>16}{"speedup":>10}')
+    for level in GEO_LEVELS:
+        for name, selections in scenarios.items():
+            mask = dataset.cube.index.mask(selections)
+            _, values = dataset.areas.values(level, weights, mask)
+            assert values.tolist() == groupby_values(dataset, level, selections).tolist()
+            old = best_of(lambda: groupby_values(dataset, level, selections))
+            new = best_of(lambda: dataset.areas.values(level, weights, dataset.cube.index.mask(selections)))
+            print(f'{level:<10}{name:<16}{old * 1000:>14.2f}{new * 1000:>16.2f}{old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import base64
+import time
+
+from benchmarks.synthetic import generate_lis_csv
+from enrollment.data import FILTER_COLUMNS, Dataset, concat_chunks, merge_datasets, read_upload
+
+
+# Adding one regional extract to a loaded dataset: merging it in (school id
+# lookups, appended index postings, new cube cells only) against rebuilding
+# the whole dataset from the concatenated rows.
+#
+#   python -m benchmarks.bench_merge
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def regional_datasets(n_rows):
+    # The synthetic export split into everything but its last region, and
+    # that region on its own, each ingested as its own upload would be.
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    frame, _ = read_upload(contents)
+    last = frame['Region'] == frame['Region'].cat.categories[-1]
+
+    def dataset(name, rows):
+        rows = rows.reset_index(drop=True)
+        for col in FILTER_COLUMNS:
+            rows[col] = rows[col].cat.remove_unused_categories()
+        return Dataset(name, rows).build()
+
+    return dataset('base', frame[~last]), dataset('region', frame[last])
+
+
+def main(sizes=(60_000, 250_000)):
+    print(f'{"rows":>10}{"added":>9}{"merge (ms)":>13}{"rebuild (ms)":>15}{"speedup":>10}')
+    for n_rows in sizes:
+        base, region = regional_datasets(n_rows)
+        merged = merge_datasets(base, [('region', region)], 'merged')
+        full = Dataset('full', concat_chunks([base.frame, region.frame])).build()
+        assert (merged.national.sums == full.national.sums).all()
+        merge = best_of(lambda: merge_datasets(base, [('region', region)], 'merged'))
+        rebuild = best_of(lambda: Dataset('full', concat_chunks([base.frame, region.frame])).build())
+        print(f'{len(base.frame):>10,}{len(region.frame):>9,}{merge * 1000:>13.1f}{rebuild * 1000:>15.1f}{rebuild / merge:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
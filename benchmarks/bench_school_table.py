@@ -0,0 +1,50 @@
+import time
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import Dataset
+from enrollment.schools import SCHOOL_COLUMNS
+
+
+# One page of the school table: filter, sort by total enrollment and slice,
+# from the frame (isin + per-request totals + sort_values) against the
+# SchoolTable (filter index mask over a cached sort order).
+#
+#   python -m benchmarks.bench_school_table
+
+
+def best_of(fn, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def frame_page(dataset, selections, page, page_size):
+    rows = dataset.frame
+    for col, values in selections.items():
+        rows = rows[rows[col].isin(values)]
+    rows = rows.assign(Total=rows[dataset.enrollment_columns].sum(axis=1)).sort_values('Total', ascending=False)
+    return rows[SCHOOL_COLUMNS + ['Total']].iloc[page * page_size:(page + 1) * page_size].to_dict('records')
+
+
+def main(n_rows=60_000, page_size=25):
+    dataset = Dataset('bench', synthetic_frame(n_rows)).build()
+    region = dataset.frame['Region'].cat.categories[0]
+    scenarios = {'national': {}, 'one region': {'Region': [region]},
+                 'region, public': {'Region': [region], 'Sector': ['PUBLIC']}}
+    table = dataset.schools
+    print(f'{n_rows:,} rows, sorted by total, page 3 of {page_size}')
+    print(f'{"scenario":<16}{"schools":>9}{"frame (ms)":>12}{"table (ms)":>12}{"speedup":>10}')
+    for name, selections in scenarios.items():
+        mask = dataset.index.mask(selections)
+        count, records = table.page(mask, 3, page_size, 'Total', True)
+        assert [r['Total'] for r in records] == [r['Total'] for r in frame_page(dataset, selections, 3, page_size)]
+        old = best_of(lambda: frame_page(dataset, selections, 3, page_size))
+        new = best_of(lambda: table.page(dataset.index.mask(selections), 3, page_size, 'Total', True))
+        print(f'{name:<16}{count:>9,}{old * 1000:>12.2f}{new * 1000:>12.2f}{old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
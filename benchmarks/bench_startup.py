@@ -0,0 +1,105 @@
+import base64
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.dash_client import ROOT
+
+
+# Cold start of the dashboard in fresh processes: seconds from process start
+# to the end of the imports, the first page load, the first chart and the
+# end of warm-up (the STARTUP_PROFILE steps), with a cached dataset preloaded
+# and the first chart requested right after the page, i.e. before warm-up
+# has necessarily finished. The last scenario runs as in an environment
+# without IPython, which Dash otherwise imports when it is installed; the
+# cost of that import on its own is printed first.
+#
+#   python -m benchmarks.bench_startup
+
+STEPS = ['imports', 'first page', 'first chart', 'warm-up']
+
+SCENARIOS = [
+    ('no warm-up', {'WARM_UP': '0'}, False, False),
+    ('warm-up, building figures', {}, False, False),
+    ('warm-up, saved figures', {}, True, False),
+    ('saved figures, no IPython', {}, True, True),
+]
+
+
+def child(block_ipython):
+    # One cold start; prints the startup steps as JSON.
+    if block_ipython:
+        sys.modules['IPython'] = None  # as if it weren't installed
+    from benchmarks.dash_client import DashClient, load_dashboard
+
+    dashboard = load_dashboard()
+    client = DashClient(dashboard.app)
+    client.client.get('/')
+    client.client.get('/_dash-layout')
+    client.client.get('/_dash-dependencies')
+    client.set('stored-data.data', dashboard.preloaded_partitions)
+    client.call('male_summary_card', ['stored-data.data'])
+    if dashboard.warm_up_thread is not None:
+        dashboard.warm_up_thread.join()
+    print(json.dumps(dashboard.startup.steps))
+
+
+def ipython_import_time(runs):
+    # Median seconds to import IPython in a fresh process, or None if it
+    # isn't installed.
+    code = 'import time; t = time.perf_counter(); import IPython; print(time.perf_counter() - t)'
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        if result.returncode:
+            return None
+        samples.append(float(result.stdout))
+    return statistics.median(samples)
+
+
+def prepare_cache(directory, n_rows):
+    from benchmarks.synthetic import generate_lis_csv
+    from enrollment.data import Dataset, dataset_id, read_upload, save_to_disk
+    from enrollment.disk_cache import DatasetDiskCache
+
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    dataset = Dataset(dataset_id(contents), *read_upload(contents), school_year='SY 2023-2024').build()
+    save_to_disk(dataset, DatasetDiskCache(directory, 1 << 40))
+
+
+def main(n_rows=60_000, runs=5):
+    with tempfile.TemporaryDirectory() as directory:
+        prepare_cache(directory, n_rows)
+        env = dict(os.environ, PRELOAD_LATEST_DATASET='1', DATASET_CACHE_DIR=directory)
+        ipython = ipython_import_time(runs)
+        print('import IPython: ' + ('not installed' if ipython is None else f'{ipython:.3f} s'))
+        print(f'{n_rows:,} row dataset preloaded, median of {runs} cold starts (seconds since process start)')
+        print(f'{"":<28}' + ''.join(f'{step:>13}' for step in STEPS))
+        for name, extra, keep_figures, block_ipython in SCENARIOS:
+            samples = []
+            for _ in range(runs):
+                if not keep_figures:
+                    for path in glob.glob(os.path.join(directory, 'figures-*.json')):
+                        os.remove(path)
+                command = [sys.executable, '-m', 'benchmarks.bench_startup', '--child']
+                if block_ipython:
+                    command.append('--no-ipython')
+                output = subprocess.run(command, cwd=ROOT, env=dict(env, **extra), capture_output=True,
+                                        text=True, check=True).stdout
+                samples.append(json.loads(output.strip().splitlines()[-1]))
+            row = ''
+            for step in STEPS:
+                values = [sample[step] for sample in samples if step in sample]
+                row += f'{statistics.median(values):>13.3f}' if values else f'{"-":>13}'
+            print(f'{name:<28}{row}')
+
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        child('--no-ipython' in sys.argv)
+    else:
+        main()
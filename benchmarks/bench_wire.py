@@ -0,0 +1,36 @@
+import base64
+import json
+import time
+
+from benchmarks.synthetic import generate_lis_csv
+from enrollment.data import Dataset, read_upload
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(n_rows=60_000):
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    frame, cells = read_upload(contents)
+
+    # What the dashboard used to keep in dcc.Store, against the client cube
+    # (packed arrays per cell) it keeps now.
+    records, encoded = best_of(lambda: json.dumps(frame.to_dict('records')), repeat=1)
+    records_bytes = len(encoded)
+    dataset = Dataset('bench', frame, cells).build()
+    cube, payload = best_of(lambda: json.dumps(dataset.client_cube))
+
+    print(f'{n_rows:,} rows')
+    print(f'{"payload":<28}{"bytes":>14}{"encode ms":>12}')
+    print(f'{"to_dict(records)":<28}{records_bytes:>14,}{records * 1000:>12.1f}')
+    print(f'{"client cube":<28}{len(payload):>14,}{cube * 1000:>12.1f}  ({records_bytes / len(payload):.0f}x smaller)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import importlib.util
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'Enrollment_Plotly-Dash_Script.py')
+
+
+def load_dashboard():
+    # The dashboard script isn't importable by name (it has a hyphen in it).
+    spec = importlib.util.spec_from_file_location('enrollment_dashboard', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def finish_upload(client, dashboard):
+    # Uploads are parsed (and merged) by background jobs; wait for them and
+    # poll, as the browser's ingest-poll interval would, until nothing is
+    # pending. Returns the polls' response bytes (0 when the upload needed no
+    # job).
+    response_bytes = 0
+    pending = client.props.get('ingest-job.data')
+    while pending:
+        for pending_job in pending['jobs']:
+            job = dashboard.ingest_jobs.get(pending_job['id'])
+            if job is not None:
+                job.future.exception()
+        _, _, polled_bytes = client.call('poll_ingest_job', ['ingest-poll.n_intervals'])
+        response_bytes += polled_bytes
+        pending = client.props.get('ingest-job.data')
+    return response_bytes
+
+
+class DashClient:
+    # Drives callbacks through the real /_dash-update-component route, so the
+    # measurements include Dash's request decoding and response serialization.
+    def __init__(self, app):
+        self.app = app
+        self.client = app.server.test_client()
+        self.props = {}
+
+    def _callback(self, output_id):
+        # By one of its output ids or by the callback function's name.
+        for output, spec in self.app.callback_map.items():
+            if f'.{output_id}.' in f'.{output}.' or output.startswith(f'{output_id}.'):
+                return output, spec
+        for output, spec in self.app.callback_map.items():
+            if getattr(spec.get('callback'), '__name__', None) == output_id:
+                return output, spec
+        raise KeyError(output_id)
+
+    def set(self, prop_id, value):
+        self.props[prop_id] = value
+
+    def call(self, output_id, changed):
+        # Fires the callback that writes `output_id` (or is named so), as if `changed` (a list
+        # of 'component.property' ids) had just changed in the browser.
+        # Returns (response dict, request bytes, response bytes).
+        output, spec = self._callback(output_id)
+        outputs = [{'id': o.split('.')[0], 'property': o.split('.')[1]}
+                   for o in output.strip('.').split('...')]
+        body = json.dumps({
+            'output': output,
+            'outputs': outputs if output.startswith('..') else outputs[0],
+            'inputs': [dict(i, value=self.props.get(f"{i['id']}.{i['property']}")) for i in spec['inputs']],
+            'state': [dict(s, value=self.props.get(f"{s['id']}.{s['property']}")) for s in spec['state']],
+            'changedPropIds': changed,
+        })
+        response = self.client.post('/_dash-update-component', data=body, content_type='application/json')
+        if response.status_code == 204:
+            return {}, len(body), 0
+        payload = response.get_data()
+        result = json.loads(payload)['response']
+        for component_id, props in result.items():
+            for prop, value in props.items():
+                if not isinstance(value, dict) or '__dash_patch_update' not in value:
+                    self.props[f'{component_id}.{prop}'] = value
+        return result, len(body), len(payload)
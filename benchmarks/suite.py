@@ -0,0 +1,251 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_callback_payload import interactions
+from benchmarks.dash_client import ROOT, DashClient, finish_upload, load_dashboard
+from benchmarks.synthetic import SIZES, generate_lis_csv
+from enrollment.data import drop_dataset
+
+
+# End-to-end benchmarks of the dashboard's ingest and callback paths at the
+# synthetic sizes, recording latency, peak Python memory and response bytes
+# per step. Results are written as JSON (one file per run, named after the
+# commit) and two runs can be compared with --compare:
+#
+#   python -m benchmarks.suite --sizes 60k 250k
+#   python -m benchmarks.suite --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def summarize(latencies, peak_bytes=None, payloads=None):
+    latencies = sorted(latencies)
+    result = {
+        'runs': len(latencies),
+        'latency_ms': {
+            'min': latencies[0] * 1000,
+            'median': statistics.median(latencies) * 1000,
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        },
+    }
+    if peak_bytes is not None:
+        result['peak_mb'] = peak_bytes / 1024 / 1024
+    if payloads:
+        result['payload_bytes'] = {'mean': statistics.mean(payloads), 'max': max(payloads)}
+    return result
+
+
+def traced_peak(fn):
+    # Peak Python allocations of one call. Timings are always taken from
+    # separate, untraced runs since tracemalloc slows pandas down a lot.
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class Session:
+    # One dashboard instance and simulated browser, with the on-disk dataset
+    # cache pointed at a scratch directory.
+    def __init__(self, dashboard, contents, filename):
+        self.dashboard = dashboard
+        self.contents = contents
+        self.filename = filename
+        self.client = DashClient(dashboard.app)
+
+    def forget_dataset(self, keep_disk=False):
+        # Make the next upload of this file a new one (or, with keep_disk, one
+        # that has to come back from the on-disk cache).
+        if not keep_disk:
+            for data_id in self.dashboard.disk_cache.entries():
+                shutil.rmtree(os.path.join(self.dashboard.disk_cache.directory, data_id), ignore_errors=True)
+        drop_dataset(self.dashboard.dataset_id(self.contents))
+        self.dashboard.results_cache.clear()
+
+    def upload(self):
+        # Upload, then wait for the ingest job and poll once, as the browser's
+        # ingest-poll interval would. The payload is both responses together.
+        self.client.set('stored-data.data', None)
+        self.client.set('ingest-job.data', None)
+        self.client.set('upload-dataset.filename', self.filename)
+        self.client.set('upload-dataset.contents', self.contents)
+        result, request_bytes, payload = self.client.call('output-upload', ['upload-dataset.contents'])
+        return result, request_bytes, payload + finish_upload(self.client, self.dashboard)
+
+    def reset_filters(self):
+        for prop_id in list(self.client.props):
+            if prop_id.endswith('_dd.value') and prop_id != 'year_dd.value':
+                self.client.set(prop_id, [])
+        self.client.set('view-key.data', None)
+
+    def replay(self, output_id, steps):
+        # (latencies, response bytes) of the callback writing `output_id` over
+        # a filter sequence.
+        latencies, payloads = [], []
+        for prop_id, value in steps:
+            self.client.set(prop_id, value)
+            start = time.perf_counter()
+            _, _, response_bytes = self.client.call(output_id, [prop_id])
+            latencies.append(time.perf_counter() - start)
+            payloads.append(response_bytes)
+        return latencies, payloads
+
+
+def run_size(dashboard, n_rows, repeat):
+    contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+    session = Session(dashboard, contents, f'SY 2023-2024 synthetic {n_rows}.csv')
+    results = {}
+
+    def parse():
+        dashboard.initial_dataset(contents)
+
+    results['initial_dataset'] = summarize(timed(parse, repeat), traced_peak(parse))
+
+    def cold_upload():
+        session.forget_dataset()
+        session.upload()
+
+    latencies = []
+    for _ in range(repeat):
+        session.forget_dataset()
+        start = time.perf_counter()
+        _, _, payload = session.upload()
+        latencies.append(time.perf_counter() - start)
+    results['handle_upload_or_clear (new file)'] = summarize(latencies, traced_peak(cold_upload), [payload])
+
+    def disk_upload():
+        session.forget_dataset(keep_disk=True)
+        session.upload()
+
+    latencies = []
+    for _ in range(repeat):
+        session.forget_dataset(keep_disk=True)
+        start = time.perf_counter()
+        _, _, payload = session.upload()
+        latencies.append(time.perf_counter() - start)
+    results['handle_upload_or_clear (disk cache)'] = summarize(latencies, traced_peak(disk_upload), [payload])
+
+    dataset = dashboard.find_dataset(dashboard.dataset_id(contents))
+    steps = interactions(dataset.frame)
+
+    session.client.call('year_dd', ['stored-data.data'])
+    session.reset_filters()
+    session.client.call('region_dd', ['stored-data.data'])
+    latencies, payloads = session.replay('region_dd', steps)
+    results['update_dropdown_options'] = summarize(latencies, None, payloads)
+
+    # Cold: every view is new to the result cache. Warm: the same sequence
+    # again, as when a user flips back and forth between filters.
+    dashboard.results_cache.clear()
+    session.reset_filters()
+    session.client.call('male_summary_card', ['stored-data.data'])
+    latencies, payloads = session.replay('male_summary_card', steps)
+    results['update_metrics_and_chart (cold)'] = summarize(latencies, None, payloads)
+    latencies, payloads = session.replay('male_summary_card', steps)
+    results['update_metrics_and_chart (warm)'] = summarize(latencies, None, payloads)
+
+    def cold_sequence():
+        dashboard.results_cache.clear()
+        session.replay('male_summary_card', steps)
+
+    results['update_metrics_and_chart (cold)']['peak_mb'] = traced_peak(cold_sequence) / 1024 / 1024
+    session.forget_dataset()
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old["commit"]} -> {new["commit"]}')
+    print(f'{"size":<6}{"benchmark":<40}{"median ms":>22}{"peak MB":>20}{"payload B":>22}')
+
+    def cell(a, b, fmt):
+        if a is None or b is None:
+            return ''
+        change = f'{(b - a) / a * 100:+.0f}%' if a else ''
+        return f'{fmt.format(b)} ({change})'
+
+    for size, benchmarks in new['results'].items():
+        for name, result in benchmarks.items():
+            before = old['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            print(f'{size:<6}{name:<40}'
+                  f'{cell(before["latency_ms"]["median"], result["latency_ms"]["median"], "{:.1f}"):>22}'
+                  f'{cell(before.get("peak_mb"), result.get("peak_mb"), "{:.1f}"):>20}'
+                  f'{cell((before.get("payload_bytes") or {}).get("mean"), (result.get("payload_bytes") or {}).get("mean"), "{:,.0f}"):>22}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dashboard benchmark suite')
+    parser.add_argument('--sizes', nargs='+', default=['60k'], choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scratch = tempfile.mkdtemp(prefix='enrollment-bench-')
+    os.environ['DATASET_CACHE_DIR'] = scratch
+    try:
+        dashboard = load_dashboard()
+        report = {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'results': {},
+        }
+        for size in args.sizes:
+            print(f'{size} ({SIZES[size]:,} rows)...', flush=True)
+            report['results'][size] = run_size(dashboard, SIZES[size], args.repeat)
+            for name, result in report['results'][size].items():
+                print(f'  {name:<40}{result["latency_ms"]["median"]:>10.1f} ms'
+                      + (f'{result["peak_mb"]:>10.1f} MB' if 'peak_mb' in result else ''))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{report["commit"]}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'wrote {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import io
+import sys
+
+import numpy as np
+
+from enrollment.data import read_enrollment_csv
+
+
+REGIONS = [
+    'Region I', 'Region II', 'Region III', 'Region IV-A', 'MIMAROPA', 'Region V', 'Region VI', 'Region VII',
+    'Region VIII', 'Region IX', 'Region X', 'Region XI', 'Region XII', 'CARAGA', 'BARMM', 'CAR', 'NCR', 'PSO'
+]
+SECTORS = ['Public', 'Private', 'SUCsLUCs', 'PSO']
+SCHOOL_TYPES = ['School with no Annexes', 'Mother school', 'Annex or Extension school(s)', 'Mobile School(s)/Center(s)']
+MODIFIED_COCS = ['Purely ES', 'ES and JHS', 'JHS with SHS', 'Purely JHS', 'Purely SHS', 'All Offering']
+SUBCLASSES = [
+    'DepED Managed', 'Non-Sectarian ', 'Sectarian ', 'SUC Managed', 'LUC', 'DOST Managed',
+    'Other GA Managed', 'Local International School'
+]
+
+# Benchmark sizes: about one national LIS file, and larger multi-year loads.
+SIZES = {'60k': 60_000, '250k': 250_000, '1m': 1_000_000}
+
+# School name endings as typed in LIS, abbreviations included.
+NAME_SUFFIXES = [
+    'ES', 'E/S', 'Elem. School', 'CES', 'NHS', 'Mem. NHS', 'IS', 'HS', 'P/S', 'SHS', 'Academy, Inc', 'school inc.'
+]
+
+GRADE_LEVELS = ['K', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6', 'Elem NG', 'G7', 'G8', 'G9', 'G10', 'JHS NG']
+SHS_TRACKS = ['ACAD - ABM', 'ACAD - HUMSS', 'ACAD STEM', 'ACAD GAS', 'ACAD PBM', 'TVL', 'SPORTS', 'ARTS']
+
+# Header as it appears in the LIS export, before column-name cleaning.
+ID_COLUMNS = [
+    'BEIS School ID', 'School Name', 'Street Address', 'Barangay', 'Municipality', 'Province', 'Region',
+    'Division', 'District', 'Legislative District', 'Sector', 'School Subclassification', 'School Type',
+    'Modified COC'
+]
+ENROLLMENT_COLUMNS = (
+    [f'{lvl} {gender}' for lvl in GRADE_LEVELS for gender in ('Male', 'Female')] +
+    [f'{grade} {track} {gender}' for grade in ('G11', 'G12') for track in SHS_TRACKS for gender in ('Male', 'Female')]
+)
+HEADER = ID_COLUMNS + ENROLLMENT_COLUMNS
+
+
+def _geography(rng):
+    # Region -> ~5 provinces -> 1-4 divisions -> districts, and ~20
+    # municipalities / 3 legislative districts per province. Roughly the
+    # cardinalities of a national file.
+    rows = []
+    for region in REGIONS:
+        for p in range(rng.integers(3, 8)):
+            province = f'{region} PROVINCE {p + 1}'
+            divisions = [f'{province} DIVISION {d + 1}' for d in range(rng.integers(1, 5))]
+            municipalities = [f'{province} MUNICIPALITY {m + 1}' for m in range(rng.integers(10, 30))]
+            for m, municipality in enumerate(municipalities):
+                division = divisions[m % len(divisions)]
+                rows.append((region, province, division, f'{division} DISTRICT {m % 7 + 1}', municipality,
+                             f'{province} LONE DISTRICT' if m % 3 == 0 else f'{province} DISTRICT {m % 3}'))
+    return rows
+
+
+def generate_lis_csv(n_rows, seed=0):
+    # Synthetic enrollment CSV text shaped like the LIS export, including the
+    # four preamble rows that `skiprows=4` drops.
+    rng = np.random.default_rng(seed)
+    geography = _geography(rng)
+    places = rng.integers(0, len(geography), n_rows)
+    counts = rng.integers(0, 80, (n_rows, len(ENROLLMENT_COLUMNS)))
+    blanks = rng.random((n_rows, len(ENROLLMENT_COLUMNS))) < 0.3
+    sectors = rng.choice(len(SECTORS), n_rows, p=[0.78, 0.2, 0.015, 0.005])
+    subclasses = rng.integers(0, len(SUBCLASSES), n_rows)
+    school_types = rng.integers(0, len(SCHOOL_TYPES), n_rows)
+    cocs = rng.integers(0, len(MODIFIED_COCS), n_rows)
+    suffixes = rng.integers(0, len(NAME_SUFFIXES), n_rows)
+
+    buffer = io.StringIO()
+    buffer.write('School Level Data on Official Enrollment\n')
+    buffer.write('Synthetic data\n\n\n')
+    buffer.write(','.join(HEADER) + '\n')
+    for i in range(n_rows):
+        region, province, division, district, municipality, legislative = geography[places[i]]
+        row = [
+            str(100000 + i), f'Synthetic  {i} {NAME_SUFFIXES[suffixes[i]]}', '', f'BARANGAY {i % 40}', municipality, province,
+            region, division, district, legislative,
+            SECTORS[sectors[i]], SUBCLASSES[subclasses[i]], SCHOOL_TYPES[school_types[i]], MODIFIED_COCS[cocs[i]],
+        ]
+        row += ['' if blank else str(count) for count, blank in zip(counts[i], blanks[i])]
+        buffer.write(','.join(f'"{v}"' if ',' in v else v for v in row) + '\n')
+    return buffer.getvalue()
+
+
+def synthetic_frame(n_rows, seed=0):
+    return read_enrollment_csv(io.StringIO(generate_lis_csv(n_rows, seed)))
+
+
+if __name__ == '__main__':
+    # python -m benchmarks.synthetic 250k synthetic_250k.csv
+    size, path = sys.argv[1], sys.argv[2]
+    with open(path, 'w') as f:
+        f.write(generate_lis_csv(SIZES.get(size) or int(size)))
@@ -0,0 +1 @@
+# Data and compute layer behind Enrollment_Plotly-Dash_Script.py
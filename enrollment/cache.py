@@ -0,0 +1,95 @@
+import json
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+
+def filter_key(dataset_id, filters):
+    # Canonical form of a filter state: unselected filters dropped, selected
+    # values sorted, so the same view always maps to the same key.
+    selected = tuple(sorted(
+        (col, tuple(sorted(values))) for col, values in filters.items() if values
+    ))
+    return dataset_id, selected
+
+
+def freeze(value):
+    # Turn a filter key that made a JSON round trip (dcc.Store) back into tuples.
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def payload_size(value):
+    return len(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+class ResultCache:
+    # LRU cache of finished callback outputs keyed on filter_key(). Bounded
+    # both by entry count and by the (JSON) size of the cached outputs.
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key):
+        # Like get(), without touching the LRU order or the counters.
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = payload_size(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+                self.evictions += 1
+        return value
+
+    def invalidate(self, dataset_id):
+        # Drop every entry computed from `dataset_id` (cleared or replaced upload).
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dataset_id]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
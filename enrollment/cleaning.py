@@ -0,0 +1,185 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Cleaning steps from data_cleaning_tableau-dashboarding.ipynb, run on every
+# upload. Label mappings work on the categories of the filter columns (a few
+# hundred values) instead of every row, and school names go through one
+# compiled abbreviation regex with pandas string methods. Columns the
+# dashboard does not use (Street Address, Barangay) are left as uploaded.
+
+# School name abbreviations, matched case-insensitively as whole words.
+ABBREVIATIONS = {
+    'E/S': 'ELEMENTARY', 'ES': 'ELEMENTARY', 'E.S.': 'ELEMENTARY', 'ELEM.': 'ELEMENTARY',
+    'NHS': 'NATIONAL HIGH SCHOOL',
+    'SHS': 'SENIOR HIGH SCHOOL',
+    'CES': 'CENTRAL ELEMENTARY SCHOOL',
+    'MES': 'MUNICIPAL ELEMENTARY SCHOOL',
+    'CS': 'CENTRAL SCHOOL',
+    'PS': 'PRIMARY SCHOOL', 'P/S': 'PRIMARY SCHOOL',
+    'HS': 'HIGH SCHOOL', 'H.S.': 'HIGH SCHOOL',
+    'IS': 'INTEGRATED SCHOOL',
+    'IP': 'INDIGENOUS PEOPLES',
+    'MS': 'MEMORIAL', 'MEM.': 'MEMORIAL', 'MEMO.': 'MEMORIAL',
+    'MNHS': 'MEMORIAL NATIONAL HIGH SCHOOL',
+    'NCHS': 'NATIONAL COMPREHENSIVE HIGH SCHOOL',
+    'CNHS': 'COMPREHENSIVE NATIONAL HIGH SCHOOL',
+    'SOF': 'SCHOOL OF FISHERIES',
+    'SCH.': 'SCHOOL', 'SCHOOL.': 'SCHOOL',
+    'COM.': 'COMMUNITY', 'COMM.': 'COMMUNITY',
+    'BO.': 'BARRIO',
+    'INC': ', INC.', 'INC.': ', INC.', 'INCORPORATED': ', INC.', 'INCORPORATION': ', INC.',
+}
+
+# One alternation for the whole table, longest token first so 'MNHS' wins over
+# 'NHS'. A comma already in front of INC is absorbed so cleaned names stay put.
+ABBREVIATION_PATTERN = re.compile(
+    r'(?P<comma>,\s*)?\b(?P<token>'
+    + '|'.join(re.escape(token) for token in sorted(ABBREVIATIONS, key=len, reverse=True))
+    + r')(?!\w)',
+    re.IGNORECASE,
+)
+
+# Punctuation and spacing fixes, applied in order after uppercasing. Kept as
+# pattern strings so Arrow-backed string columns run them natively.
+NAME_FIXES = [
+    (r'\s+,', ','),
+    (r'["\']', ''),
+    (r',,+', ','),
+    (r'\.+', '.'),
+    (r'\(\s+', '('),
+    (r'\s+\)', ')'),
+    (r'\s+', ' '),
+]
+
+MANUAL_CORRECTIONS = {
+    '(4TH WATCH) MARANATHA CHRISTIAN SCHOOLOF LAPU - LAPU CITY, INC.': '4TH WATCH MARANATHA CHRISTIAN SCHOOLOF LAPU - LAPU CITY, INC.',
+    '(4TH WATCH)MARANATHA CHRISTIAN SCHOOLOF TALISAY CITY, CEBU, INC.': '4TH WATCH MARANATHA CHRISTIAN SCHOOLOF TALISAY CITY, CEBU, INC.',
+    '(COMPOSTELA NATIONAL HIGH SCHOOLDAY CLASS)': 'COMPOSTELA NATIONAL HIGH SCHOOLDAY CLASS',
+    '(FTJCA) FAMILY TABERNACLE OF JESUS CHRIST ALMIGHTY CHRISTIAN ACADEMY': 'FAMILY TABERNACLE OF JESUS CHRIST ALMIGHTY CHRISTIAN ACADEMY',
+    '(HIS) HOPE INTEGRATED SCHOOL, INC.': 'HOPE INTEGRATED SCHOOL, INC.',
+    '(FELIPE P. PANTON HIGH SCHOOLFORMERLY:INOYONAN NATIONAL HIGH SCHOOL)': 'FELIPE P. PANTON HIGH SCHOOLFORMERLY:INOYONAN NATIONAL HIGH SCHOOL',
+    '(ESMERALDO ROQUE MUNICIPAL ELEMENTARY SCHOOLMUNTAY)': 'ESMERALDO ROQUE MUNICIPAL ELEMENTARY SCHOOLMUNTAY',
+    '(LURAY II NATIONAL HIGH SCHOOL (DAY & NIGHT))': 'LURAY II NATIONAL HIGH SCHOOL (DAY & NIGHT)',
+    '(PICONG NATIONAL HIGH SCHOOLRA 9575)': 'PICONG NATIONAL HIGH SCHOOLRA 9575',
+    '(POONAPIAGAPO NATIONAL HIGH SCHOOLANNEX MATUNGAO NATIONAL HIGH SCHOOL)': 'POONAPIAGAPO NATIONAL HIGH SCHOOLANNEX MATUNGAO NATIONAL HIGH SCHOOL',
+    '(S.J.B.) SAINT JOHN BOSCO, I.A.S., INC.': 'SAINT JOHN BOSCO, I.A.S., INC.',
+    '(ST. ANTHONY DE PADUA LEARNING SCHOOLBATASAN), INC.': 'ST. ANTHONY DE PADUA LEARNING SCHOOLBATASAN, INC.',
+    '(SULTAN ANGIN MEM. NATIONAL HIGH SCHOOLFORMERLY SAGUIARAN NATIONAL HIGH SCHOOL)': 'SULTAN ANGIN MEM. NATIONAL HIGH SCHOOLFORMERLY SAGUIARAN NATIONAL HIGH SCHOOL',
+    '(WENDELIN EDUARTE ELEMENTARY SCHOOLGUMAGA ELEMENTARY)': 'WENDELIN EDUARTE ELEMENTARY SCHOOLGUMAGA ELEMENTARY',
+    'BONGAO CLES': 'BONGAO Central Elementary School',
+}
+
+# Label mappings for the filter columns. Labels not listed are uppercased.
+LABELS = {
+    'Region': {
+        'BARMM': 'BANGSAMORO AUTONOMOUS REGION IN MUSLIM MINDANAO',
+        'CAR': 'CORDILLERA ADMINISTRATIVE REGION',
+        'CARAGA': 'CARAGA REGION',
+        'MIMAROPA': 'MIMAROPA',
+        'NCR': 'NATIONAL CAPITAL REGION',
+        'PSO': 'PHILIPPINE SCHOOLS OVERSEAS',
+        'Region I': 'ILOCOS REGION',
+        'Region II': 'CAGAYAN VALLEY',
+        'Region III': 'CENTRAL LUZON',
+        'Region IV-A': 'CALABARZON',
+        'Region V': 'BICOL REGION',
+        'Region VI': 'WESTERN VISAYAS',
+        'Region VII': 'CENTRAL VISAYAS',
+        'Region VIII': 'EASTERN VISAYAS',
+        'Region IX': 'ZAMBOANGA PENINSULA',
+        'Region X': 'NORTHERN MINDANAO',
+        'Region XI': 'DAVAO REGION',
+        'Region XII': 'SOCCSKSARGEN',
+    },
+    'District': {
+        '(No District) - For SGA Division': 'NO DISTRICT',
+    },
+    'Sector': {
+        'PSO': 'PHILIPPINE SCHOOLS OVERSEAS',
+        'Private': 'PRIVATE',
+        'Public': 'PUBLIC',
+        'SUCsLUCs': 'STATE & LOCAL UNIVERSITIES AND COLLEGES',
+    },
+    'School Subclassification': {
+        'DOST Managed': 'DOST MANAGED',
+        'DepED Managed': 'DEPED MANAGED',
+        'LUC': 'LOCAL UNIVERSITIES AND COLLEGES',
+        'Local International School': 'LOCAL INTERNATIONAL SCHOOL',
+        'Non-Sectarian ': 'NON-SECTARIAN',
+        'Other GA Managed': 'OTHER GOVERNMENT-ASSISTED MANAGED',
+        'SUC Managed': 'STATE UNIVERSITIES AND COLLEGES',
+        'Sectarian ': 'SECTARIAN',
+    },
+    'School Type': {
+        'Annex or Extension school(s)': 'ANNEX OR EXTENSION SCHOOL',
+        'Mobile School(s)/Center(s)': 'MOBILE SCHOOL OR LEARNING CENTER',
+        'Mother school': 'MOTHER SCHOOL',
+        'School with no Annexes': 'SCHOOL WITH NO ANNEXES',
+    },
+    'Modified COC': {
+        'All Offering': 'COMPLETE BASIC EDUCATION SCHOOL',
+        'ES and JHS': 'ELEMENTARY & JUNIOR HIGH SCHOOL',
+        'JHS with SHS': 'JUNIOR & SENIOR HIGH SCHOOL',
+        'Purely ES': 'PURELY ELEMENTARY SCHOOL',
+        'Purely JHS': 'PURELY JUNIOR HIGH SCHOOL',
+        'Purely SHS': 'PURELY SENIOR HIGH SCHOOL',
+    },
+}
+
+# Filter columns that are only uppercased.
+UPPERCASE = ['Division', 'District', 'Municipality', 'Legislative District']
+
+
+def _expand(match):
+    replacement = ABBREVIATIONS[match['token'].upper()]
+    if replacement.startswith(','):
+        return replacement
+    return (match['comma'] or '') + replacement
+
+
+def clean_school_names(names, keep=()):
+    # Vectorized port of the notebook's fix_parentheses_and_uppercase plus its
+    # 'SCHOOL.' and manual corrections. Values in `keep` (placeholders) pass
+    # through unchanged.
+    skip = names.isna() | names.isin(keep)
+    cleaned = names[~skip].astype(str).str.replace(ABBREVIATION_PATTERN, _expand, regex=True)
+
+    # balance a missing parenthesis on either end
+    opened, closed = cleaned.str.count(r'\('), cleaned.str.count(r'\)')
+    cleaned = cleaned.where(opened <= closed, cleaned + ')')
+    cleaned = cleaned.where(closed <= opened, '(' + cleaned)
+
+    cleaned = cleaned.str.replace(r'\s*-\s*', ' - ', regex=True).str.replace(r',\s*', ', ', regex=True).str.upper()
+    for pattern, replacement in NAME_FIXES:
+        cleaned = cleaned.str.replace(pattern, replacement, regex=True)
+    cleaned = cleaned.str.strip().str.replace('SCHOOL.', 'SCHOOL', regex=False).replace(MANUAL_CORRECTIONS)
+
+    result = names.copy()
+    result[~skip] = cleaned
+    return result
+
+
+def relabel(values, mapping, keep=()):
+    # Map a categorical through its categories only. Labels that end up equal
+    # are merged into one category, and the row codes are remapped with one
+    # take instead of touching each row's string (missing stays -1).
+    categories = values.cat.categories
+    labels = [label if label in keep else mapping.get(label, label.strip().upper()) for label in categories]
+    new_codes, new_categories = pd.factorize(pd.Index(labels))
+    codes = np.append(new_codes, -1)[values.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, new_categories), index=values.index, name=values.name)
+
+
+def clean_enrollment(df, placeholder=None):
+    # Clean a typed upload (see data.apply_schema) in place and return it.
+    keep = {placeholder} if placeholder is not None else set()
+    if 'School Name' in df.columns:
+        df['School Name'] = clean_school_names(df['School Name'], keep)
+    for col in df.columns:
+        if col in LABELS or col in UPPERCASE:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = relabel(df[col], LABELS.get(col, {}), keep)
+    return df
@@ -0,0 +1,45 @@
+import numpy as np
+
+from enrollment.plan import ELEMENTARY_GRADES, GENDERS, JUNIOR_GRADES, SHS_TRACKS
+from enrollment.wire import pack
+
+
+# Series shipped per cube cell in client-side filtering mode. Stage and
+# overall totals are sums of these, so the browser adds them up itself.
+CLIENT_SERIES = ELEMENTARY_GRADES + JUNIOR_GRADES + SHS_TRACKS
+
+
+def client_payload(dataset, dimensions):
+    # One dataset's cube for assets/crossfilter.js: per filter dimension its
+    # labels and the label code of every cell, and per gender and series the
+    # cell sums, all as packed arrays (enrollment.wire; one per series, so
+    # most of them fit in a byte per cell). This is all the
+    # browser needs to answer the cascading options, cards and charts for any
+    # filter state.
+    cube = dataset.cube
+    plan = dataset.plan
+    rows = [plan.series.index(name) for name in CLIENT_SERIES]
+    values = np.einsum('sgc,nc->gsn', plan.weights[rows], cube.sums)
+
+    spanning = school_spans(cube) if not cube.additive_schools else None
+
+    return {
+        'dimensions': {col: [str(v) for v in cube.index.categories(col)] for col in dimensions},
+        'codes': {col: pack(cube.index.codes(col)) for col in dimensions},
+        'series': CLIENT_SERIES,
+        'sums': {gender: [pack(series) for series in values[g]] for g, gender in enumerate(GENDERS)},
+        'rows': pack(cube.rows),
+        'schools': pack(cube.schools),
+        'spanning': spanning,
+        'national_total': int(dataset.national.sums.sum()),
+        'distinct_rows': int(dataset.distinct_rows),
+    }
+
+
+def school_spans(cube):
+    # When a BEIS School ID has rows in several cells, summing the per-cell
+    # school counts over the selected cells counts it once per cell. The
+    # cells of every such school (as packed 'cells' with 'offsets' per
+    # school, from the cube) let the browser take the repeats back out and
+    # match the server's count.
+    return {'cells': pack(cube.span_cells), 'offsets': pack(cube.span_offsets)}
@@ -0,0 +1,139 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from enrollment.index import FilterIndex
+
+
+CubeTotals = namedtuple('CubeTotals', ['sums', 'rows', 'schools'])
+
+# Per-cell counters carried next to the enrollment sums.
+ROWS = '_rows'
+SCHOOLS = '_schools'
+
+
+def aggregate_cells(frame, dimensions, columns, school_id_column='BEIS School ID'):
+    # Enrollment sums, row counts and distinct school counts per combination of
+    # `dimensions`, as a flat frame (one row per cell).
+    grouped = frame.groupby(dimensions, observed=True, dropna=False, sort=False)
+    cells = grouped[columns].sum()
+    cells[ROWS] = grouped.size()
+    cells[SCHOOLS] = grouped[school_id_column].nunique()
+    return cells.reset_index()
+
+
+def school_pairs(frame, dimensions, school_id_column='BEIS School ID'):
+    # The distinct (cell, school) pairs of a chunk, as hashes: `cell` hashes
+    # the combination of `dimensions`, `pair` that plus the school id. Rows
+    # without a school id are left out, as nunique leaves them out.
+    frame = frame[frame[school_id_column].notna()]
+    pairs = pd.DataFrame({
+        'cell': pd.util.hash_pandas_object(frame[dimensions], index=False).to_numpy(),
+        'pair': pd.util.hash_pandas_object(frame[dimensions + [school_id_column]], index=False).to_numpy(),
+    })
+    return pairs.drop_duplicates('pair')
+
+
+def combine_cells(partials, dimensions, pairs=None):
+    # Merge cells aggregated from separate chunks of the same dataset. The
+    # dimensions are unioned as categoricals and each cell's combination
+    # hashed, so only the cells that occur in more than one chunk are
+    # regrouped; the rest (all of them when merging files from different
+    # regions) are kept as they are. A school whose rows of one cell fall in
+    # two chunks would be counted twice by summing; `pairs` (school_pairs of
+    # each chunk) takes those repeats back out. Without it the chunks are
+    # taken to hold disjoint schools.
+    if len(partials) == 1:
+        return partials[0]
+    cells = pd.concat([partial.drop(columns=dimensions) for partial in partials], ignore_index=True)
+    for dim in reversed(dimensions):
+        cells.insert(0, dim, union_categoricals([partial[dim].astype('category') for partial in partials],
+                                                sort_categories=True))
+    shared = pd.util.hash_pandas_object(cells[dimensions], index=False).duplicated(keep=False).to_numpy()
+    if not shared.any():
+        return cells
+    grouped = cells[shared].groupby(dimensions, observed=True, dropna=False, sort=False).sum().reset_index()
+    if pairs is not None:
+        pairs = pd.concat(pairs, ignore_index=True)
+        repeats = pairs['cell'][pairs['pair'].duplicated()].value_counts()
+        if len(repeats):
+            cell_hashes = pd.util.hash_pandas_object(grouped[dimensions], index=False).to_numpy()
+            grouped[SCHOOLS] -= pd.Series(cell_hashes).map(repeats).fillna(0).to_numpy(dtype=np.int64)
+    return pd.concat([cells[~shared], grouped], ignore_index=True)
+
+
+class EnrollmentCube:
+    # Enrollment columns summed per combination of the filter dimensions, built
+    # once per upload. Cards and charts sum the matching cells instead of the
+    # school rows, so their cost follows the number of cells, not schools.
+    def __init__(self, cells, dimensions, columns, frame, school_id_column='BEIS School ID'):
+        self.columns = pd.Index(columns)
+        self.dimensions = cells[dimensions].reset_index(drop=True)
+        self.sums = cells[columns].to_numpy(dtype=np.int64)
+        self.rows = cells[ROWS].to_numpy(dtype=np.int64)
+        self.schools = cells[SCHOOLS].to_numpy(dtype=np.int64)
+        self.index = FilterIndex(self.dimensions, dimensions)
+
+        # Per-cell distinct school counts only add up when no school id spans
+        # two cells. Otherwise the cells of each spanning school are kept
+        # (`span_cells`, grouped per school by `span_offsets`), and a query
+        # takes back out the repeats among the cells it matches.
+        self._additive_schools = self.schools.sum() == frame[school_id_column].nunique()
+        self.span_cells = np.zeros(0, dtype=np.intp)
+        self.span_offsets = np.zeros(1, dtype=np.intp)
+        self._span_schools = np.zeros(0, dtype=np.intp)
+        if not self._additive_schools:
+            self._find_spans(frame, dimensions, school_id_column)
+
+    def _find_spans(self, frame, dimensions, school_id_column):
+        # Each row's cell, matched by the hash of its dimension values; the
+        # per-cell counts are recounted from the distinct (cell, school) pairs.
+        cell_of = pd.Series(np.arange(len(self)), index=pd.util.hash_pandas_object(self.dimensions, index=False).to_numpy())
+        row_cells = cell_of.reindex(pd.util.hash_pandas_object(frame[dimensions], index=False).to_numpy()).to_numpy()
+        schools = pd.factorize(frame[school_id_column])[0]
+        pairs = pd.DataFrame({'school': schools, 'cell': row_cells})
+        pairs = pairs[(schools >= 0) & ~np.isnan(row_cells)].astype(np.intp).drop_duplicates()
+        self.schools = np.bincount(pairs['cell'].to_numpy(), minlength=len(self)).astype(np.int64)
+        spans = pairs[pairs['school'].duplicated(keep=False)].sort_values(['school', 'cell'])
+        self._span_schools = pd.factorize(spans['school'])[0].astype(np.intp)
+        self.span_cells = spans['cell'].to_numpy()
+        self.span_offsets = np.searchsorted(self._span_schools, np.arange(self._span_schools.max(initial=-1) + 2))
+
+    def __len__(self):
+        return len(self.sums)
+
+    @property
+    def additive_schools(self):
+        return self._additive_schools
+
+    def to_cells(self):
+        # The cells back as a flat frame, e.g. for persisting next to the dataset.
+        cells = pd.concat([self.dimensions, pd.DataFrame(self.sums, columns=self.columns)], axis=1)
+        cells[ROWS] = self.rows
+        cells[SCHOOLS] = self.schools
+        return cells
+
+    def query(self, selections):
+        return self.totals(self.index.mask(selections))
+
+    def repeated_schools(self, mask=None):
+        # How many times the cells in `mask` count a school that spans several
+        # of them beyond once.
+        if mask is None:
+            matched = self._span_schools
+        else:
+            matched = self._span_schools[mask[self.span_cells]]
+        return len(matched) - np.count_nonzero(np.bincount(matched))
+
+    def totals(self, mask):
+        # Totals over the cells in `mask` (from self.index.mask(selections);
+        # None means all cells).
+        if mask is None:
+            sums, rows, schools = self.sums.sum(axis=0), self.rows.sum(), self.schools.sum()
+        else:
+            sums, rows, schools = self.sums[mask].sum(axis=0), self.rows[mask].sum(), self.schools[mask].sum()
+        if not self._additive_schools:
+            schools -= self.repeated_schools(mask)
+        return CubeTotals(pd.Series(sums, index=self.columns), int(rows), int(schools))
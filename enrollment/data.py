@@ -0,0 +1,481 @@
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from enrollment.cleaning import clean_enrollment
+from enrollment.crossfilter import client_payload
+from enrollment.cube import EnrollmentCube, aggregate_cells, combine_cells, school_pairs
+from enrollment.geo import AreaSums
+from enrollment.index import FilterIndex, OptionsIndex
+from enrollment.merge import SCHOOL_ID, AppendedRows, MergeReport, SchoolIndex
+from enrollment.plan import AggregationPlan
+from enrollment.schools import SchoolTable
+
+
+# The ten dashboard filters, loaded as categoricals.
+FILTER_COLUMNS = [
+    'Region', 'Province', 'Division', 'District', 'Municipality', 'Legislative District',
+    'Sector', 'School Type', 'Modified COC', 'School Subclassification'
+]
+
+# Order of the cascading dropdowns; each level's options depend on the levels above it.
+OPTION_CHAIN = [
+    'Region', 'Province', 'District', 'Division', 'Municipality', 'Legislative District',
+    'Sector', 'School Type', 'Modified COC', 'School Subclassification'
+]
+
+# Placeholder for missing free-text values (the count columns get 0 instead).
+NOT_APPLICABLE = 'Not Applicable'
+
+
+# Rows parsed at a time when streaming an upload.
+CHUNK_ROWS = 20_000
+
+# Part of every dataset id; bump it when ingestion (schema or cleaning) changes
+# its output so datasets cached by an older version are parsed again.
+INGEST_VERSION = 2
+
+# Keep a few recently uploaded datasets in memory so that switching between
+# files (or re-uploading the same LIS export) does not parse the CSV again.
+# Datasets a session holds (see hold_dataset) don't count towards the limit
+# and are never evicted for another upload.
+MAX_DATASETS = 8
+
+# A session's hold lapses when it has not shown the dataset for this long
+# (e.g. a closed tab).
+HOLD_SECONDS = int(os.environ.get('DATASET_HOLD_SECONDS', 2 * 60 * 60))
+
+_datasets = OrderedDict()
+_holders = {}
+_lock = threading.Lock()
+
+
+class Dataset:
+    # A cleaned, typed upload held on the server. The browser only ever
+    # sees `id`; callbacks look the frame up with get_dataset(). `cells` are
+    # the cube cells when ingestion already aggregated them chunk by chunk.
+    # `parts` are the ids of the uploads merged into it, in order (just its
+    # own id for a single file), and `merge_report` what the merge left out.
+    def __init__(self, dataset_id, frame, cells=None, distinct_rows=None, school_year=None):
+        self.id = dataset_id
+        self.frame = frame
+        self.school_year = school_year
+        self.parts = [dataset_id]
+        self.merge_report = MergeReport()
+        self._cells = cells
+        self._distinct_rows = distinct_rows
+
+    @cached_property
+    def enrollment_columns(self):
+        return [col for col in self.frame.columns if is_enrollment_column(col)]
+
+    @cached_property
+    def index(self):
+        return FilterIndex(self.frame, FILTER_COLUMNS)
+
+    @cached_property
+    def school_index(self):
+        return SchoolIndex(self.frame[SCHOOL_ID])
+
+    @cached_property
+    def cube(self):
+        cells = self._cells
+        if cells is None:
+            cells = aggregate_cells(self.frame, FILTER_COLUMNS, self.enrollment_columns)
+        self._cells = None
+        return EnrollmentCube(cells, FILTER_COLUMNS, self.enrollment_columns, self.frame, SCHOOL_ID)
+
+    @cached_property
+    def national(self):
+        return self.cube.query({})
+
+    @cached_property
+    def options(self):
+        # The cube cells are exactly the distinct combinations of the filter columns.
+        return OptionsIndex(self.cube.index, OPTION_CHAIN)
+
+    @cached_property
+    def plan(self):
+        return AggregationPlan(self.cube.columns)
+
+    @cached_property
+    def areas(self):
+        # Enrollment per Region/Province/Division for the map.
+        return AreaSums(self.cube)
+
+    @cached_property
+    def schools(self):
+        # Per-school level totals for the drill-down table.
+        return SchoolTable(self.frame, self.plan)
+
+    @cached_property
+    def client_cube(self):
+        # The cube as shipped to the browser in client-side filtering mode.
+        return client_payload(self, FILTER_COLUMNS)
+
+    @cached_property
+    def distinct_rows(self):
+        if self._distinct_rows is not None:
+            return self._distinct_rows
+        return len(self.frame.drop_duplicates())
+
+    @cached_property
+    def memory_bytes(self):
+        # Frame plus cube arrays, for the /metrics footprint gauge.
+        cube = self.cube
+        return int(self.frame.memory_usage(index=True, deep=True).sum()
+                   + cube.sums.nbytes + cube.rows.nbytes + cube.schools.nbytes
+                   + cube.dimensions.memory_usage(index=True, deep=True).sum())
+
+    def select(self, filters, partitions=(), resolve=None):
+        return Selection(self, filters, partitions, resolve)
+
+    def build(self):
+        # Build the indexes and aggregates up front, at upload time.
+        for name in ('index', 'cube', 'national', 'plan', 'areas', 'schools', 'distinct_rows'):
+            getattr(self, name)
+        self.options.cascade([])
+        return self
+
+
+class Selection:
+    # One filter state over a dataset, shared by the output builders. The cube
+    # totals and the filtered school rows are only computed if a builder asks.
+    # `partitions` holds (school year, dataset id) for every uploaded year and
+    # `resolve` loads a dataset by id; other years are only loaded when a
+    # builder asks for `previous` or `history`.
+    def __init__(self, dataset, filters, partitions=(), resolve=None):
+        self.dataset = dataset
+        self.filters = filters
+        self.partitions = sorted(partitions)
+        self.year = next((year for year, i in self.partitions if i == dataset.id), dataset.school_year)
+        self._resolve = resolve
+
+    @cached_property
+    def cells(self):
+        # Mask of the cube cells matching the filters (None: all of them).
+        return self.dataset.cube.index.mask(self.filters)
+
+    @cached_property
+    def totals(self):
+        return self.dataset.cube.totals(self.cells)
+
+    @cached_property
+    def aggregates(self):
+        # Every card and chart series (grade/track/stage x gender) in one pass.
+        return self.dataset.plan.evaluate(self.totals.sums)
+
+    @cached_property
+    def averages(self):
+        # Mean enrollment per school row over the selection. The counts have
+        # no missing values, so a column mean is its total over the row count.
+        if self.totals.rows == 0:
+            return self.aggregates * 0
+        return self.aggregates / self.totals.rows
+
+    @cached_property
+    def rows(self):
+        return self.dataset.index.select(self.dataset.frame, self.filters)
+
+    def _other(self, dataset_id):
+        if dataset_id == self.dataset.id:
+            return self
+        dataset = self._resolve(dataset_id)
+        return None if dataset is None else Selection(dataset, self.filters, self.partitions, self._resolve)
+
+    @cached_property
+    def previous(self):
+        # The same filters over the closest earlier school year, if uploaded.
+        ids = [dataset_id for _, dataset_id in self.partitions]
+        if self.dataset.id not in ids or ids.index(self.dataset.id) == 0:
+            return None
+        return self._other(ids[ids.index(self.dataset.id) - 1])
+
+    @cached_property
+    def history(self):
+        # (school year, Selection) for every partition, oldest first. Each
+        # year is answered from its own cube; raw rows are never concatenated.
+        history = []
+        for year, dataset_id in self.partitions:
+            selection = self._other(dataset_id)
+            if selection is not None:
+                history.append((year, selection))
+        return history
+
+
+def clean_column_names(columns):
+    # 'G11 ACAD - ABM Male' -> 'G11 ACAD ABM Male'
+    return (
+        columns
+        .str.replace('-', '', regex=False)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def school_year_label(filename, contents):
+    # 'SY 2023-2024 School Level Data on Official Enrollment.csv' -> 'SY 2023-2024'.
+    # Falls back to the export's preamble rows, then to the file name.
+    def find(text):
+        for start, end in re.findall(r'(20\d{2})\s*[-\u2013/]\s*(\d{4}|\d{2})', text or ''):
+            end = int(end) if len(end) == 4 else int(start[:2] + end)
+            if end == int(start) + 1:
+                return f'SY {start}-{end}'
+        return None
+
+    preamble = base64.b64decode(contents.split(',', 1)[-1][:1024]).decode('utf-8', errors='ignore')
+    return find(filename) or find(preamble) or filename or 'Uploaded data'
+
+
+def is_enrollment_column(column):
+    return column.endswith(' Male') or column.endswith(' Female')
+
+
+def apply_schema(df):
+    # Parse the enrollment counts once as compact unsigned integers (null -> 0),
+    # load the filter dimensions as categoricals and only fill NA in free text.
+    for col in df.columns:
+        if is_enrollment_column(col):
+            counts = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            df[col] = pd.to_numeric(counts, downcast='unsigned')
+        elif col in FILTER_COLUMNS:
+            df[col] = df[col].fillna(NOT_APPLICABLE).astype('category')
+        elif pd.api.types.is_string_dtype(df[col]) or df[col].isna().all():
+            df[col] = df[col].fillna(NOT_APPLICABLE)
+    return df
+
+
+def prepare_chunk(df):
+    # Column names, types and the notebook's value cleaning for one chunk of
+    # an LIS export.
+    df.columns = clean_column_names(df.columns)
+    return clean_enrollment(apply_schema(df), NOT_APPLICABLE)
+
+
+def read_enrollment_csv(buffer):
+    # LIS exports carry four preamble rows above the header.
+    return prepare_chunk(pd.read_csv(buffer, skiprows=4))
+
+
+class Base64Stream(io.RawIOBase):
+    # Binary stream over a base64 payload, decoded a block at a time so the
+    # decoded file is never held in full next to the encoded upload.
+    def __init__(self, encoded, block_size=1 << 20):
+        self._encoded = encoded
+        self._block = block_size // 3 * 4
+        self._position = 0
+        self._pending = b''
+        self._offset = 0
+
+    @property
+    def progress(self):
+        return self._position / len(self._encoded) if self._encoded else 1.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._offset == len(self._pending) and self._position < len(self._encoded):
+            block = self._encoded[self._position:self._position + self._block]
+            self._position += len(block)
+            self._pending = base64.b64decode(block)
+            self._offset = 0
+        n = min(len(buffer), len(self._pending) - self._offset)
+        buffer[:n] = self._pending[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+
+def concat_chunks(chunks):
+    # Concatenate typed chunks, unioning the per-chunk categories rather than
+    # letting pd.concat fall back to object columns for the filters.
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = list(chunks[0].columns)
+    filters = [col for col in columns if col in FILTER_COLUMNS]
+    frame = pd.concat([chunk.drop(columns=filters) for chunk in chunks], ignore_index=True)
+    for col in filters:
+        values = union_categoricals([chunk[col] for chunk in chunks], sort_categories=True)
+        frame.insert(columns.index(col), col, values)
+    return frame
+
+
+def read_upload(contents, progress=None, chunksize=CHUNK_ROWS):
+    # Streaming ingestion of a dcc.Upload payload: base64-decode and parse a
+    # chunk of rows at a time, typing each chunk and aggregating its cube
+    # cells as it arrives, so peak memory stays near the typed frame.
+    # `progress` is called with the fraction of the upload read so far.
+    content_type, content_string = contents.split(',', 1)
+    stream = Base64Stream(content_string)
+    chunks, partials, pairs = [], [], []
+
+    reader = pd.read_csv(io.BufferedReader(stream), skiprows=4, chunksize=chunksize, encoding='utf-8')
+    for chunk in reader:
+        chunk = prepare_chunk(chunk)
+        columns = [col for col in chunk.columns if is_enrollment_column(col)]
+        partials.append(aggregate_cells(chunk, FILTER_COLUMNS, columns))
+        pairs.append(school_pairs(chunk, FILTER_COLUMNS))
+        chunks.append(chunk)
+        if progress is not None:
+            progress(stream.progress)
+
+    return concat_chunks(chunks), combine_cells(partials, FILTER_COLUMNS, pairs)
+
+
+def merge_datasets(base, parts, dataset_id, progress=None, base_label=None):
+    # `base` with each (label, dataset) of `parts` merged in, in order. Rows
+    # whose BEIS School ID is already loaded, or repeated within a file, are
+    # left out: exact copies are counted, rows that differ are reported as
+    # conflicts (the first kept). The frame is concatenated once; the filter
+    # index, school index, school table and cube cells are extended from the
+    # appended rows instead of being rebuilt.
+    report = MergeReport.from_dict(base.merge_report.to_dict())
+    ids = base.frame[SCHOOL_ID]
+    if (ids.duplicated() & ids.notna()).any():
+        # A single file merged into for the first time may repeat ids itself.
+        own = AppendedRows(base.frame.iloc[:0], SchoolIndex())
+        deduped = Dataset(base.id, own.add(base_label or base.school_year or base.id, base.frame),
+                          school_year=base.school_year)
+        deduped.parts = base.parts
+        report.record(own.report.duplicates, own.report.conflicts, own.report.conflict_count)
+        base = deduped
+
+    rows = AppendedRows(base.frame, base.school_index)
+    frames, partials, distinct_rows = [base.frame], [base.cube.to_cells()], base.distinct_rows
+    for i, (label, part) in enumerate(parts):
+        kept = rows.add(label, part.frame)
+        if len(kept) == len(part.frame):
+            # Nothing left out: the file's own cube cells still hold.
+            frames.append(part.frame)
+            partials.append(part.cube.to_cells())
+            distinct_rows += part.distinct_rows
+        elif len(kept):
+            frames.append(kept)
+            partials.append(aggregate_cells(kept, FILTER_COLUMNS, base.enrollment_columns))
+            distinct_rows += len(kept.drop_duplicates())
+        if progress is not None:
+            progress((i + 1) / len(parts))
+
+    frame = concat_chunks(frames)
+    cells = combine_cells(partials, FILTER_COLUMNS)
+    index = base.index.extended(frame) if len(frames) > 1 else base.index
+    dataset = Dataset(dataset_id, frame, cells, distinct_rows, base.school_year)
+    dataset.index, dataset.school_index = index, rows.school_index
+    dataset.schools = base.schools.extended(frame, base.plan) if len(frames) > 1 else base.schools
+    dataset.parts = base.parts + [i for _, part in parts for i in part.parts]
+    report.record(rows.report.duplicates, rows.report.conflicts, rows.report.conflict_count)
+    dataset.merge_report = report
+    return dataset.build()
+
+
+def dataset_id(contents):
+    # Hash only the base64 payload so the same file gets the same id no matter
+    # which content type the browser reports for it.
+    content_string = contents.split(',', 1)[-1]
+    digest = hashlib.sha256(f'{INGEST_VERSION}:'.encode('ascii'))
+    digest.update(content_string.encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+def save_to_disk(dataset, disk_cache):
+    meta = {'rows': len(dataset.frame), 'distinct_rows': dataset.distinct_rows, 'school_year': dataset.school_year,
+            'parts': dataset.parts, 'merge': dataset.merge_report.to_dict()}
+    disk_cache.save(dataset.id, dataset.frame, dataset.cube.to_cells(), meta)
+
+
+def load_from_disk(dataset_id, disk_cache):
+    cached = disk_cache.load(dataset_id)
+    if cached is None:
+        return None
+    frame, cells, meta = cached
+    dataset = Dataset(dataset_id, frame, cells, meta['distinct_rows'], meta.get('school_year'))
+    dataset.parts = meta.get('parts', [dataset_id])
+    dataset.merge_report = MergeReport.from_dict(meta.get('merge'))
+    return dataset.build()
+
+
+def _held(dataset_id, now):
+    # Whether a session still holds the dataset; lapsed holds are dropped.
+    holders = _holders.get(dataset_id)
+    if holders:
+        for holder in [h for h, seen in holders.items() if now - seen > HOLD_SECONDS]:
+            del holders[holder]
+    if not holders:
+        _holders.pop(dataset_id, None)
+        return False
+    return True
+
+
+def _prune_holders(now):
+    # Holds only concern loaded datasets: drop those of datasets that are
+    # gone, and lapsed ones.
+    for dataset_id in [i for i in _holders if i not in _datasets]:
+        del _holders[dataset_id]
+    for dataset_id in list(_holders):
+        _held(dataset_id, now)
+
+
+def register_dataset(dataset):
+    with _lock:
+        _datasets[dataset.id] = dataset
+        _datasets.move_to_end(dataset.id)
+        now = time.monotonic()
+        unheld = [i for i in _datasets if i != dataset.id and not _held(i, now)]
+        for evicted in unheld[:max(0, len(unheld) + 1 - MAX_DATASETS)]:
+            del _datasets[evicted]
+        _prune_holders(now)
+    return dataset
+
+
+def hold_dataset(dataset_id, holder):
+    # `holder` (a session) is using the dataset: keep it loaded until the
+    # session releases it or its hold lapses. Only a loaded dataset can be
+    # held; returns whether it was.
+    with _lock:
+        now = time.monotonic()
+        _prune_holders(now)
+        if dataset_id not in _datasets:
+            return False
+        _holders.setdefault(dataset_id, {})[holder] = now
+        return True
+
+
+def release_dataset(dataset_id, holder):
+    # `holder` is done with the dataset; it is unloaded once no other session
+    # holds it. Returns whether it was.
+    with _lock:
+        _holders.get(dataset_id, {}).pop(holder, None)
+        if _held(dataset_id, time.monotonic()):
+            return False
+        _datasets.pop(dataset_id, None)
+        return True
+
+
+def get_dataset(dataset_id):
+    if dataset_id is None:
+        return None
+    with _lock:
+        dataset = _datasets.get(dataset_id)
+        if dataset is not None:
+            _datasets.move_to_end(dataset_id)
+        return dataset
+
+
+def loaded_datasets():
+    with _lock:
+        return list(_datasets.values())
+
+
+def drop_dataset(dataset_id):
+    with _lock:
+        _holders.pop(dataset_id, None)
+        return _datasets.pop(dataset_id, None)
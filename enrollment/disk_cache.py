@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the on-disk cache is optional; without pyarrow every upload is parsed
+    feather = None
+
+
+class DatasetDiskCache:
+    # Cleaned, typed datasets and their cube cells written as uncompressed
+    # Arrow IPC (Feather v2) files, one directory per dataset id (the upload's
+    # content hash). Reloading is a memory-mapped read instead of a CSV parse.
+    # The directory is kept under `max_bytes` by evicting the least recently
+    # used datasets.
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return feather is not None and self.max_bytes > 0
+
+    def _path(self, dataset_id, name=''):
+        return os.path.join(self.directory, dataset_id, name)
+
+    def save(self, dataset_id, frame, cells, meta):
+        if not self.enabled or os.path.isdir(self._path(dataset_id)):
+            return
+        # Write to a scratch directory and rename, so readers (possibly other
+        # processes) never see a half-written dataset.
+        scratch = self._path(f'.{dataset_id}.{os.getpid()}.{threading.get_ident()}')
+        os.makedirs(scratch, exist_ok=True)
+        try:
+            feather.write_feather(frame, os.path.join(scratch, 'frame.arrow'), compression='uncompressed')
+            feather.write_feather(cells, os.path.join(scratch, 'cells.arrow'), compression='uncompressed')
+            with open(os.path.join(scratch, 'meta.json'), 'w') as f:
+                json.dump(dict(meta, saved=time.time()), f)
+            os.replace(scratch, self._path(dataset_id))
+        except OSError:
+            shutil.rmtree(scratch, ignore_errors=True)
+            if not os.path.isdir(self._path(dataset_id)):
+                raise
+        self._enforce_limit()
+
+    def load(self, dataset_id):
+        # Returns (frame, cells, meta), or None if the dataset isn't cached.
+        if not self.enabled or not dataset_id or not os.path.isfile(self._path(dataset_id, 'meta.json')):
+            return None
+        try:
+            frame = self._read(self._path(dataset_id, 'frame.arrow'))
+            cells = self._read(self._path(dataset_id, 'cells.arrow'))
+            with open(self._path(dataset_id, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self._path(dataset_id))
+        except OSError:  # evicted by another worker since the read; what was read still holds
+            pass
+        return frame, cells, meta
+
+    def meta(self, dataset_id):
+        # A cached dataset's meta.json (rows, school year, ...) without
+        # loading the dataset, or None.
+        try:
+            with open(self._path(dataset_id, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _read(path):
+        # split_blocks keeps each column its own block, so the count columns
+        # and category codes stay zero-copy, read-only views of the mapped
+        # file: every process loading a dataset shares its pages.
+        return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+    def entries(self):
+        # Cached dataset ids, most recently used first.
+        if not os.path.isdir(self.directory):
+            return []
+        ids = [name for name in os.listdir(self.directory)
+               if not name.startswith('.') and os.path.isfile(self._path(name, 'meta.json'))]
+        return sorted(ids, key=lambda name: os.path.getmtime(self._path(name)), reverse=True)
+
+    def most_recent(self):
+        entries = self.entries()
+        return entries[0] if entries else None
+
+    def size(self, dataset_id=None):
+        root = self.directory if dataset_id is None else self._path(dataset_id)
+        total = 0
+        for path, _, files in os.walk(root):
+            total += sum(os.path.getsize(os.path.join(path, name)) for name in files)
+        return total
+
+    def _enforce_limit(self):
+        with self._lock:
+            entries = self.entries()
+            sizes = {dataset_id: self.size(dataset_id) for dataset_id in entries}
+            total = sum(sizes.values())
+            # Never evict the dataset that was just written.
+            for dataset_id in reversed(entries[1:]):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(self._path(dataset_id), ignore_errors=True)
+                total -= sizes[dataset_id]
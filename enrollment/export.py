@@ -0,0 +1,213 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are optional; CSV and Excel need nothing extra
+    pa = pq = None
+
+
+# Format -> (file extension, media type).
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pq is not None]
+
+
+def row_chunks(frame, rows=None, chunk_rows=20_000):
+    # The rows of `frame` at positions `rows` (None: all of them), at most
+    # `chunk_rows` at a time. There is always at least one chunk, possibly
+    # empty, so that an empty export still carries its header or schema.
+    count = len(frame) if rows is None else len(rows)
+    for start in range(0, max(count, 1), chunk_rows):
+        if rows is None:
+            yield frame.iloc[start:start + chunk_rows]
+        else:
+            yield frame.iloc[rows[start:start + chunk_rows]]
+
+
+class StreamBuffer:
+    # Write-only file object for the Parquet and zip writers: what they write
+    # is held until taken, so a response can send each part as soon as it is
+    # produced. It reports its position but cannot seek, which makes zipfile
+    # write its entries in streaming mode (sizes after the data).
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def csv_stream(chunks):
+    # With a byte order mark, so that Excel reads the names as UTF-8.
+    yield '\ufeff'.encode('utf-8')
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=i == 0).encode('utf-8')
+
+
+def parquet_stream(chunks):
+    # One row group per chunk; each is sent as soon as it is written.
+    sink = StreamBuffer()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+# Characters XML 1.0 does not allow, even escaped.
+_XML_ILLEGAL = '[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]'
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="1"><xf/></cellXfs>'
+        '</styleSheet>'),
+}
+
+
+def xml_text(values):
+    values = values.str.replace(_XML_ILLEGAL, '', regex=True)
+    for char, entity in (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')):
+        values = values.str.replace(char, entity, regex=False)
+    return values
+
+
+def xlsx_text_cells(values):
+    present = values.notna().to_numpy()
+    text = xml_text(values.astype(object).where(present, '').astype(str))
+    cells = '<c t="inlineStr"><is><t xml:space="preserve">' + text + '</t></is></c>'
+    return np.where(present, cells.to_numpy(dtype=object), '<c/>')
+
+
+def xlsx_cells(column):
+    # One <c> element per value of `column`: numbers as numbers, the rest as
+    # inline strings (no shared string table, so nothing is held across rows).
+    # Categories and small integers, most of the columns, are formatted once
+    # per distinct value and looked up.
+    values = column.reset_index(drop=True)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        cells = np.append(xlsx_text_cells(pd.Series(values.cat.categories)), '<c/>').astype(object)
+        return cells[values.cat.codes.to_numpy()]
+    if pd.api.types.is_bool_dtype(values):
+        return np.array(['<c t="b"><v>0</v></c>', '<c t="b"><v>1</v></c>'], dtype=object)[values.to_numpy(dtype=int)]
+    if pd.api.types.is_integer_dtype(values):
+        numbers = values.to_numpy()
+        low, high = (int(numbers.min()), int(numbers.max())) if len(numbers) else (0, 0)
+        if high - low < 65536:
+            cells = np.array([f'<c><v>{v}</v></c>' for v in range(low, high + 1)], dtype=object)
+            return cells[numbers.astype(np.int64) - low]
+    if pd.api.types.is_numeric_dtype(values):
+        cells = ('<c><v>' + values.astype(str) + '</v></c>').to_numpy(dtype=object)
+        if pd.api.types.is_float_dtype(values):
+            cells = np.where(np.isfinite(values.to_numpy(dtype=float)), cells, '<c/>')
+        return cells
+    return xlsx_text_cells(values)
+
+
+def xlsx_rows(frame):
+    columns = [xlsx_cells(frame[col]) for col in frame.columns]
+    return ''.join(['<row>' + ''.join(cells) + '</row>' for cells in zip(*columns)])
+
+
+def xlsx_stream(chunks, sheet_name='Sheet1'):
+    # A single-sheet workbook written part by part into a zip stream: the
+    # fixed parts first, then the sheet one chunk of rows at a time.
+    sink = StreamBuffer()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        name = xml_text(pd.Series([sheet_name])).iloc[0][:31]
+        workbook.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        yield sink.take()
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetViews><sheetView workbookViewId="0">'
+                '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                '</sheetView></sheetViews><sheetData>').encode('utf-8'))
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    header = pd.DataFrame([[str(col) for col in chunk.columns]], columns=chunk.columns, dtype=object)
+                    sheet.write(xlsx_rows(header).encode('utf-8'))
+                sheet.write(xlsx_rows(chunk).encode('utf-8'))
+                yield sink.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.take()
+
+
+def export_stream(fmt, chunks, sheet_name='Sheet1'):
+    # The bytes of the export of `chunks` (DataFrames with the same columns)
+    # in format `fmt`, produced as the chunks are consumed.
+    if fmt == 'xlsx':
+        return xlsx_stream(chunks, sheet_name)
+    if fmt == 'parquet':
+        return parquet_stream(chunks)
+    return csv_stream(chunks)
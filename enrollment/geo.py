@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from enrollment.cleaning import LABELS
+
+
+GEO_LEVELS = ['Region', 'Province', 'Division']
+
+# Boundaries are simplified once per zoom tier: (map projection scale at which
+# the tier starts, Douglas-Peucker tolerance in degrees, decimals kept).
+ZOOM_TIERS = [(1, 0.02, 3), (4, 0.005, 4), (16, 0.001, 5)]
+
+
+def _name_key(name):
+    return ' '.join(str(name).upper().split())
+
+
+# Per level, the LIS export's own labels mapped to the cleaned ones (as
+# cleaning.LABELS relabels them), by name key.
+LABEL_KEYS = {level: {_name_key(raw): _name_key(clean) for raw, clean in LABELS[level].items()}
+              for level in GEO_LEVELS if level in LABELS}
+
+
+def area_key(name, level=None):
+    # Areas are matched to boundary features by name, ignoring case and
+    # spacing. A boundary file may name them as the LIS export does ("Region
+    # I", "NCR") or as the cleaned data does ("ILOCOS REGION").
+    key = _name_key(name)
+    return LABEL_KEYS.get(level, {}).get(key, key)
+
+
+def zoom_tier(scale):
+    tier = 0
+    for i, (start, _, _) in enumerate(ZOOM_TIERS):
+        if (scale or 1) >= start:
+            tier = i
+    return tier
+
+
+def simplify_line(points, tolerance):
+    # Douglas-Peucker: the points to keep so that no dropped point is further
+    # than `tolerance` from the simplified line. Iterative, on index ranges.
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        offsets = points[first + 1:last] - start
+        direction = end - start
+        # Distance to the segment, not the line through it: a point past
+        # either end is as far as it is from that end.
+        length = direction @ direction
+        along = np.clip(offsets @ direction / length, 0, 1) if length else np.zeros(len(offsets))
+        distances = np.hypot(*(offsets - along[:, None] * direction).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance, decimals):
+    points = np.asarray(ring, dtype=float)[:, :2]
+    simplified = simplify_line(points, tolerance)
+    if len(simplified) < 4:
+        # Too small to keep its shape at this tier; keep it as a triangle so
+        # that small islands and cities stay clickable.
+        simplified = points[np.linspace(0, len(points) - 1, min(len(points), 4)).astype(int)]
+    return np.round(simplified, decimals).tolist()
+
+
+def simplify_geometry(geometry, tolerance, decimals):
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        return geometry
+    simplified = [[simplify_ring(ring, tolerance, decimals) for ring in polygon] for polygon in polygons]
+    if geometry['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': simplified[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplified}
+
+
+class BoundaryStore:
+    # Boundary files bundled with the app, one GeoJSON FeatureCollection per
+    # level (<directory>/region.geojson, province.geojson, division.geojson),
+    # each feature named by `name_property` as the area appears in the LIS
+    # export or in the cleaned data (see area_key). Each level is simplified once per zoom tier, with the feature
+    # id set to its area key; the result is kept in memory and next to the
+    # dataset cache, keyed by the source file's hash, so later processes
+    # just read it.
+    def __init__(self, directory, cache_directory, name_property='name'):
+        self.directory = directory
+        self.cache_directory = cache_directory
+        self.name_property = name_property
+        self._simplified = {}
+        self._lock = threading.Lock()
+
+    def path(self, level):
+        return os.path.join(self.directory, f'{level.lower()}.geojson')
+
+    def available(self, level):
+        return os.path.exists(self.path(level))
+
+    def geojson(self, level, tier):
+        # The simplified FeatureCollection of `level` at `tier`, or None when
+        # there is no boundary file for it.
+        key = (level, tier)
+        with self._lock:
+            if key not in self._simplified:
+                self._simplified[key] = self._load(level, tier)
+            return self._simplified[key]
+
+    def _load(self, level, tier):
+        if not self.available(level):
+            return None
+        with open(self.path(level), 'rb') as f:
+            source = f.read()
+        settings = f'{self.name_property}:{ZOOM_TIERS[tier]}:{sorted(LABEL_KEYS.get(level, {}).items())}'
+        digest = hashlib.sha256(source + settings.encode()).hexdigest()[:16]
+        cached = os.path.join(self.cache_directory, f'boundaries-{level.lower()}-{tier}-{digest}.json')
+        try:
+            with open(cached) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        _, tolerance, decimals = ZOOM_TIERS[tier]
+        features = []
+        for feature in json.loads(source)['features']:
+            name = (feature.get('properties') or {}).get(self.name_property)
+            if name is None or not feature.get('geometry'):
+                continue
+            features.append({'type': 'Feature', 'id': area_key(name, level), 'properties': {'name': name},
+                             'geometry': simplify_geometry(feature['geometry'], tolerance, decimals)})
+        collection = {'type': 'FeatureCollection', 'features': features}
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temporary = f'{cached}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(collection, f, separators=(',', ':'))
+        os.replace(temporary, cached)
+        return collection
+
+
+class AreaSums:
+    # Enrollment columns summed per area of each geographic level, from the
+    # cube cells. The unfiltered sums are computed once; a filtered view
+    # adds up only the matching cells' values of the one measure shown.
+    def __init__(self, cube, levels=GEO_LEVELS):
+        self.cube = cube
+        self.codes, self.labels, self.sums = {}, {}, {}
+        for level in levels:
+            codes = cube.index.codes(level)
+            labels = cube.index.categories(level)
+            # Bin 0 collects the cells with no value for the level (code -1).
+            bins = codes.astype(np.intp) + 1
+            sums = np.stack([np.bincount(bins, weights=cube.sums[:, j], minlength=len(labels) + 1)
+                             for j in range(len(cube.columns))], axis=1)
+            self.codes[level], self.labels[level], self.sums[level] = codes, labels, sums[1:].astype(np.int64)
+
+    def values(self, level, weights, mask=None):
+        # (area labels, measure per area) for the cells in `mask` (None: all
+        # of them); `weights` turns the enrollment columns into the measure.
+        if mask is None:
+            return self.labels[level], self.sums[level] @ weights
+        # Only the matching cells, column by column over the measure's
+        # columns: the cube's sums are stored column-major, and an integer
+        # matmul does not use BLAS.
+        cells = np.flatnonzero(mask)
+        values = np.zeros(len(cells), dtype=np.int64)
+        for j in np.flatnonzero(weights):
+            values += self.cube.sums[:, j].take(cells) * weights[j]
+        codes = self.codes[level][cells]
+        present = codes >= 0
+        totals = np.bincount(codes[present], weights=values[present], minlength=len(self.labels[level]))
+        return self.labels[level], totals.astype(np.int64)
@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    # Inverted index over the filter dimensions, built once per dataset. For
+    # every value of every filter column it keeps the (sorted) positions of the
+    # rows carrying that value. A selection is answered by OR-ing postings
+    # within a dimension and AND-ing the dimension masks, without copying the
+    # frame once per active filter.
+    def __init__(self, frame, columns):
+        self.size = len(frame)
+        self._codes = {}
+        self._categories = {}
+        self._postings = {}
+
+        for col in columns:
+            values = frame[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype('category')
+            categories = values.cat.categories
+            codes = values.cat.codes.to_numpy()
+
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+
+            self._codes[col] = codes
+            self._categories[col] = categories
+            self._postings[col] = {
+                value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(categories)
+            }
+
+    def extended(self, frame):
+        # Index over `frame`: the rows indexed here followed by appended ones
+        # (a merged upload). Only the appended rows are sorted; each value's
+        # existing postings are reused and the new positions concatenated
+        # after them, so they stay sorted. The filter columns of `frame` must
+        # be categorical, as concat_chunks leaves them.
+        start = self.size
+        appended = FilterIndex(frame.iloc[start:], list(self._codes))
+        index = FilterIndex(frame.iloc[:0], [])
+        index.size = len(frame)
+        empty = np.empty(0, dtype=np.intp)
+        for col in self._codes:
+            index._codes[col] = frame[col].cat.codes.to_numpy()
+            index._categories[col] = appended._categories[col]
+            index._postings[col] = {
+                value: np.concatenate([self._postings[col].get(value, empty),
+                                       appended._postings[col][value] + start])
+                for value in appended._categories[col]
+            }
+        return index
+
+    def codes(self, col):
+        # Category code of every row in `col` (-1 for missing).
+        return self._codes[col]
+
+    def categories(self, col):
+        return self._categories[col]
+
+    def dimension_mask(self, col, selected_values):
+        mask = np.zeros(self.size, dtype=bool)
+        postings = self._postings[col]
+        for value in selected_values:
+            rows = postings.get(value)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def narrow(self, mask, col, selected_values):
+        # AND one more dimension into `mask` (None meaning "all rows").
+        if not selected_values:
+            return mask
+        dim_mask = self.dimension_mask(col, selected_values)
+        return dim_mask if mask is None else mask & dim_mask
+
+    def mask(self, selections):
+        # `selections` maps filter column -> selected values; empty or None
+        # selections don't filter. Returns None when nothing is selected.
+        mask = None
+        for col, selected_values in selections.items():
+            mask = self.narrow(mask, col, selected_values)
+        return mask
+
+    def rows(self, selections):
+        mask = self.mask(selections)
+        return None if mask is None else np.flatnonzero(mask)
+
+    def select(self, frame, selections):
+        rows = self.rows(selections)
+        return frame if rows is None else frame.iloc[rows]
+
+    def values(self, col, mask=None):
+        # Sorted values of `col` present in the rows under `mask`.
+        codes = self._codes[col]
+        if mask is not None:
+            codes = codes[mask]
+        present = np.flatnonzero(np.bincount(codes[codes >= 0], minlength=len(self._categories[col])))
+        return sorted(self._categories[col][present])
+
+
+class OptionsIndex:
+    # Options for the cascading dropdowns. Level k lists the values of chain[k]
+    # present under the selections made at levels 0..k-1; it is answered from
+    # a FilterIndex over the distinct combinations of the chain columns (the
+    # cube cells), which is far smaller than the school rows. Finished option
+    # lists are kept per (level, upstream selections) and reused.
+    def __init__(self, combinations_index, chain, cache_size=512):
+        self.chain = chain
+        self._index = combinations_index
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            options = self._cache.get(key)
+            if options is not None:
+                self._cache.move_to_end(key)
+            return options
+
+    def _store(self, key, options):
+        with self._lock:
+            self._cache[key] = options
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def cascade(self, selections, start=0):
+        # `selections` holds the selected values per level, in chain order.
+        # Returns the option lists for levels start..end; the levels above
+        # `start` can't have changed and are not recomputed. The selection mask
+        # is only narrowed as far as the first cache miss needs it.
+        results = []
+        mask, narrowed = None, 0
+        for level in range(start, len(self.chain)):
+            upstream = selections[:level]
+            key = (level, tuple(frozenset(v) if v else None for v in upstream))
+            options = self._cached(key)
+            if options is None:
+                for col, selected_values in zip(self.chain[narrowed:level], upstream[narrowed:]):
+                    mask = self._index.narrow(mask, col, selected_values)
+                narrowed = level
+                options = [{'label': v, 'value': v} for v in self._index.values(self.chain[level], mask)]
+                self._store(key, options)
+            results.append(options)
+        return results
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # One background task. The task receives the job and calls `report()` as
+    # it goes; that is also where a cancel takes effect, so a cancelled upload
+    # stops at the next chunk instead of running to the end.
+    # `holders` are the uploads waiting for it; it is only cancelled once none
+    # is left. `marker` is the file that tells other processes it is running.
+    def __init__(self, key, marker=None):
+        self.key = key
+        self.stage = 'Queued'
+        self.progress = 0.0
+        self.future = None
+        self.holders = set()
+        self.marker = marker
+        self._marked = 0.0
+        self._cancelled = threading.Event()
+
+    def report(self, fraction=None, stage=None):
+        if self._cancelled.is_set():
+            raise JobCancelled(self.key)
+        if self.marker is not None and time.monotonic() - self._marked > MARKER_REFRESH_SECONDS:
+            self.mark()
+        if stage is not None:
+            self.stage = stage
+        if fraction is not None:
+            self.progress = fraction
+
+    def cancel(self):
+        self._cancelled.set()
+        self.future.cancel()
+
+    def mark(self):
+        try:
+            with open(self.marker, 'a'):
+                os.utime(self.marker)
+            self._marked = time.monotonic()
+        except OSError:
+            pass
+
+    def unmark(self, future=None):
+        try:
+            os.remove(self.marker)
+        except OSError:
+            pass
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def status(self):
+        # 'running', 'done', 'failed' or 'cancelled'.
+        if self.cancelled:
+            return 'cancelled'
+        if not self.future.done():
+            return 'running'
+        return 'failed' if self.error is not None else 'done'
+
+    @property
+    def error(self):
+        if not self.future.done():
+            return None
+        try:
+            error = self.future.exception()
+        except CancelledError:
+            return None
+        return None if isinstance(error, JobCancelled) else error
+
+    @property
+    def result(self):
+        return self.future.result() if self.status == 'done' else None
+
+
+# A running job refreshes its marker file at least this often; a marker left
+# untouched for STALE_MARKER_SECONDS belongs to a job that died with its process.
+MARKER_REFRESH_SECONDS = 5
+STALE_MARKER_SECONDS = 120
+
+
+class JobQueue:
+    # Background jobs on a local thread pool, keyed so that the browser can
+    # poll for them by key. Submitting a key that is still running returns the
+    # running job (the same file uploaded twice is parsed once), with the new
+    # holder added. Finished jobs are kept until every holder forgot them, up
+    # to `max_finished` of them. With a `marker_directory` (shared by the
+    # worker processes), each running job keeps a <key>.running file there,
+    # so that a process can tell a job running elsewhere from a lost one.
+    def __init__(self, max_workers=2, max_finished=32, marker_directory=None):
+        self.max_finished = max_finished
+        self.marker_directory = marker_directory
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='enrollment-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _marker(self, key):
+        return None if self.marker_directory is None else os.path.join(self.marker_directory, f'{key}.running')
+
+    def submit(self, key, task, *args, holder=None):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status == 'running':
+                job.holders.add(holder)
+                return job
+            job = self._jobs[key] = Job(key, self._marker(key))
+            job.holders.add(holder)
+            if job.marker is not None:
+                os.makedirs(self.marker_directory, exist_ok=True)
+                job.mark()
+            job.future = self._executor.submit(task, job, *args)
+            if job.marker is not None:
+                job.future.add_done_callback(job.unmark)
+            finished = [k for k, j in self._jobs.items() if j.status != 'running']
+            for k in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[k]
+            return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key, holder=None):
+        # Cancels the job once `holder` was the last one holding it.
+        job = self.forget(key, holder)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def forget(self, key, holder=None):
+        # Drops `holder`'s hold; returns the job if it was the last one.
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            job.holders.discard(holder)
+            if job.holders:
+                return None
+            return self._jobs.pop(key)
+
+    def running_elsewhere(self, key):
+        # Whether another process sharing the marker directory runs `key`.
+        marker = self._marker(key)
+        try:
+            return marker is not None and time.time() - os.path.getmtime(marker) < STALE_MARKER_SECONDS
+        except OSError:
+            return False
+
+    def running(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.status == 'running']
@@ -0,0 +1,154 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+SCHOOL_ID = 'BEIS School ID'
+
+# Conflicts kept per merged dataset (with the columns that differ); the total
+# is always counted.
+MAX_REPORTED_CONFLICTS = 200
+
+
+class SchoolIndex:
+    # Hash index from BEIS School ID to the row holding it (the first one, if a
+    # file repeats an id). Extending it for appended rows only hashes those.
+    def __init__(self, ids=None):
+        self._positions = {}
+        if ids is not None:
+            self.add(ids, 0)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def add(self, ids, start):
+        positions = self._positions
+        for position, school_id in enumerate(ids.tolist(), start):
+            positions.setdefault(school_id, position)
+
+    def lookup(self, ids):
+        # Row of each id, -1 where the id is not indexed.
+        get = self._positions.get
+        return np.fromiter((get(school_id, -1) for school_id in ids.tolist()), dtype=np.int64, count=len(ids))
+
+    def copy(self):
+        index = SchoolIndex()
+        index._positions = self._positions.copy()
+        return index
+
+
+class MergeReport:
+    # What merging files into a dataset left out: rows that were exact copies
+    # of a school already loaded, and conflicts (same BEIS School ID, different
+    # values), for which the row loaded first is kept.
+    def __init__(self, duplicates=0, conflicts=None, conflict_count=0):
+        self.duplicates = duplicates
+        self.conflicts = list(conflicts or [])
+        self.conflict_count = conflict_count
+
+    def record(self, duplicates, conflicts, conflict_count):
+        self.duplicates += duplicates
+        self.conflict_count += conflict_count
+        self.conflicts += conflicts[:max(0, MAX_REPORTED_CONFLICTS - len(self.conflicts))]
+
+    def to_dict(self):
+        return {'duplicates': self.duplicates, 'conflicts': list(self.conflicts), 'conflict_count': self.conflict_count}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data) if data else cls()
+
+
+def merged_dataset_id(part_ids):
+    # Same parts in the same order -> same id. Order matters: on a conflict
+    # the row loaded first is kept.
+    return hashlib.sha256(('merge:' + ','.join(part_ids)).encode('ascii')).hexdigest()[:16]
+
+
+def row_hashes(frame, columns):
+    return pd.util.hash_pandas_object(frame[columns], index=False).to_numpy()
+
+
+def reported_id(value):
+    # A school id as it goes into the report: a number if it is one, else text.
+    if isinstance(value, np.generic):
+        value = value.item()
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+def differs(a, b):
+    return not (a == b or (pd.isna(a) and pd.isna(b)))
+
+
+class AppendedRows:
+    # The frames of a merge laid end to end (the dataset merged into, then
+    # the rows kept from each file), with a SchoolIndex over all of them. Each
+    # file's rows are looked up by school id; only the matches are compared,
+    # by row hash, against the row they match wherever it lives.
+    def __init__(self, frame, school_index):
+        self.columns = list(frame.columns)
+        self.frames = [frame]
+        self.starts = [0]
+        self.size = len(frame)
+        self.school_index = school_index.copy()
+        self.report = MergeReport()
+
+    def _hashes(self, positions):
+        which = np.searchsorted(self.starts, positions, side='right') - 1
+        hashes = np.empty(len(positions), dtype=np.uint64)
+        for k in np.unique(which):
+            rows = which == k
+            hashes[rows] = row_hashes(self.frames[k].iloc[positions[rows] - self.starts[k]], self.columns)
+        return hashes
+
+    def _row(self, position):
+        k = np.searchsorted(self.starts, position, side='right') - 1
+        return self.frames[k].iloc[position - self.starts[k]]
+
+    def _compare(self, label, frame, rows, their_hashes, their_row):
+        # Records rows `rows` of `frame` as duplicates or conflicts of the
+        # rows they repeat (their hashes, and a function fetching one).
+        same = row_hashes(frame.iloc[rows], self.columns) == their_hashes
+        conflicting = rows[~same]
+        conflicts = []
+        for row in conflicting[:MAX_REPORTED_CONFLICTS]:
+            mine, theirs = frame.iloc[row], their_row(row)
+            conflicts.append({'school_id': reported_id(mine[SCHOOL_ID]), 'file': label,
+                              'columns': [col for col in self.columns if differs(mine[col], theirs[col])]})
+        self.report.record(int(same.sum()), conflicts, len(conflicting))
+
+    def add(self, label, frame):
+        # Keeps (and returns) the rows of `frame` with a school id not seen
+        # yet, in the data so far or earlier in `frame`; records the rest as
+        # duplicates or conflicts. Rows without a school id are all kept.
+        if set(frame.columns) != set(self.columns):
+            raise ValueError(f'{label} does not have the same columns as the data it is merged into')
+        frame = frame[self.columns]
+        matches = self.school_index.lookup(frame[SCHOOL_ID])
+        new = matches < 0
+        matched = np.flatnonzero(~new)
+        if len(matched):
+            self._compare(label, frame, matched, self._hashes(matches[matched]),
+                          lambda row: self._row(matches[row]))
+            frame = frame[new].reset_index(drop=True)
+
+        ids = frame[SCHOOL_ID]
+        present = ids.notna().to_numpy()
+        first = ~ids.duplicated().to_numpy()
+        repeated = np.flatnonzero(~first & present)
+        if len(repeated):
+            # factorize numbers the ids in order of first appearance, so an
+            # id's code is the rank of its first row among the first rows.
+            codes = pd.factorize(ids)[0]
+            firsts = np.flatnonzero(first & present)[codes[repeated]]
+            self._compare(label, frame, repeated, row_hashes(frame.iloc[firsts], self.columns),
+                          lambda row: frame.iloc[firsts[np.searchsorted(repeated, row)]])
+            frame = frame[first | ~present].reset_index(drop=True)
+
+        if len(frame):
+            self.school_index.add(frame[SCHOOL_ID], self.size)
+            self.frames.append(frame)
+            self.starts.append(self.size)
+            self.size += len(frame)
+        return frame
@@ -0,0 +1,162 @@
+import bisect
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, has_app_context, request
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Histogram:
+    # Cumulative-bucket histogram in the Prometheus text format. observe() is
+    # a bisect and a few additions under a lock.
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = _labels(self.label_names + ('le',), label_values + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class CallbackMetrics:
+    # Always-on instrumentation for the Dash callbacks, served on /metrics:
+    #
+    #   dash_callback_duration_seconds   whole /_dash-update-component request
+    #   dash_callback_request_bytes / dash_callback_response_bytes
+    #   dash_callback_phase_seconds      time per phase of a request: 'store
+    #                                    decode' (Dash decoding the request and
+    #                                    the dataset lookup), 'filter',
+    #                                    'aggregate', 'figure build', and
+    #                                    'serialize' (Dash encoding the response)
+    #
+    # plus whatever gauges the collectors report at scrape time. Callbacks are
+    # named by the function wrapped with `callback`; other phases are recorded
+    # with the `phase` context manager inside it.
+    def __init__(self):
+        self.duration = Histogram('dash_callback_duration_seconds', 'Wall time of a callback request.',
+                                  ['callback'], LATENCY_BUCKETS)
+        self.request_bytes = Histogram('dash_callback_request_bytes', 'Size of the callback request body.',
+                                       ['callback'], BYTE_BUCKETS)
+        self.response_bytes = Histogram('dash_callback_response_bytes', 'Size of the callback response body.',
+                                        ['callback'], BYTE_BUCKETS)
+        self.phases = Histogram('dash_callback_phase_seconds', 'Time spent per phase of a callback request.',
+                                ['callback', 'phase'], LATENCY_BUCKETS)
+        self._collectors = []
+
+    def install(self, server, path='/_dash-update-component'):
+        @server.before_request
+        def start_timer():
+            if request.path.endswith(path):
+                g.metrics_start = time.perf_counter()
+                g.metrics_phases = defaultdict(float)
+
+        @server.after_request
+        def record(response):
+            start = g.pop('metrics_start', None)
+            if start is None:
+                return response
+            end = time.perf_counter()
+            name = g.pop('metrics_callback', 'unknown')
+            phases = g.pop('metrics_phases')
+            called, returned = g.pop('metrics_called', None), g.pop('metrics_returned', None)
+            if called is not None:
+                phases['store decode'] += called - start
+            if returned is not None:
+                phases['serialize'] += end - returned
+
+            self.duration.observe(end - start, name)
+            self.request_bytes.observe(request.content_length or 0, name)
+            self.response_bytes.observe(response.calculate_content_length() or 0, name)
+            for phase, seconds in phases.items():
+                self.phases.observe(seconds, name, phase)
+            return response
+
+    def callback(self, func):
+        # Decorator for a callback function (below @app.callback).
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not has_app_context() or 'metrics_start' not in g:
+                return func(*args, **kwargs)
+            g.metrics_callback = func.__name__
+            g.metrics_called = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                g.metrics_returned = time.perf_counter()
+        return wrapper
+
+    @contextmanager
+    def phase(self, name, callback=None):
+        # Adds the block's time to `name` for the current callback request, or
+        # records it at once under `callback` (work outside a request, such as
+        # a background job).
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if callback is not None:
+                self.phases.observe(elapsed, callback, name)
+            elif has_app_context() and 'metrics_phases' in g:
+                g.metrics_phases[name] += elapsed
+
+    def add_collector(self, collect):
+        # `collect()` returns [(name, type, help, [(labels dict, value), ...])],
+        # evaluated on every scrape.
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for histogram in (self.duration, self.request_bytes, self.response_bytes, self.phases):
+            lines += histogram.render()
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(tuple(labels), tuple(labels.values()))} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+
+GENDERS = ['Male', 'Female']
+
+ELEMENTARY_GRADES = ['K', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6', 'Elem NG']
+JUNIOR_GRADES = ['G7', 'G8', 'G9', 'G10', 'JHS NG']
+SENIOR_GRADES = ['G11', 'G12']
+SHS_TRACKS = ['ACAD ABM', 'ACAD HUMSS', 'ACAD STEM', 'ACAD GAS', 'ACAD PBM', 'TVL', 'SPORTS', 'ARTS']
+
+STAGES = ['Elementary', 'Junior High School', 'Senior High School']
+TOTAL = 'All'
+
+
+def parse_enrollment_column(column):
+    # 'G11 ACAD ABM Male' -> ('ACAD ABM', 'Senior High School', 'Male'); None
+    # for anything that is not a grade/track x gender count.
+    name, _, gender = column.rpartition(' ')
+    if gender not in GENDERS:
+        return None
+    if name in ELEMENTARY_GRADES:
+        return name, 'Elementary', gender
+    if name in JUNIOR_GRADES:
+        return name, 'Junior High School', gender
+    grade, _, track = name.partition(' ')
+    if grade in SENIOR_GRADES and track in SHS_TRACKS:
+        return track, 'Senior High School', gender
+    return None
+
+
+class AggregationPlan:
+    # Compiled once per dataset from its enrollment header. Every series the
+    # cards and charts show (grade levels, SHS tracks, stages and the overall
+    # total, each by gender) is a 0/1-weighted sum of enrollment columns, so a
+    # whole view comes out of one matrix-vector product over the selection's
+    # column totals instead of a separate lookup per chart.
+    def __init__(self, columns):
+        self.columns = pd.Index(columns)
+        self.series = ELEMENTARY_GRADES + JUNIOR_GRADES + SHS_TRACKS + STAGES + [TOTAL]
+        position = {name: i for i, name in enumerate(self.series)}
+
+        self.weights = np.zeros((len(self.series), len(GENDERS), len(self.columns)), dtype=np.int64)
+        for j, column in enumerate(self.columns):
+            parsed = parse_enrollment_column(column)
+            if parsed is None:
+                continue
+            name, stage, gender = parsed
+            g = GENDERS.index(gender)
+            for series in (name, stage, TOTAL):
+                self.weights[position[series], g, j] = 1
+
+    def evaluate(self, sums):
+        # Series x gender totals for one selection. `sums` are the enrollment
+        # column totals in this plan's column order.
+        values = self.weights @ np.asarray(sums, dtype=np.int64)
+        return pd.DataFrame(values, index=self.series, columns=GENDERS)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from enrollment.plan import STAGES, TOTAL
+
+
+SCHOOL_COLUMNS = ['BEIS School ID', 'School Name', 'Municipality']
+TOTAL_COLUMNS = STAGES + ['Total']
+SEARCH_COLUMNS = ['BEIS School ID', 'School Name']
+
+
+class SchoolTable:
+    # The school list behind the drill-down table, built once per dataset.
+    # Enrollment per level is summed per school up front (the plan's stage
+    # weights over each row) along with the lowercased text searched, and
+    # each column's sort order is computed the first time it is asked for and
+    # kept, so a page of a filtered, sorted list costs one pass over the
+    # selection mask and never a re-sort.
+    def __init__(self, frame, plan):
+        self.frame = frame
+        names = [*STAGES, TOTAL]
+        weights = plan.weights[[plan.series.index(name) for name in names]].sum(axis=1)
+        counts = frame[list(plan.columns)].to_numpy(dtype=np.int64)
+        self.totals = pd.DataFrame(counts @ weights.T, columns=TOTAL_COLUMNS)
+        self.search_text = (frame[SEARCH_COLUMNS[0]].astype(str) + ' '
+                            + frame[SEARCH_COLUMNS[1]].astype(str)).str.lower()
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def extended(self, frame, plan):
+        # Table over `frame`: the rows held here followed by appended ones (a
+        # merged upload). Only the appended rows are summed; sort orders are
+        # computed again when asked for.
+        appended = SchoolTable(frame.iloc[len(self.frame):], plan)
+        table = SchoolTable(frame.iloc[:0], plan)
+        table.frame = frame
+        table.totals = pd.concat([self.totals, appended.totals], ignore_index=True)
+        table.search_text = pd.concat([self.search_text, appended.search_text], ignore_index=True)
+        return table
+
+    def _sort_key(self, column):
+        if column in TOTAL_COLUMNS:
+            return self.totals[column].to_numpy()
+        values = self.frame[column]
+        if pd.api.types.is_numeric_dtype(values):
+            return values.to_numpy()
+        # Text as its rank among the sorted distinct values.
+        return pd.factorize(values.astype(str), sort=True)[0]
+
+    def order(self, column, descending=False):
+        # Row positions sorted by `column`, ties in file order.
+        key = (column, descending)
+        order = self._orders.get(key)
+        if order is None:
+            values = self._sort_key(column)
+            order = np.argsort(-values if descending else values, kind='stable')
+            self._orders[key] = order
+        return order
+
+    def search(self, text):
+        # Rows whose school id or name contains `text` (case-insensitive).
+        return self.search_text.str.contains(text.strip().lower(), regex=False).to_numpy()
+
+    def page(self, mask, page, page_size, sort_by=None, descending=False, text=None):
+        # (matching schools, records of page `page`) for the rows under
+        # `mask` (None: all rows) that match the search `text`.
+        if text and text.strip():
+            found = self.search(text)
+            mask = found if mask is None else mask & found
+        if sort_by is not None:
+            rows = self.order(sort_by, descending)
+            if mask is not None:
+                rows = rows[mask[rows]]
+        else:
+            rows = np.arange(len(self.frame)) if mask is None else np.flatnonzero(mask)
+        shown = rows[page * page_size:(page + 1) * page_size]
+        records = self.frame[SCHOOL_COLUMNS].iloc[shown].astype(object).reset_index(drop=True)
+        records = pd.concat([records, self.totals.iloc[shown].reset_index(drop=True)], axis=1)
+        return len(rows), records.to_dict('records')
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+
+from flask import g, request
+
+
+def process_uptime():
+    # Seconds since this process was started, so that interpreter startup and
+    # the imports before the dashboard script runs are counted too. Read from
+    # /proc (10 ms resolution); 0 where that isn't available.
+    try:
+        with open('/proc/self/stat') as f:
+            started_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(0.0, uptime - started_ticks / os.sysconf('SC_CLK_TCK'))
+
+
+class StartupProfile:
+    # Seconds from process start to each step of booting the dashboard:
+    #
+    #   imports        the script's imports are done
+    #   layout         app.layout is built
+    #   callbacks      the script has finished loading (all callbacks registered)
+    #   warm-up        figure skeletons and preloaded datasets are ready
+    #   first page     the first page load was served
+    #   first chart    the first chart callback was answered
+    #
+    # Each step is recorded once. They are always exported on /metrics; with
+    # `verbose` each is also printed to stderr as it happens (for the import
+    # breakdown itself, run with `python -X importtime`).
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.origin = time.perf_counter() - process_uptime()
+        self.steps = {}
+        self._lock = threading.Lock()
+
+    def mark(self, step):
+        with self._lock:
+            if step in self.steps:
+                return
+            self.steps[step] = time.perf_counter() - self.origin
+        if self.verbose:
+            print(f'startup: {step:<12} {self.steps[step]:8.3f} s', file=sys.stderr, flush=True)
+
+    def install(self, server, chart_callbacks, path='/_dash-update-component'):
+        # Marks the first page and the first answer from one of
+        # `chart_callbacks`. Registered after CallbackMetrics.install, so this
+        # runs first and still sees the callback's name on `g`.
+        @server.after_request
+        def mark_first_responses(response):
+            if response.status_code != 200:
+                return response
+            if request.path == '/':
+                self.mark('first page')
+            elif request.path.endswith(path) and g.get('metrics_callback') in chart_callbacks:
+                self.mark('first chart')
+            return response
+
+    def collect(self):
+        # A collector for CallbackMetrics.add_collector.
+        with self._lock:
+            steps = list(self.steps.items())
+        return [('enrollment_startup_seconds', 'gauge', 'Seconds from process start to each startup step.',
+                 [({'step': step}, seconds) for step, seconds in steps])]
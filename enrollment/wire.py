@@ -0,0 +1,41 @@
+import base64
+
+import numpy as np
+
+
+# Compact array encoding for data that has to travel as JSON (the client
+# cube in a dcc.Store). Integer arrays are packed little-endian in the
+# smallest dtype that holds them and base64-encoded, so an array of N values
+# costs a few bytes per value instead of a decimal number each.
+
+INTEGER_DTYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.int64]
+
+
+def smallest_dtype(values):
+    if len(values) == 0:
+        return np.dtype(np.uint8)
+    low, high = values.min(), values.max()
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def pack(values):
+    # An integer (or float) array as {'dtype', 'shape', 'data'}; the browser
+    # side (assets/crossfilter.js) reads them straight into typed arrays.
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        values = values.astype(smallest_dtype(values.ravel()))
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    return {
+        'dtype': values.dtype.str,
+        'shape': list(values.shape),
+        'data': base64.b64encode(values.tobytes()).decode('ascii'),
+    }
+
+
+def unpack(packed):
+    data = base64.b64decode(packed['data'])
+    return np.frombuffer(data, dtype=np.dtype(packed['dtype'])).reshape(packed['shape'])
@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+# Ingest worker processes. An upload is parsed, cleaned, aggregated and saved
+# to the on-disk dataset cache by a separate Python process, so that the
+# CPU-bound work runs outside the web server's GIL; the server then loads the
+# saved dataset back (a memory-mapped read). Each worker is
+#
+#   python -m enrollment.worker <cache directory> <cache bytes>
+#
+# and stays up between uploads. It reads one request per line on stdin and
+# answers with JSON lines on its stdout: progress as it goes, then the phase
+# timings, or an error.
+
+
+class WorkerError(Exception):
+    pass
+
+
+def ingest_file(request, disk_cache, answer):
+    from enrollment.data import Dataset, read_upload, save_to_disk
+
+    phases = {}
+    with open(request['contents']) as f:
+        contents = f.read()
+    start = time.perf_counter()
+    answer(progress=0.0, stage='Reading')
+    frame, cells = read_upload(contents, lambda fraction: answer(progress=fraction))
+    del contents
+    phases['parse'], start = time.perf_counter() - start, time.perf_counter()
+    answer(stage='Aggregating')
+    dataset = Dataset(request['id'], frame, cells, school_year=request['year']).build()
+    phases['aggregate'], start = time.perf_counter() - start, time.perf_counter()
+    answer(stage='Saving')
+    save_to_disk(dataset, disk_cache)
+    phases['persist'] = time.perf_counter() - start
+    return phases
+
+
+def serve(cache_directory, cache_bytes):
+    from enrollment.disk_cache import DatasetDiskCache
+
+    disk_cache = DatasetDiskCache(cache_directory, cache_bytes)
+    # Answers go to the original stdout; anything else printed goes to stderr.
+    answers = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+
+    def answer(**message):
+        answers.write(json.dumps(message) + '\n')
+
+    for line in sys.stdin:
+        try:
+            phases = ingest_file(json.loads(line), disk_cache, answer)
+        except Exception as e:
+            answer(error=str(e) or type(e).__name__)
+        else:
+            answer(done=True, phases=phases)
+
+
+class WorkerPool:
+    # Up to `size` worker processes, started when first needed and reused.
+    # A worker whose job is cancelled (or that dies) is killed and replaced by
+    # a fresh one on the next upload.
+    def __init__(self, size, cache_directory, cache_bytes):
+        self.size = size
+        self.cache_directory = cache_directory
+        self.cache_bytes = cache_bytes
+        self._idle = []
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.poll() is None:
+                    return worker
+        try:
+            return subprocess.Popen([sys.executable, '-m', 'enrollment.worker', self.cache_directory,
+                                     str(self.cache_bytes)], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, worker, healthy):
+        if healthy:
+            with self._lock:
+                self._idle.append(worker)
+        else:
+            worker.kill()
+            worker.wait()
+        self._slots.release()
+
+    def ingest(self, job, contents, upload_id, year):
+        # Runs an upload through a worker, passing its progress on to `job`
+        # (whose report() raises if the job was cancelled). Returns the phase
+        # timings; the dataset is then in the disk cache under `upload_id`.
+        os.makedirs(self.cache_directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=self.cache_directory, prefix='.upload-', delete=False) as f:
+            f.write(contents)
+        worker, healthy = self._acquire(), False
+        try:
+            worker.stdin.write(json.dumps({'contents': f.name, 'id': upload_id, 'year': year}) + '\n')
+            worker.stdin.flush()
+            for line in worker.stdout:
+                message = json.loads(line)
+                if 'error' in message:
+                    healthy = True
+                    raise WorkerError(message['error'])
+                if message.get('done'):
+                    healthy = True
+                    return message['phases']
+                job.report(message.get('progress'), message.get('stage'))
+            raise WorkerError('the ingest worker stopped unexpectedly')
+        finally:
+            self._release(worker, healthy)
+            os.remove(f.name)
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,88 @@
+import argparse
+import importlib.util
+import os
+import sys
+
+
+# Production entry point: the dashboard behind gunicorn with several worker
+# processes instead of Dash's single-process development server.
+#
+#   gunicorn --workers 4 --threads 4 --bind 0.0.0.0:8050 serve:server
+#   python serve.py --workers 4
+#
+# Workers do not share Python objects, so the dataset is shared through the
+# on-disk cache (DATASET_CACHE_DIR): an upload is parsed once by the worker
+# that receives it and written there as Arrow IPC, and every other worker finds
+# it through find_dataset() and memory-maps it. The count columns and category
+# codes are read-only views of the mapped file, so all workers share one copy
+# of the dataset in the page cache; each only builds its own (small) cube and
+# indexes. An upload's ingest job runs in the worker that received it; a poll
+# that lands on another worker shows no progress, only the finished dataset
+# once it is in the disk cache.
+#
+# `python serve.py` imports the dashboard and waits for its warm-up (figure
+# skeletons, the PRELOAD_LATEST_DATASET dataset) in the master process before
+# forking, so starting or restarting a worker is a fork rather than a fresh
+# import; with the gunicorn command line, pass --preload for the same.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(ROOT, 'Enrollment_Plotly-Dash_Script.py')
+
+
+def load_dashboard():
+    # The dashboard script isn't importable by name (it has a hyphen in it).
+    spec = importlib.util.spec_from_file_location('enrollment_dashboard', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+dashboard = load_dashboard()
+server = dashboard.app.server
+
+# Finish warming up before gunicorn takes over: the workers are forked from
+# this process when preloading, and no thread may be running at the fork.
+if dashboard.warm_up_thread is not None:
+    dashboard.warm_up_thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the enrollment dashboard with gunicorn')
+    parser.add_argument('--bind', default=os.environ.get('DASH_BIND', '0.0.0.0:8050'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('DASH_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('DASH_THREADS', 4)))
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('DASH_TIMEOUT', 120)),
+                        help='seconds before a busy worker is restarted')
+    args = parser.parse_args(argv)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit('serve.py needs gunicorn (pip install gunicorn); '
+                 'use `python Enrollment_Plotly-Dash_Script.py` for the development server.')
+
+    if args.workers > 1 and not dashboard.disk_cache.enabled:
+        print('warning: the on-disk dataset cache is off (pyarrow missing or DATASET_CACHE_MB=0), '
+              'so uploads are only visible to the worker that received them', file=sys.stderr)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                'bind': args.bind,
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'timeout': args.timeout,
+                'preload_app': True,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return server
+
+    Application().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import base64
+
+import pytest
+
+from benchmarks.dash_client import DashClient, finish_upload, load_dashboard
+from benchmarks.synthetic import generate_lis_csv
+
+
+API_TOKEN = 'test-token'
+
+
+@pytest.fixture(scope='session')
+def dashboard(tmp_path_factory):
+    # The dashboard reads its settings when it is loaded, once per test run.
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv('AGGREGATE_API', '1')
+        env.setenv('API_TOKEN', API_TOKEN)
+        env.setenv('DATASET_CACHE_DIR', str(tmp_path_factory.mktemp('dataset_cache')))
+        env.setenv('INGEST_PROCESSES', '0')
+        env.setenv('WARM_UP', '0')
+        env.delenv('SECRET_KEY', raising=False)
+        yield load_dashboard()
+
+
+@pytest.fixture(scope='session')
+def upload(dashboard):
+    # Uploads the synthetic export from a new browser session; returns its
+    # client (cookie and component props) once the upload is loaded.
+    def upload(n_rows=2000):
+        client = DashClient(dashboard.app)
+        contents = 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+        client.set('upload-dataset.contents', contents)
+        client.call('output-upload', ['upload-dataset.contents'])
+        finish_upload(client, dashboard)
+        return client
+    return upload
@@ -0,0 +1,78 @@
+import io
+
+import pandas as pd
+import pytest
+
+from enrollment import data
+from tests.conftest import API_TOKEN as TOKEN
+
+
+@pytest.fixture(scope='module')
+def uploaded(upload):
+    # A client that uploaded the synthetic export, and its partitions.
+    client = upload()
+    return client, client.props['stored-data.data']
+
+
+def aggregates(http, dataset_id, *filters, headers=None):
+    return http.get('/api/aggregates', query_string=[('dataset', dataset_id), *filters], headers=headers or {})
+
+
+def test_aggregates_and_revalidation(uploaded):
+    client, partitions = uploaded
+    dataset_id = next(iter(partitions.values()))
+    response = aggregates(client.client, dataset_id)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    body = response.get_json()
+    assert body['dataset'] == dataset_id
+    assert body['cards']
+
+    etag = response.headers['ETag']
+    revalidated = aggregates(client.client, dataset_id, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+    assert revalidated.headers['ETag'] == etag
+
+
+def test_etag_follows_the_filters_not_their_order(uploaded, dashboard):
+    client, partitions = uploaded
+    dataset_id = next(iter(partitions.values()))
+    regions = [str(value) for value in dashboard.load_dataset(dataset_id).index.categories('Region')[:2]]
+    one = aggregates(client.client, dataset_id, ('region', regions[0]), ('region', regions[1]))
+    other = aggregates(client.client, dataset_id, ('region', regions[1]), ('region', regions[0]))
+    unfiltered = aggregates(client.client, dataset_id)
+    assert one.headers['ETag'] == other.headers['ETag'] != unfiltered.headers['ETag']
+    assert one.get_json() == other.get_json()
+    assert aggregates(client.client, dataset_id, headers={'If-None-Match': one.headers['ETag']}).status_code == 200
+
+
+def test_other_sessions_get_a_404(uploaded, dashboard):
+    _, partitions = uploaded
+    dataset_id = next(iter(partitions.values()))
+    stranger = dashboard.app.server.test_client()
+    assert aggregates(stranger, dataset_id).status_code == 404
+    assert aggregates(stranger, dataset_id, headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    assert aggregates(stranger, dataset_id, headers={'Authorization': f'Bearer {TOKEN}'}).status_code == 200
+    assert aggregates(stranger, 'no-such-dataset', headers={'Authorization': f'Bearer {TOKEN}'}).status_code == 404
+
+
+def test_school_export_streams_the_filtered_rows(uploaded, dashboard):
+    client, partitions = uploaded
+    (year, dataset_id), = partitions.items()
+    frame = dashboard.load_dataset(dataset_id).frame
+    region = str(frame['Region'].iloc[0])
+    query = [('year', year), ('partition', f'{year}:{dataset_id}'), ('region', region)]
+    response = client.client.get('/export/schools.csv', query_string=query)
+    assert response.status_code == 200
+    exported = pd.read_csv(io.StringIO(response.get_data().decode('utf-8-sig')))
+    assert len(exported) == (frame['Region'] == region).sum()
+    assert dashboard.app.server.test_client().get('/export/schools.csv', query_string=query).status_code == 404
+
+
+def test_unknown_partitions_are_not_held(dashboard):
+    stranger = dashboard.app.server.test_client()
+    for i in range(20):
+        query = [('partition', f'SY:unknown-{i}'), ('partition', f'SY2:other-{i}')]
+        assert stranger.get('/export/schools.csv', query_string=query).status_code == 404
+    assert not [i for i in data._holders if i.startswith(('unknown-', 'other-'))]
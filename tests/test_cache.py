@@ -0,0 +1,59 @@
+from enrollment.cache import ResultCache, filter_key, freeze
+
+
+def test_filter_key_ignores_order_and_empty_filters():
+    a = filter_key('data', {'Region': ['B', 'A'], 'Sector': [], 'Division': None})
+    b = filter_key('data', {'Region': ['A', 'B']})
+    assert a == b
+    assert freeze([a[0], [list(pair) for pair in a[1]]]) == a
+
+
+def test_get_counts_hits_and_misses():
+    cache = ResultCache()
+    assert cache.get('k') is None
+    cache.put('k', {'v': 1})
+    assert cache.get('k') == {'v': 1}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+
+def test_evicts_least_recently_used_by_entries():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.peek('b') is None
+    assert (cache.peek('a'), cache.peek('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_by_bytes():
+    cache = ResultCache(max_bytes=100)
+    cache.put('a', 'x', size=40)
+    cache.put('b', 'y', size=40)
+    cache.put('c', 'z', size=40)
+    assert cache.peek('a') is None
+    assert cache.stats()['bytes'] == 80
+    cache.put('b', 'y2', size=10)
+    assert cache.stats()['bytes'] == 50
+
+
+def test_outputs_larger_than_the_cache_are_not_kept():
+    cache = ResultCache(max_bytes=10)
+    assert cache.put('a', 'x' * 100) == 'x' * 100
+    assert cache.peek('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidate_drops_one_dataset():
+    cache = ResultCache()
+    cache.put(filter_key('one', {}), 1, size=5)
+    cache.put(filter_key('one', {'Region': ['A']}), 2, size=5)
+    cache.put(filter_key('two', {}), 3, size=5)
+    cache.invalidate('one')
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes']) == (1, 5)
+    assert cache.peek(filter_key('two', {})) == 3
+    cache.clear()
+    assert cache.stats()['entries'] == 0
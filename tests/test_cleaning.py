@@ -0,0 +1,99 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_cleaning import fix_parentheses_and_uppercase, notebook_clean
+from benchmarks.synthetic import generate_lis_csv
+from enrollment.cleaning import LABELS, UPPERCASE, clean_enrollment, clean_school_names, relabel
+from enrollment.data import NOT_APPLICABLE, apply_schema, clean_column_names
+
+
+# Names the notebook cleans correctly, and what it turns them into.
+NOTEBOOK_CASES = [
+    ('San Jose ES', 'SAN JOSE ELEMENTARY'),
+    ('Rizal MNHS', 'RIZAL MEMORIAL NATIONAL HIGH SCHOOL'),
+    ('Sto. Nino P/S', 'STO. NINO PRIMARY SCHOOL'),
+    ('Holy Cross School, Inc.', 'HOLY CROSS SCHOOL, INC.'),
+    ('Luna  (Annex', 'LUNA (ANNEX)'),
+    ('Annex) Luna', '(ANNEX) LUNA'),
+    ('Don  Bosco - Tech "Inst"', 'DON BOSCO - TECH INST'),
+    ('Ilog Integrated  School  ,Inc', 'ILOG INTEGRATED SCHOOL, INC.'),
+]
+
+# Where the port deliberately differs: abbreviations ending in a period are
+# expanded (the notebook's unescaped '.' and trailing \b miss them), and
+# 'inc.' after 'school' keeps its comma.
+EXPANDED_CASES = [
+    ('Bo. Obrero E/S', 'BARRIO OBRERO ELEMENTARY'),
+    ('Sch. of Fisheries Mem. HS', 'SCHOOL OF FISHERIES MEMORIAL HIGH SCHOOL'),
+    ('Synthetic 3 Elem. School', 'SYNTHETIC 3 ELEMENTARY SCHOOL'),
+    ('st. mary academy inc', 'ST. MARY ACADEMY, INC.'),
+    ('Synthetic 4 school inc.', 'SYNTHETIC 4 SCHOOL, INC.'),
+]
+
+
+@pytest.mark.parametrize('name, expected', NOTEBOOK_CASES)
+def test_school_names_match_the_notebook(name, expected):
+    assert fix_parentheses_and_uppercase(name) == expected
+    assert clean_school_names(pd.Series([name])).iloc[0] == expected
+
+
+@pytest.mark.parametrize('name, expected', EXPANDED_CASES)
+def test_abbreviations_with_periods_expand(name, expected):
+    assert clean_school_names(pd.Series([name])).iloc[0] == expected
+
+
+def test_manual_corrections():
+    names = pd.Series(['(HIS) Hope IS, Inc.', 'Bongao CLES'])
+    assert clean_school_names(names).tolist() == ['HOPE INTEGRATED SCHOOL, INC.', 'BONGAO Central Elementary School']
+
+
+def test_missing_names_and_placeholders_are_kept():
+    names = pd.Series(['San Jose ES', np.nan, NOT_APPLICABLE])
+    cleaned = clean_school_names(names, keep={NOT_APPLICABLE})
+    assert cleaned.iloc[0] == 'SAN JOSE ELEMENTARY'
+    assert pd.isna(cleaned.iloc[1])
+    assert cleaned.iloc[2] == NOT_APPLICABLE
+
+
+def test_cleaning_is_idempotent():
+    names = pd.Series([name for name, _ in NOTEBOOK_CASES + EXPANDED_CASES])
+    once = clean_school_names(names)
+    assert clean_school_names(once).tolist() == once.tolist()
+
+
+def test_relabel_maps_and_merges_categories():
+    values = pd.Series(pd.Categorical(['Region I', 'NCR', None, 'Ncr ', 'Region I']))
+    relabeled = relabel(values, LABELS['Region'] | {'Ncr ': 'NATIONAL CAPITAL REGION'})
+    assert relabeled.tolist()[:2] == ['ILOCOS REGION', 'NATIONAL CAPITAL REGION']
+    assert pd.isna(relabeled.iloc[2])
+    assert relabeled.iloc[3] == 'NATIONAL CAPITAL REGION'
+    assert sorted(relabeled.cat.categories) == ['ILOCOS REGION', 'NATIONAL CAPITAL REGION']
+
+
+def test_relabel_uppercases_unlisted_labels_and_keeps_placeholders():
+    values = pd.Series(pd.Categorical([' Cebu City', 'cebu city', NOT_APPLICABLE]))
+    relabeled = relabel(values, {}, keep={NOT_APPLICABLE})
+    assert relabeled.tolist() == ['CEBU CITY', 'CEBU CITY', NOT_APPLICABLE]
+
+
+@pytest.fixture(scope='module')
+def cleaned():
+    raw = pd.read_csv(io.StringIO(generate_lis_csv(3000)), skiprows=4)
+    raw.columns = clean_column_names(raw.columns)
+    return raw, notebook_clean(raw), clean_enrollment(apply_schema(raw.copy()), NOT_APPLICABLE)
+
+
+@pytest.mark.parametrize('col', list(LABELS) + UPPERCASE)
+def test_labels_match_the_notebook(cleaned, col):
+    _, notebook, ours = cleaned
+    assert ours[col].astype(object).fillna('').tolist() == notebook[col].astype(object).fillna('').tolist()
+
+
+def test_names_without_periods_match_the_notebook(cleaned):
+    raw, notebook, ours = cleaned
+    plain = ~raw['School Name'].str.contains('.', regex=False, na=False)
+    assert plain.sum() > 0
+    assert ours['School Name'][plain].tolist() == notebook['School Name'][plain].tolist()
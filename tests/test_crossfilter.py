@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import FILTER_COLUMNS, Dataset
+from enrollment.merge import SCHOOL_ID
+from enrollment.plan import GENDERS
+from enrollment.wire import unpack
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    # Row 0's school also has rows 1-5 (other cells), and rows 6-7 are one
+    # school too.
+    frame = synthetic_frame(600)
+    frame.loc[1:5, SCHOOL_ID] = frame.loc[0, SCHOOL_ID]
+    frame.loc[7, SCHOOL_ID] = frame.loc[6, SCHOOL_ID]
+    return Dataset('crossfilter', frame).build()
+
+
+@pytest.fixture(scope='module')
+def payload(dataset):
+    # As the browser receives it.
+    return json.loads(json.dumps(dataset.client_cube))
+
+
+# Python ports of assets/crossfilter.js: cellMask and repeatedSchools.
+def cell_mask(payload, filters):
+    mask = None
+    for col in payload['codes']:
+        selected = filters.get(col)
+        if not selected:
+            continue
+        labels = payload['dimensions'][col]
+        wanted = np.isin(np.arange(len(labels)), [labels.index(v) for v in selected if v in labels])
+        codes = unpack(payload['codes'][col]).astype(np.int64)
+        matched = (codes >= 0) & wanted[np.maximum(codes, 0)]
+        mask = matched if mask is None else mask & matched
+    return mask
+
+
+def repeated_schools(spanning, mask):
+    if spanning is None:
+        return 0
+    cells, offsets = unpack(spanning['cells']), unpack(spanning['offsets'])
+    repeats = 0
+    for s in range(len(offsets) - 1):
+        span = cells[offsets[s]:offsets[s + 1]]
+        matched = len(span) if mask is None else int(mask[span].sum())
+        repeats += max(matched - 1, 0)
+    return repeats
+
+
+def browser_schools(payload, filters):
+    mask = cell_mask(payload, filters)
+    schools = unpack(payload['schools'])
+    total = int(schools.sum() if mask is None else schools[mask].sum())
+    return total - repeated_schools(payload['spanning'], mask)
+
+
+def selections(dataset):
+    frame = dataset.frame
+    yield {}
+    for row in (0, 3, 6):
+        yield {'Region': [str(frame['Region'].iloc[row])]}
+        yield {'Region': [str(frame['Region'].iloc[row])], 'Sector': [str(frame['Sector'].iloc[row])]}
+    yield {'Division': [str(v) for v in frame['Division'].iloc[:4]]}
+    yield {'Region': ['no such region']}
+
+
+def test_spanning_schools_are_shipped(dataset, payload):
+    assert not dataset.cube.additive_schools
+    offsets = unpack(payload['spanning']['offsets'])
+    assert len(offsets) == 3
+
+
+def test_browser_school_counts_match_the_cube(dataset, payload):
+    for filters in selections(dataset):
+        rows = dataset.frame[dataset.index.mask(filters) if filters else slice(None)]
+        expected = rows[SCHOOL_ID].nunique()
+        assert dataset.cube.query(filters).schools == expected
+        assert browser_schools(payload, filters) == expected
+
+
+def test_browser_series_sums_match_the_plan(dataset, payload):
+    for filters in selections(dataset):
+        mask = cell_mask(payload, filters)
+        values = dataset.plan.evaluate(dataset.cube.query(filters).sums)
+        for gender in GENDERS:
+            for name, packed in zip(payload['series'], payload['sums'][gender]):
+                series = unpack(packed)
+                assert (series.sum() if mask is None else series[mask].sum()) == values.loc[name, gender]
+        rows = unpack(payload['rows'])
+        assert (rows.sum() if mask is None else rows[mask].sum()) == dataset.cube.query(filters).rows
+
+
+def test_additive_datasets_ship_no_spans():
+    payload = Dataset('plain', synthetic_frame(200)).build().client_cube
+    assert payload['spanning'] is None
+    assert set(payload['codes']) == set(FILTER_COLUMNS)
@@ -0,0 +1,91 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_lis_csv
+from enrollment.cube import ROWS, SCHOOLS
+from enrollment.data import FILTER_COLUMNS, Dataset, read_upload
+from enrollment.merge import SCHOOL_ID
+
+
+def upload(text):
+    return 'data:text/csv;base64,' + base64.b64encode(text.encode()).decode()
+
+
+def with_repeated_schools(text, copies=150, moved=150):
+    # The export with `copies` rows appended again as they are (the same
+    # school twice in its cell, likely in another chunk) and `moved` rows
+    # appended under another row's school id (a school spanning cells).
+    lines = text.splitlines(keepends=True)
+    head, rows = lines[:5], lines[5:]
+    extra = rows[:copies]
+    for i, line in enumerate(rows[-moved:]):
+        extra.append(rows[i].split(',', 1)[0] + ',' + line.split(',', 1)[1])
+    return ''.join(head + rows + extra)
+
+
+def selections(dataset):
+    # A few single- and multi-dimension selections taken from the data.
+    frame = dataset.frame
+    first = frame.iloc[0]
+    yield {}
+    yield {'Region': [first['Region']]}
+    yield {'Region': list(frame['Region'].cat.categories[:2]), 'Sector': [first['Sector']]}
+    yield {'Division': [first['Division']], 'Modified COC': list(frame['Modified COC'].cat.categories[:3])}
+    yield {'Region': [first['Region']], 'Sector': ['no such sector']}
+
+
+def expected_totals(dataset, selection):
+    rows = pd.Series(True, index=dataset.frame.index)
+    for col, values in selection.items():
+        rows &= dataset.frame[col].isin(values)
+    matching = dataset.frame[rows]
+    return matching[dataset.enrollment_columns].sum(), len(matching), matching[SCHOOL_ID].nunique()
+
+
+def sorted_cells(cells):
+    cells = cells.copy()
+    for col in FILTER_COLUMNS:
+        cells[col] = cells[col].astype(object).fillna('')
+    return cells.sort_values(FILTER_COLUMNS).reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def text():
+    return generate_lis_csv(3000)
+
+
+@pytest.mark.parametrize('repeated', [False, True])
+def test_cube_totals_match_filtering_the_rows(text, repeated):
+    frame, cells = read_upload(upload(with_repeated_schools(text) if repeated else text))
+    dataset = Dataset('cube', frame, cells).build()
+    assert dataset.cube.additive_schools != repeated
+    assert (len(dataset.cube.span_offsets) > 1) == repeated
+    for selection in selections(dataset):
+        sums, rows, schools = expected_totals(dataset, selection)
+        totals = dataset.cube.query(selection)
+        assert (totals.sums == sums).all()
+        assert (totals.rows, totals.schools) == (rows, schools)
+
+
+@pytest.mark.parametrize('repeated', [False, True])
+def test_chunked_upload_cells_match_a_single_groupby(text, repeated):
+    contents = upload(with_repeated_schools(text) if repeated else text)
+    frame, cells = read_upload(contents, chunksize=337)
+    whole, _ = read_upload(contents, chunksize=10 ** 6)
+    pd.testing.assert_frame_equal(frame, whole, check_categorical=False)
+
+    columns = Dataset('cube', frame).enrollment_columns
+    grouped = frame.groupby(FILTER_COLUMNS, observed=True, dropna=False)
+    expected = grouped[columns].sum()
+    expected[ROWS] = grouped.size()
+    expected[SCHOOLS] = grouped[SCHOOL_ID].nunique()
+    expected = sorted_cells(expected.reset_index())
+    cells = sorted_cells(cells)[list(expected.columns)]
+    assert len(cells) == len(expected)
+    for col in FILTER_COLUMNS:
+        assert cells[col].tolist() == expected[col].tolist()
+    np.testing.assert_array_equal(cells.drop(columns=FILTER_COLUMNS).to_numpy(dtype=np.int64),
+                                  expected.drop(columns=FILTER_COLUMNS).to_numpy(dtype=np.int64))
@@ -0,0 +1,60 @@
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment import data
+from enrollment.data import Dataset, drop_dataset, get_dataset, hold_dataset, register_dataset, release_dataset
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(data, '_datasets', type(data._datasets)())
+    monkeypatch.setattr(data, '_holders', {})
+    monkeypatch.setattr(data, 'MAX_DATASETS', 2)
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return synthetic_frame(20)
+
+
+def test_recently_used_datasets_are_kept(frame):
+    for name in ('a', 'b'):
+        register_dataset(Dataset(name, frame))
+    get_dataset('a')
+    register_dataset(Dataset('c', frame))
+    assert [get_dataset(name) is not None for name in 'abc'] == [True, False, True]
+
+
+def test_held_datasets_are_not_evicted(frame):
+    register_dataset(Dataset('a', frame))
+    assert hold_dataset('a', 'session')
+    for name in 'bcde':
+        register_dataset(Dataset(name, frame))
+    assert get_dataset('a') is not None
+    assert release_dataset('a', 'session')
+    assert get_dataset('a') is None
+
+
+def test_a_dataset_stays_while_another_session_holds_it(frame):
+    register_dataset(Dataset('a', frame))
+    hold_dataset('a', 'one')
+    hold_dataset('a', 'two')
+    assert not release_dataset('a', 'one')
+    assert get_dataset('a') is not None
+
+
+def test_unknown_ids_are_not_held():
+    for i in range(100):
+        assert not hold_dataset(f'unknown-{i}', 'session')
+    assert data._holders == {}
+
+
+def test_holds_of_dropped_and_lapsed_datasets_are_removed(frame, monkeypatch):
+    for name in 'ab':
+        register_dataset(Dataset(name, frame))
+        hold_dataset(name, 'session')
+    drop_dataset('a')
+    assert set(data._holders) == {'b'}
+    monkeypatch.setattr(data, 'HOLD_SECONDS', -1)
+    register_dataset(Dataset('c', frame))
+    assert data._holders == {}
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment import disk_cache as disk_cache_module
+from enrollment.data import Dataset, load_from_disk, save_to_disk
+from enrollment.disk_cache import DatasetDiskCache
+
+pytestmark = pytest.mark.skipif(disk_cache_module.feather is None, reason='pyarrow is not installed')
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return synthetic_frame(500)
+
+
+def dataset(frame, dataset_id):
+    return Dataset(dataset_id, frame, school_year='2023-2024').build()
+
+
+def age(cache, dataset_id, seconds):
+    path = os.path.join(cache.directory, dataset_id)
+    then = os.path.getmtime(path) - seconds
+    os.utime(path, (then, then))
+
+
+def test_round_trip_is_memory_mapped(frame, tmp_path):
+    cache = DatasetDiskCache(str(tmp_path), 1 << 30)
+    original = dataset(frame, 'a')
+    save_to_disk(original, cache)
+    loaded = load_from_disk('a', cache)
+    # Free text comes back as pandas' string dtype; everything else as saved.
+    pd.testing.assert_frame_equal(loaded.frame, original.frame, check_dtype=False)
+    for col, dtype in original.frame.dtypes.items():
+        assert loaded.frame[col].dtype == (pd.StringDtype(na_value=np.nan) if dtype == object else dtype)
+    assert loaded.school_year == '2023-2024'
+    assert loaded.distinct_rows == original.distinct_rows
+    assert (loaded.national.sums == original.national.sums).all()
+    # Count columns are read-only views of the mapped file, not copies.
+    counts = loaded.frame[original.enrollment_columns[0]].to_numpy()
+    assert not counts.flags.writeable
+    assert not counts.flags.owndata
+
+
+def test_missing_and_broken_entries_load_as_none(frame, tmp_path):
+    cache = DatasetDiskCache(str(tmp_path), 1 << 30)
+    assert cache.load('missing') is None and cache.meta('missing') is None
+    save_to_disk(dataset(frame, 'a'), cache)
+    with open(os.path.join(str(tmp_path), 'a', 'frame.arrow'), 'wb') as f:
+        f.write(b'not arrow')
+    assert cache.load('a') is None
+    assert cache.meta('a')['rows'] == len(frame)
+
+
+def test_least_recently_used_datasets_are_evicted(frame, tmp_path):
+    cache = DatasetDiskCache(str(tmp_path), 1 << 30)
+    save_to_disk(dataset(frame, 'a'), cache)
+    cache.max_bytes = int(cache.size('a') * 2.5)
+    age(cache, 'a', 200)
+    save_to_disk(dataset(frame, 'b'), cache)
+    assert cache.entries() == ['b', 'a']
+    age(cache, 'b', 100)
+    save_to_disk(dataset(frame, 'c'), cache)
+    assert cache.entries() == ['c', 'b']
+    assert cache.size() <= cache.max_bytes
+
+
+def test_reading_a_dataset_keeps_it(frame, tmp_path):
+    cache = DatasetDiskCache(str(tmp_path), 1 << 30)
+    for dataset_id in 'ab':
+        save_to_disk(dataset(frame, dataset_id), cache)
+    cache.max_bytes = int(cache.size('a') * 2.5)
+    age(cache, 'a', 200)
+    age(cache, 'b', 100)
+    assert cache.most_recent() == 'b'
+    cache.load('a')
+    assert cache.most_recent() == 'a'
+    save_to_disk(dataset(frame, 'c'), cache)
+    assert cache.entries() == ['c', 'a']
+
+
+def test_the_dataset_just_written_is_kept_over_budget(frame, tmp_path):
+    cache = DatasetDiskCache(str(tmp_path), 1)
+    save_to_disk(dataset(frame, 'a'), cache)
+    save_to_disk(dataset(frame, 'b'), cache)
+    assert cache.entries() == ['b']
+
+
+def test_disabled_cache_stores_nothing(frame, tmp_path, monkeypatch):
+    off = DatasetDiskCache(str(tmp_path / 'off'), 0)
+    assert not off.enabled
+    save_to_disk(dataset(frame, 'a'), off)
+    assert off.entries() == [] and off.load('a') is None and off.most_recent() is None
+
+    cache = DatasetDiskCache(str(tmp_path / 'on'), 1 << 30)
+    save_to_disk(dataset(frame, 'a'), cache)
+    monkeypatch.setattr(disk_cache_module, 'feather', None)
+    assert not cache.enabled
+    assert cache.load('a') is None
+    save_to_disk(dataset(frame, 'b'), cache)
+    assert cache.entries() == ['a']
+    assert cache.meta('a')['parts'] == ['a']
@@ -0,0 +1,67 @@
+import io
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from enrollment.export import available_formats, export_stream, row_chunks
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'School Name': ['SAN JOSE ELEMENTARY', 'ST. MARY ACADEMY, INC.', None, 'A & B <ANNEX>'],
+        'Region': pd.Categorical(['NCR', 'NCR', None, 'CAR']),
+        'K Male': np.array([3, 0, 12, 70_000], dtype=np.int64),
+        'Share': [0.5, np.nan, 1.0, 0.25],
+    })
+
+
+def export(fmt, frame, rows=None, chunk_rows=2):
+    return b''.join(export_stream(fmt, row_chunks(frame, rows, chunk_rows)))
+
+
+def test_row_chunks_cover_the_rows_once(frame):
+    chunks = list(row_chunks(frame, np.array([3, 0, 2]), chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)['K Male'].tolist() == [70_000, 3, 12]
+    assert [len(chunk) for chunk in row_chunks(frame, np.array([], dtype=int))] == [0]
+
+
+def test_csv_has_a_byte_order_mark_and_one_header(frame):
+    data = export('csv', frame)
+    assert data.startswith(b'\xef\xbb\xbf')
+    text = data.decode('utf-8-sig')
+    assert text.count('School Name') == 1
+    pd.testing.assert_frame_equal(pd.read_csv(io.StringIO(text)),
+                                  pd.read_csv(io.StringIO(frame.to_csv(index=False))))
+
+
+def test_empty_csv_keeps_its_header(frame):
+    text = export('csv', frame, rows=np.array([], dtype=int)).decode('utf-8-sig')
+    assert text.strip() == ','.join(frame.columns)
+
+
+def test_xlsx_sheet_holds_every_row(frame):
+    workbook = zipfile.ZipFile(io.BytesIO(export('xlsx', frame)))
+    assert workbook.testzip() is None
+    sheet = workbook.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row>') == len(frame) + 1
+    assert sheet.count('School Name') == 1
+    assert 'A &amp; B &lt;ANNEX&gt;' in sheet
+    assert '<c><v>70000</v></c>' in sheet
+    assert re.search(r'<sheet name="Sheet1"', workbook.read('xl/workbook.xml').decode('utf-8'))
+
+
+def test_parquet_round_trip(frame):
+    if 'parquet' not in available_formats():
+        pytest.skip('pyarrow is not installed')
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(export('parquet', frame)))
+    assert table.num_rows == len(frame)
+    result = table.to_pandas()
+    assert result['K Male'].tolist() == frame['K Male'].tolist()
+    assert result['Region'].astype(object).tolist() == frame['Region'].astype(object).tolist()
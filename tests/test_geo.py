@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import Dataset
+from enrollment.geo import GEO_LEVELS, ZOOM_TIERS, BoundaryStore, area_key, simplify_geometry, simplify_line
+
+
+def distance_to_polyline(point, line):
+    best = np.inf
+    for start, end in zip(line[:-1], line[1:]):
+        direction = end - start
+        length = direction @ direction
+        t = 0 if length == 0 else np.clip((point - start) @ direction / length, 0, 1)
+        best = min(best, np.hypot(*(point - (start + t * direction))))
+    return best
+
+
+def test_straight_line_keeps_its_ends():
+    points = np.column_stack([np.linspace(0, 1, 50), np.linspace(0, 2, 50)])
+    np.testing.assert_array_equal(simplify_line(points, 1e-9), points[[0, -1]])
+
+
+def test_points_beyond_the_tolerance_are_kept():
+    points = np.array([[0, 0], [1, 0.001], [2, 0], [2.001, 1], [2, 2]], dtype=float)
+    np.testing.assert_array_equal(simplify_line(points, 0.01), points[[0, 2, 4]])
+
+
+@pytest.mark.parametrize('tolerance', [0.001, 0.01, 0.1])
+def test_dropped_points_stay_within_the_tolerance(tolerance):
+    rng = np.random.default_rng(0)
+    points = np.cumsum(rng.normal(0, 0.01, (400, 2)), axis=0)
+    simplified = simplify_line(points, tolerance)
+    assert len(simplified) < len(points)
+    np.testing.assert_array_equal(simplified[[0, -1]], points[[0, -1]])
+    assert max(distance_to_polyline(point, simplified) for point in points) <= tolerance + 1e-12
+
+
+def test_small_rings_keep_a_shape():
+    square = [[0, 0], [1e-4, 0], [1e-4, 1e-4], [0, 1e-4], [0, 0]]
+    geometry = simplify_geometry({'type': 'MultiPolygon', 'coordinates': [[square]]}, 0.02, 3)
+    assert geometry['type'] == 'MultiPolygon'
+    assert len(geometry['coordinates'][0][0]) == 4
+    point = {'type': 'Point', 'coordinates': [1, 2]}
+    assert simplify_geometry(point, 0.02, 3) is point
+
+
+def test_area_keys_match_lis_and_cleaned_labels():
+    assert area_key('Region I', 'Region') == area_key('ILOCOS REGION', 'Region') == 'ILOCOS REGION'
+    assert area_key(' ncr ', 'Region') == area_key('National  Capital Region', 'Region')
+    assert area_key('Cebu  city', 'Province') == 'CEBU CITY'
+    assert area_key('NCR') == 'NCR'
+
+
+def test_boundary_features_are_keyed_like_the_data(tmp_path):
+    square = [[[120, 14], [121, 14], [121, 15], [120, 15], [120, 14]]]
+    features = [{'type': 'Feature', 'properties': {'name': name}, 'geometry': {'type': 'Polygon', 'coordinates': square}}
+                for name in ('NCR', 'Region I')] + [{'type': 'Feature', 'properties': {}, 'geometry': None}]
+    directory = tmp_path / 'boundaries'
+    directory.mkdir()
+    (directory / 'region.geojson').write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    store = BoundaryStore(str(directory), str(tmp_path / 'cache'))
+    assert store.available('Region') and not store.available('Province')
+    assert store.geojson('Province', 0) is None
+    collection = store.geojson('Region', 0)
+    data_labels = ['NATIONAL CAPITAL REGION', 'ILOCOS REGION']
+    assert [f['id'] for f in collection['features']] == [area_key(label, 'Region') for label in data_labels]
+    # A second process reads the simplified copy from the cache directory.
+    assert len(list((tmp_path / 'cache').glob('boundaries-region-0-*.json'))) == 1
+    assert BoundaryStore(str(directory), str(tmp_path / 'cache')).geojson('Region', 0) == collection
+    assert len(ZOOM_TIERS) > 1
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return Dataset('geo', synthetic_frame(2000)).build()
+
+
+@pytest.mark.parametrize('level', GEO_LEVELS)
+def test_area_sums_match_grouping_the_rows(dataset, level):
+    frame, columns = dataset.frame, dataset.enrollment_columns
+    weights = np.zeros(len(columns), dtype=np.int64)
+    weights[[0, 3, 5]] = [1, 1, 2]
+    measure = pd.Series(frame[columns].to_numpy(dtype=np.int64) @ weights, index=frame.index)
+    region = frame['Region'].iloc[0]
+    for selections in ({}, {'Region': [region]}, {'Region': [region], 'Sector': ['PUBLIC']}):
+        mask = dataset.cube.index.mask(selections)
+        labels, values = dataset.areas.values(level, weights, mask)
+        rows = pd.Series(True, index=frame.index)
+        for col, selected in selections.items():
+            rows &= frame[col].isin(selected)
+        expected = measure[rows].groupby(frame[level][rows], observed=False).sum()
+        assert dict(zip(labels, values)) == expected.reindex(labels, fill_value=0).to_dict()
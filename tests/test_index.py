@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import FILTER_COLUMNS, concat_chunks
+from enrollment.index import FilterIndex
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return synthetic_frame(2000)
+
+
+def pandas_mask(frame, selections):
+    mask = np.ones(len(frame), dtype=bool)
+    for col, values in selections.items():
+        if values:
+            mask &= frame[col].isin(values).to_numpy()
+    return mask
+
+
+def test_postings_match_boolean_filtering(frame):
+    index = FilterIndex(frame, FILTER_COLUMNS)
+    assert index.mask({}) is None
+    assert index.mask({'Region': [], 'Sector': None}) is None
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        selections = {}
+        for col in rng.choice(FILTER_COLUMNS, rng.integers(1, 4), replace=False):
+            values = frame[col].dropna().unique()
+            selections[col] = list(rng.choice(values, min(len(values), rng.integers(1, 4)), replace=False))
+        expected = pandas_mask(frame, selections)
+        np.testing.assert_array_equal(index.mask(selections), expected)
+        np.testing.assert_array_equal(index.rows(selections), np.flatnonzero(expected))
+        for col in ('Region', 'Division'):
+            assert index.values(col, index.mask(selections)) == sorted(frame[col][expected].dropna().unique())
+
+
+def test_unknown_values_select_nothing(frame):
+    index = FilterIndex(frame, FILTER_COLUMNS)
+    assert not index.mask({'Region': ['no such region']}).any()
+
+
+def test_extended_index_matches_a_fresh_one(frame):
+    half = len(frame) // 2
+    first = frame.iloc[:half].reset_index(drop=True)
+    for col in FILTER_COLUMNS:
+        first[col] = first[col].cat.remove_unused_categories()
+    whole = concat_chunks([first, frame.iloc[half:].reset_index(drop=True)])
+    extended = FilterIndex(first, FILTER_COLUMNS).extended(whole)
+    fresh = FilterIndex(whole, FILTER_COLUMNS)
+    region = whole['Region'].iloc[-1]
+    for selections in ({'Region': [region]}, {'Region': [region], 'Sector': list(whole['Sector'].unique()[:1])}):
+        np.testing.assert_array_equal(extended.mask(selections), fresh.mask(selections))
+        np.testing.assert_array_equal(extended.mask(selections), pandas_mask(whole, selections))
+    assert isinstance(whole['Region'].dtype, pd.CategoricalDtype)
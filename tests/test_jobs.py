@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+import pytest
+
+from enrollment.jobs import Job, JobCancelled, JobQueue
+
+
+def wait(job, timeout=10):
+    job.future.exception(timeout=timeout)
+    # Done callbacks (the marker removal) may run just after the result is set.
+    time.sleep(0.05)
+
+
+def test_progress_is_reported_while_running():
+    queue = JobQueue()
+    go, reported = threading.Event(), threading.Event()
+
+    def task(job, rows):
+        job.report(0.5, 'Reading')
+        reported.set()
+        go.wait(10)
+        job.report(1.0)
+        return rows * 2
+
+    job = queue.submit('key', task, 21)
+    assert reported.wait(10)
+    assert (job.status, job.stage, job.progress, job.result) == ('running', 'Reading', 0.5, None)
+    assert queue.running() == [job]
+    go.set()
+    wait(job)
+    assert (job.status, job.progress, job.result, job.error) == ('done', 1.0, 42, None)
+
+
+def test_errors_raised_in_a_job_are_kept():
+    queue = JobQueue()
+
+    def task(job):
+        raise ValueError('bad upload')
+
+    job = queue.submit('key', task)
+    wait(job)
+    assert job.status == 'failed'
+    assert isinstance(job.error, ValueError) and str(job.error) == 'bad upload'
+    assert job.result is None
+
+
+def cancellable(job):
+    while True:
+        job.report()
+        time.sleep(0.01)
+
+
+def test_a_job_runs_until_its_last_holder_cancels():
+    queue = JobQueue()
+    job = queue.submit('key', cancellable, holder='one')
+    assert queue.submit('key', cancellable, holder='two') is job
+    assert queue.cancel('key', 'one') is None
+    assert job.status == 'running' and queue.get('key') is job
+    assert queue.cancel('key', 'two') is job
+    wait(job)
+    assert (job.status, job.error) == ('cancelled', None)
+    assert queue.get('key') is None
+
+
+def test_a_finished_key_runs_again():
+    queue = JobQueue()
+    first = queue.submit('key', lambda job: 1)
+    wait(first)
+    second = queue.submit('key', lambda job: 2)
+    wait(second)
+    assert second is not first and second.result == 2
+
+
+def test_finished_jobs_are_bounded():
+    queue = JobQueue(max_finished=2)
+    for i in range(5):
+        wait(queue.submit(f'key-{i}', lambda job: None))
+    queue.submit('last', lambda job: None)
+    assert queue.get('key-0') is None and queue.get('key-4') is not None
+
+
+def test_markers_tell_other_processes_a_job_is_running(tmp_path):
+    queue = JobQueue(marker_directory=str(tmp_path))
+    other = JobQueue(marker_directory=str(tmp_path))
+    go = threading.Event()
+    job = queue.submit('key', lambda job: go.wait(10))
+    assert other.running_elsewhere('key') and not other.running_elsewhere('other')
+    go.set()
+    wait(job)
+    assert not os.path.exists(job.marker)
+    assert not other.running_elsewhere('key')
+
+
+def test_stale_markers_are_ignored(tmp_path):
+    marker = tmp_path / 'key.running'
+    marker.touch()
+    old = time.time() - 1000
+    os.utime(marker, (old, old))
+    assert not JobQueue(marker_directory=str(tmp_path)).running_elsewhere('key')
+    assert not JobQueue().running_elsewhere('key')
+
+
+def test_report_raises_once_cancelled():
+    job = Job('key')
+    job.report(0.1, 'Reading')
+    job._cancelled.set()
+    with pytest.raises(JobCancelled):
+        job.report(0.2)
+    assert job.progress == 0.1
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from benchmarks.bench_merge import regional_datasets
+from enrollment.data import Dataset, concat_chunks, merge_datasets
+from enrollment.merge import SCHOOL_ID
+
+
+@pytest.fixture(scope='module')
+def regions():
+    return regional_datasets(6000)
+
+
+def with_repeats(dataset, exact, changed, name):
+    # `dataset` with its first exact + changed rows appended again, the last
+    # `changed` of them with a different count.
+    extra = dataset.frame.iloc[:exact + changed].copy()
+    col = dataset.enrollment_columns[0]
+    extra.loc[extra.index[exact:], col] += 1
+    return Dataset(name, concat_chunks([dataset.frame, extra])).build()
+
+
+def test_merge_without_overlap_matches_a_rebuild(regions):
+    base, region = regions
+    merged = merge_datasets(base, [('region.csv', region)], 'merged')
+    full = Dataset('full', concat_chunks([base.frame, region.frame])).build()
+    assert len(merged.frame) == len(full.frame)
+    assert (merged.national.sums == full.national.sums).all()
+    assert merged.national.schools == full.national.schools
+    assert merged.merge_report.duplicates == 0
+    assert merged.merge_report.conflict_count == 0
+
+
+def test_merging_a_file_twice_counts_every_row_as_duplicate(regions):
+    base, region = regions
+    merged = merge_datasets(base, [('region.csv', region), ('again.csv', region)], 'merged')
+    assert len(merged.frame) == len(base.frame) + len(region.frame)
+    assert merged.merge_report.duplicates == len(region.frame)
+    assert merged.merge_report.conflict_count == 0
+
+
+def test_repeats_within_a_file_are_counted(regions):
+    base, region = regions
+    repeated = with_repeats(region, 3, 2, 'repeated')
+    merged = merge_datasets(base, [('region.csv', repeated)], 'merged')
+    report = merged.merge_report
+    assert len(merged.frame) == len(base.frame) + len(region.frame)
+    assert report.duplicates == 3
+    assert report.conflict_count == 2
+    assert [c['file'] for c in report.conflicts] == ['region.csv', 'region.csv']
+    assert report.conflicts[0]['columns'] == [region.enrollment_columns[0]]
+    assert merged.national.schools == merged.frame[SCHOOL_ID].nunique()
+    json.dumps(report.to_dict())
+
+
+def test_repeats_in_the_base_are_removed_and_reported(regions):
+    base, region = regions
+    repeated = with_repeats(base, 2, 2, 'repeated')
+    merged = merge_datasets(repeated, [('region.csv', region)], 'merged', base_label='base.csv')
+    report = merged.merge_report
+    assert len(merged.frame) == len(base.frame) + len(region.frame)
+    assert (report.duplicates, report.conflict_count) == (2, 2)
+    assert {c['file'] for c in report.conflicts} == {'base.csv'}
+
+
+def test_a_later_merge_leaves_the_earlier_report_alone(regions):
+    base, region = regions
+    first = merge_datasets(base, [('region.csv', with_repeats(region, 0, 2, 'repeated'))], 'first')
+    before = first.merge_report.to_dict()
+    second = merge_datasets(first, [('again.csv', with_repeats(region, 0, 1, 'again'))], 'second')
+    assert first.merge_report.to_dict() == before
+    assert second.merge_report.duplicates == before['duplicates'] + len(region.frame)
+    assert second.merge_report.conflict_count == before['conflict_count'] + 1
+
+
+def test_string_school_ids(regions):
+    base, _ = regions
+    frame = base.frame.copy()
+    frame[SCHOOL_ID] = 'X' + frame[SCHOOL_ID].astype(str)
+    changed = frame.iloc[:3].copy()
+    col = base.enrollment_columns[0]
+    changed[col] += 1
+    merged = merge_datasets(Dataset('s', frame).build(), [('t', Dataset('t', changed).build())], 'merged')
+    assert merged.merge_report.conflict_count == 3
+    assert merged.merge_report.conflicts[0] == {'school_id': frame[SCHOOL_ID].iloc[0], 'file': 't', 'columns': [col]}
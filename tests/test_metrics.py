@@ -0,0 +1,100 @@
+import pytest
+from flask import Flask
+
+from enrollment.metrics import CONTENT_TYPE, CallbackMetrics, Histogram
+
+
+def samples(lines):
+    # {'name{labels}': value} for the sample lines of a rendering.
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1]) for line in lines if not line.startswith('#')}
+
+
+def test_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram('h', 'A histogram.', ['name'], (1, 5, 10))
+    for value in (0.5, 1, 3, 5, 7, 50):
+        histogram.observe(value, 'x')
+    rendered = samples(histogram.render())
+    assert rendered == {
+        'h_bucket{name="x",le="1"}': 2,
+        'h_bucket{name="x",le="5"}': 4,
+        'h_bucket{name="x",le="10"}': 5,
+        'h_bucket{name="x",le="+Inf"}': 6,
+        'h_sum{name="x"}': 66.5,
+        'h_count{name="x"}': 6,
+    }
+
+
+def test_render_format():
+    histogram = Histogram('h', 'A histogram.', ['name', 'phase'], (1,))
+    histogram.observe(2, 'a "quoted"\nname', 'p')
+    histogram.observe(0, 'b', 'p')
+    lines = histogram.render()
+    assert lines[:2] == ['# HELP h A histogram.', '# TYPE h histogram']
+    assert 'h_bucket{name="a \\"quoted\\"\\nname",phase="p",le="1"} 0' in lines
+    assert 'h_bucket{name="b",phase="p",le="+Inf"} 1' in lines
+    # One block of buckets, sum and count per label set.
+    assert len(lines) == 2 + 2 * 4
+
+
+def test_unlabelled_series():
+    histogram = Histogram('h', 'A histogram.', [], (1,))
+    histogram.observe(0.5)
+    assert samples(histogram.render()) == {'h_bucket{le="1"}': 1, 'h_bucket{le="+Inf"}': 1, 'h_sum': 0.5, 'h_count': 1}
+
+
+@pytest.fixture
+def server():
+    metrics = CallbackMetrics()
+    app = Flask(__name__)
+    metrics.install(app)
+
+    @metrics.callback
+    def update_view():
+        with metrics.phase('filter'):
+            pass
+        return 'ok'
+
+    app.add_url_rule('/_dash-update-component', 'update', update_view, methods=['POST'])
+    app.add_url_rule('/other', 'other', update_view)
+    app.add_url_rule('/metrics', 'metrics', metrics.response)
+    return metrics, app.test_client()
+
+
+def test_callback_requests_are_recorded(server):
+    metrics, client = server
+    client.post('/_dash-update-component', data=b'x' * 300)
+    client.get('/other')
+    rendered = samples(metrics.render().splitlines())
+    assert rendered['dash_callback_duration_seconds_count{callback="update_view"}'] == 1
+    assert rendered['dash_callback_request_bytes_bucket{callback="update_view",le="256"}'] == 0
+    assert rendered['dash_callback_request_bytes_bucket{callback="update_view",le="1024"}'] == 1
+    assert rendered['dash_callback_response_bytes_sum{callback="update_view"}'] == 2
+    for phase in ('store decode', 'filter', 'serialize'):
+        assert rendered[f'dash_callback_phase_seconds_count{{callback="update_view",phase="{phase}"}}'] == 1
+
+
+def test_phases_outside_a_request(server):
+    metrics, _ = server
+    with metrics.phase('parse', callback='ingest'):
+        pass
+    with metrics.phase('dropped'):
+        pass
+    rendered = samples(metrics.render().splitlines())
+    assert rendered['dash_callback_phase_seconds_count{callback="ingest",phase="parse"}'] == 1
+    assert not any('dropped' in key for key in rendered)
+
+
+def test_collectors_and_endpoint(server):
+    metrics, client = server
+    metrics.add_collector(lambda: [('jobs', 'gauge', 'Jobs.', [({'kind': 'ingest'}, 2), ({}, 3)])])
+    response = client.get('/metrics')
+    assert response.content_type == CONTENT_TYPE
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[-4:] == ['# HELP jobs Jobs.', '# TYPE jobs gauge', 'jobs{kind="ingest"} 2', 'jobs 3']
+
+
+def test_dashboard_callbacks_are_named(upload, dashboard):
+    client = upload()
+    client.call('export-links', ['stored-data.data'])
+    rendered = samples(client.client.get('/metrics').get_data(as_text=True).splitlines())
+    assert rendered['dash_callback_duration_seconds_count{callback="update_export_links"}'] >= 1
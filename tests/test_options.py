@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import OPTION_CHAIN, Dataset
+from enrollment.index import OptionsIndex
+
+
+def baseline_cascade(frame, selections):
+    # The dashboard's original update_dropdown_options: each level filtered
+    # by the selections above it, one pandas filter per level.
+    results = []
+    for col, selected in zip(OPTION_CHAIN, selections):
+        results.append([{'label': v, 'value': v} for v in sorted(frame[col].dropna().unique())])
+        if selected:
+            frame = frame[frame[col].isin(selected)]
+    return results
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return Dataset('options', synthetic_frame(3000)).build()
+
+
+def random_selections(frame, rng):
+    # Each level picks a value present under the levels above it, or nothing.
+    selections = []
+    for col in OPTION_CHAIN:
+        values = frame[col].dropna().unique()
+        if len(values) and rng.random() < 0.4:
+            selected = list(rng.choice(values, min(len(values), rng.integers(1, 3)), replace=False))
+            frame = frame[frame[col].isin(selected)]
+        else:
+            selected = []
+        selections.append(selected)
+    return selections
+
+
+def test_cascade_matches_the_baseline(dataset):
+    options = OptionsIndex(dataset.cube.index, OPTION_CHAIN)
+    rng = np.random.default_rng(0)
+    assert options.cascade([[]] * len(OPTION_CHAIN)) == baseline_cascade(dataset.frame, [[]] * len(OPTION_CHAIN))
+    for _ in range(40):
+        selections = random_selections(dataset.frame, rng)
+        assert options.cascade(selections) == baseline_cascade(dataset.frame, selections)
+
+
+def test_cascade_from_a_start_level(dataset):
+    options = OptionsIndex(dataset.cube.index, OPTION_CHAIN)
+    rng = np.random.default_rng(1)
+    for start in (1, 4, len(OPTION_CHAIN) - 1):
+        selections = random_selections(dataset.frame, rng)
+        assert options.cascade(selections, start) == baseline_cascade(dataset.frame, selections)[start:]
+
+
+def test_unknown_selections_leave_nothing_below(dataset):
+    options = OptionsIndex(dataset.cube.index, OPTION_CHAIN)
+    results = options.cascade([['no such region']] + [[]] * (len(OPTION_CHAIN) - 1))
+    assert results[0] and not any(results[1:])
+
+
+def test_option_lists_are_reused_and_bounded(dataset):
+    options = OptionsIndex(dataset.cube.index, OPTION_CHAIN, cache_size=len(OPTION_CHAIN))
+    region = dataset.frame['Region'].iloc[0]
+    selections = [[region]] + [[]] * (len(OPTION_CHAIN) - 1)
+    first = options.cascade(selections)
+    again = options.cascade(selections)
+    assert all(a is b for a, b in zip(first, again))
+    # Selection order doesn't matter to the cache key.
+    two = [[region, dataset.frame['Region'].iloc[-1]]] + [[]] * (len(OPTION_CHAIN) - 1)
+    assert options.cascade(two)[1] is options.cascade([list(reversed(two[0]))] + two[1:])[1]
+    # The lists for the first selection were evicted and are recomputed equal.
+    assert len(options._cache) == len(OPTION_CHAIN)
+    recomputed = options.cascade(selections)
+    assert recomputed == first
+    assert any(a is not b for a, b in zip(first, recomputed))
+    assert recomputed == baseline_cascade(dataset.frame, selections)
@@ -0,0 +1,110 @@
+import copy
+import json
+
+import pytest
+
+
+CALLBACK = 'update_metrics_and_chart'
+
+
+def is_patch(value):
+    return isinstance(value, dict) and '__dash_patch_update' in value
+
+
+def apply_patch(value, patch):
+    value = copy.deepcopy(value)
+    for operation in patch['operations']:
+        assert operation['operation'] == 'Assign'
+        *path, last = operation['location']
+        target = value
+        for step in path:
+            target = target[step]
+        target[last] = operation['params']['value']
+    return value
+
+
+class Browser:
+    # What a browser shows for the callback's outputs: whole values replace
+    # what is shown, patches are applied to it, omitted outputs stay.
+    def __init__(self, client):
+        self.client = client
+        self.shown = {}
+        self.patched = set()
+
+    def fire(self, *changed):
+        response, _, _ = self.client.call(CALLBACK, list(changed))
+        self.patched = set()
+        for component_id, props in response.items():
+            for prop, value in props.items():
+                if is_patch(value):
+                    self.patched.add(component_id)
+                    value = apply_patch(self.shown[component_id, prop], value)
+                self.shown[component_id, prop] = value
+        return response
+
+
+def comparable(shown):
+    return {f'{c}.{p}': json.loads(json.dumps(v)) for (c, p), v in shown.items() if c != 'view-key'}
+
+
+@pytest.fixture
+def browser(upload, dashboard):
+    browser = Browser(upload())
+    browser.fire('stored-data.data')
+    return browser
+
+
+def full_render(browser, dashboard):
+    # The same view rendered from scratch, as a new page load would.
+    reference = Browser(browser.client)
+    dashboard.results_cache.clear()
+    response = reference.fire('stored-data.data')
+    assert not reference.patched and not any(is_patch(v) for props in response.values() for v in props.values())
+    return comparable(reference.shown)
+
+
+def region(browser, dashboard):
+    dataset_id = next(iter(browser.client.props['stored-data.data'].values()))
+    return str(dashboard.load_dataset(dataset_id).frame['Region'].iloc[0])
+
+
+def test_filter_changes_patch_the_figures(browser, dashboard):
+    browser.client.set('region_dd.value', [region(browser, dashboard)])
+    browser.fire('region_dd.value')
+    assert browser.patched
+    patched = comparable(browser.shown)
+    assert patched == full_render(browser, dashboard)
+
+
+def test_patches_from_cached_outputs(browser, dashboard):
+    # Both views' outputs are in the result cache when going back.
+    browser.client.set('region_dd.value', [region(browser, dashboard)])
+    browser.fire('region_dd.value')
+    browser.client.set('region_dd.value', None)
+    response = browser.fire('region_dd.value')
+    assert browser.patched
+    assert 'view-key' in response
+    assert comparable(browser.shown) == full_render(browser, dashboard)
+
+
+def test_dataset_and_year_changes_send_whole_figures(browser, dashboard):
+    browser.client.set('region_dd.value', [region(browser, dashboard)])
+    browser.fire('region_dd.value')
+    browser.client.set('year_dd.value', next(iter(browser.client.props['stored-data.data'])))
+    response = browser.fire('year_dd.value')
+    assert not browser.patched
+    assert set(dashboard.OUTPUT_BUILDERS) <= set(response)
+    assert comparable(browser.shown) == full_render(browser, dashboard)
+
+
+def test_whole_figures_when_the_shown_view_left_the_cache(browser, dashboard):
+    dashboard.results_cache.clear()
+    browser.client.set('region_dd.value', [region(browser, dashboard)])
+    browser.fire('region_dd.value')
+    assert not browser.patched
+    assert comparable(browser.shown) == full_render(browser, dashboard)
+
+
+def test_an_unchanged_view_sends_nothing(browser):
+    response = browser.fire('region_dd.value')
+    assert response == {}
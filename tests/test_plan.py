@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import Dataset
+from enrollment.plan import (ELEMENTARY_GRADES, GENDERS, JUNIOR_GRADES, SENIOR_GRADES, SHS_TRACKS, STAGES, TOTAL,
+                             AggregationPlan, parse_enrollment_column)
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return Dataset('plan', synthetic_frame(1500)).build()
+
+
+STAGE_NAMES = {
+    'Elementary': ELEMENTARY_GRADES,
+    'Junior High School': JUNIOR_GRADES,
+    'Senior High School': [f'{grade} {track}' for grade in SENIOR_GRADES for track in SHS_TRACKS],
+}
+
+
+def direct_columns(columns, series, gender):
+    # The enrollment columns of one series, picked by name.
+    if series == TOTAL:
+        names = [name for stage in STAGES for name in STAGE_NAMES[stage]]
+    elif series in STAGES:
+        names = STAGE_NAMES[series]
+    elif series in SHS_TRACKS:
+        names = [f'{grade} {series}' for grade in SENIOR_GRADES]
+    else:
+        names = [series]
+    return [f'{name} {gender}' for name in names if f'{name} {gender}' in columns]
+
+
+def test_enrollment_columns_are_parsed():
+    assert parse_enrollment_column('G11 ACAD ABM Male') == ('ACAD ABM', 'Senior High School', 'Male')
+    assert parse_enrollment_column('Elem NG Female') == ('Elem NG', 'Elementary', 'Female')
+    assert parse_enrollment_column('G7 Male') == ('G7', 'Junior High School', 'Male')
+    assert parse_enrollment_column('G11 Male') is None
+    assert parse_enrollment_column('School Name') is None
+
+
+def test_plan_matches_direct_column_sums(dataset):
+    frame, columns = dataset.frame, dataset.enrollment_columns
+    rows = frame[frame['Sector'] == 'PUBLIC']
+    values = dataset.plan.evaluate(rows[columns].sum())
+    for series in dataset.plan.series:
+        for gender in GENDERS:
+            assert values.loc[series, gender] == rows[direct_columns(columns, series, gender)].to_numpy().sum()
+
+
+def test_columns_the_plan_does_not_know_are_ignored():
+    plan = AggregationPlan(['K Male', 'Remarks', 'G11 ACAD STEM Female'])
+    values = plan.evaluate([3, 100, 5])
+    assert values.loc['K', 'Male'] == values.loc['Elementary', 'Male'] == values.loc[TOTAL, 'Male'] == 3
+    assert values.loc['ACAD STEM', 'Female'] == values.loc['Senior High School', 'Female'] == 5
+    assert values.to_numpy().sum() == 3 * 3 + 5 * 3
+
+
+def test_track_averages_match_the_baseline(dataset):
+    # The dashboard's track average: the selection's track total per school
+    # row, over the two senior grades. The original chart took each row's
+    # mean of G11 and G12, then the mean over rows.
+    frame = dataset.frame
+    region = frame['Region'].iloc[0]
+    selection = dataset.select({'Region': [region]})
+    rows = frame[frame['Region'] == region]
+    for track in SHS_TRACKS:
+        for gender in GENDERS:
+            average = round(selection.averages.loc[track, gender] / len(SENIOR_GRADES))
+            g11, g12 = (rows[f'{grade} {track} {gender}'] for grade in SENIOR_GRADES)
+            assert average == round(((g11 + g12) / 2).mean())
+    assert np.isclose(selection.averages.loc[TOTAL].sum() * len(rows),
+                      rows[dataset.enrollment_columns].to_numpy().sum())
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_frame
+from enrollment.data import Dataset
+from enrollment.schools import SCHOOL_COLUMNS, TOTAL_COLUMNS
+
+
+PAGE_SIZE = 25
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return Dataset('schools', synthetic_frame(1000)).build()
+
+
+@pytest.fixture(scope='module')
+def table(dataset):
+    # What the table shows, built directly from the rows.
+    frame, plan = dataset.frame, dataset.plan
+    totals = {}
+    for stage in TOTAL_COLUMNS:
+        series = 'All' if stage == 'Total' else stage
+        columns = [c for c, j in zip(plan.columns, plan.weights[plan.series.index(series)].sum(axis=0)) if j]
+        totals[stage] = frame[columns].to_numpy(dtype=np.int64).sum(axis=1)
+    return pd.concat([frame[SCHOOL_COLUMNS].astype(object), pd.DataFrame(totals, index=frame.index)], axis=1)
+
+
+def expected_page(table, mask, page, sort_by=None, descending=False):
+    rows = table if mask is None else table[mask]
+    if sort_by is not None:
+        key = (lambda v: v.astype(str)) if rows[sort_by].dtype == object else None
+        rows = rows.sort_values(sort_by, ascending=not descending, kind='stable', key=key)
+    return len(rows), rows.iloc[page * PAGE_SIZE:(page + 1) * PAGE_SIZE].to_dict('records')
+
+
+def masks(dataset):
+    frame = dataset.frame
+    yield None
+    yield dataset.index.mask({'Region': [frame['Region'].iloc[0]]})
+    yield dataset.index.mask({'Sector': ['PRIVATE'], 'Modified COC': list(frame['Modified COC'].cat.categories[:2])})
+
+
+@pytest.mark.parametrize('sort_by', [None, 'BEIS School ID', 'School Name', 'Municipality', 'Total', 'Elementary'])
+@pytest.mark.parametrize('descending', [False, True])
+def test_pages_match_sorting_the_rows(dataset, table, sort_by, descending):
+    for mask in masks(dataset):
+        count = len(table) if mask is None else int(mask.sum())
+        last = (count - 1) // PAGE_SIZE
+        for page in (0, 1, last, last + 1):
+            got = dataset.schools.page(mask, page, PAGE_SIZE, sort_by, descending)
+            assert got == expected_page(table, mask, page, sort_by, descending)
+        if count % PAGE_SIZE:
+            assert len(dataset.schools.page(mask, last, PAGE_SIZE, sort_by, descending)[1]) == count % PAGE_SIZE
+
+
+def test_search_narrows_the_rows(dataset, table):
+    mask = dataset.index.mask({'Region': [dataset.frame['Region'].iloc[0]]})
+    text = ' ELEMENTARY '
+    found = table['School Name'].str.lower().str.contains('elementary') & mask
+    count, records = dataset.schools.page(mask, 0, PAGE_SIZE, 'Total', True, text)
+    assert (count, records) == expected_page(table, found.to_numpy(), 0, 'Total', True)
+    school_id = str(table['BEIS School ID'].iloc[7])
+    count, records = dataset.schools.page(None, 0, PAGE_SIZE, text=school_id)
+    assert count >= 1 and records[0]['BEIS School ID'] == table['BEIS School ID'].iloc[7]
+    assert dataset.schools.page(None, 0, PAGE_SIZE, text='no such school') == (0, [])
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+import pytest
+
+from enrollment.wire import pack, smallest_dtype, unpack
+
+
+@pytest.mark.parametrize('values, dtype', [
+    ([0, 255], np.uint8),
+    ([-1, 127], np.int8),
+    ([0, 256], np.uint16),
+    ([-40_000, 5], np.int32),
+    ([0, 2 ** 40], np.int64),
+    ([], np.uint8),
+])
+def test_integers_pack_in_the_smallest_dtype(values, dtype):
+    assert smallest_dtype(np.array(values, dtype=np.int64)) == np.dtype(dtype)
+
+
+@pytest.mark.parametrize('values', [
+    np.arange(-300, 300, dtype=np.int64),
+    np.array([0, 70_000, 3], dtype=np.int64).reshape(3, 1),
+    np.array([1.5, np.nan, -2.25]),
+    np.array([], dtype=np.int64),
+])
+def test_pack_round_trip(values):
+    packed = json.loads(json.dumps(pack(values)))
+    unpacked = unpack(packed)
+    assert unpacked.shape == values.shape
+    np.testing.assert_array_equal(unpacked, values)
@@ -0,0 +1,104 @@
+import base64
+import os
+
+import pytest
+
+from benchmarks.synthetic import generate_lis_csv
+from enrollment import disk_cache as disk_cache_module
+from enrollment.data import load_from_disk
+from enrollment.disk_cache import DatasetDiskCache
+from enrollment.jobs import Job, JobCancelled
+from enrollment.worker import WorkerError, WorkerPool
+
+pytestmark = pytest.mark.skipif(disk_cache_module.feather is None, reason='pyarrow is not installed')
+
+CACHE_BYTES = 1 << 30
+
+
+def contents(n_rows=500):
+    return 'data:text/csv;base64,' + base64.b64encode(generate_lis_csv(n_rows).encode()).decode()
+
+
+class Progress(Job):
+    # A job recording what the worker reported.
+    def __init__(self, on_report=None):
+        super().__init__('key')
+        self.reports = []
+        self.on_report = on_report
+
+    def report(self, fraction=None, stage=None):
+        self.reports.append((fraction, stage))
+        if self.on_report is not None:
+            self.on_report()
+        super().report(fraction, stage)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = WorkerPool(1, str(tmp_path), CACHE_BYTES)
+    started = []
+    acquire = pool._acquire
+
+    def tracked():
+        started.append(acquire())
+        return started[-1]
+
+    pool._acquire = tracked
+    pool.started = started
+    yield pool
+    for worker in started:
+        if worker.poll() is None:
+            worker.kill()
+            worker.wait()
+
+
+def leftovers(pool):
+    return [name for name in os.listdir(pool.cache_directory) if name.startswith('.upload-')]
+
+
+def test_ingest_saves_the_dataset_and_reports_progress(pool):
+    job = Progress()
+    phases = pool.ingest(job, contents(), 'upload', '2023-2024')
+    assert set(phases) == {'parse', 'aggregate', 'persist'}
+    assert [stage for _, stage in job.reports if stage] == ['Reading', 'Aggregating', 'Saving']
+    assert any(fraction == 1.0 for fraction, _ in job.reports)
+    dataset = load_from_disk('upload', DatasetDiskCache(pool.cache_directory, CACHE_BYTES))
+    assert len(dataset.frame) == 500 and dataset.school_year == '2023-2024'
+    assert leftovers(pool) == []
+
+
+def test_a_worker_is_reused_after_an_error(pool):
+    with pytest.raises(WorkerError):
+        pool.ingest(Progress(), 'data:text/csv;base64,' + base64.b64encode(b'not,a\nvalid,export').decode(),
+                    'broken', None)
+    pool.ingest(Progress(), contents(), 'upload', None)
+    assert len(pool.started) == 2 and pool.started[0] is pool.started[1]
+    assert pool.started[0].poll() is None
+    assert leftovers(pool) == []
+
+
+def test_a_cancelled_job_kills_its_worker(pool):
+    job = Progress()
+    job._cancelled.set()
+    with pytest.raises(JobCancelled):
+        pool.ingest(job, contents(), 'upload', None)
+    assert pool.started[0].poll() is not None
+    pool.ingest(Progress(), contents(), 'upload', None)
+    assert pool.started[1] is not pool.started[0]
+    assert leftovers(pool) == []
+
+
+def test_a_crashed_worker_fails_the_job_and_is_replaced(pool):
+    job = Progress(on_report=lambda: pool.started[-1].kill())
+    with pytest.raises(WorkerError, match='stopped unexpectedly'):
+        pool.ingest(job, contents(), 'upload', None)
+    pool.ingest(Progress(), contents(), 'upload', None)
+    assert len(pool.started) == 2 and pool.started[1] is not pool.started[0]
+
+
+def test_a_worker_that_died_while_idle_is_replaced(pool):
+    pool.ingest(Progress(), contents(), 'first', None)
+    pool.started[0].kill()
+    pool.started[0].wait()
+    pool.ingest(Progress(), contents(), 'second', None)
+    assert pool.started[1] is not pool.started[0] and pool.started[1].poll() is None